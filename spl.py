@@ -4,8 +4,15 @@ import sys
 import spl_lexer
 # import spl_parser
 import spl_interpreter
+import spl_closure
+import spl_bytecode
+import spl_compiler
+import spl_virtual_machine
+import spl_resolver
 import time
 import spl_optimizer as opt
+import spl_profile
+import spl_cache
 import spl_lib
 
 sys.setrecursionlimit(10000)
@@ -21,15 +28,37 @@ HELP = """Name
 
 Usage
     {} [OPTIONS]... FILE [ARGV]...
+    {} [OPTIONS]... FILE.spe [ARGV]...
     
 Description
 OPTIONS:    
     -ast,    --abstract syntax tree    shows the structure of the abstract syntax tree     
     -debug,  --debugger                enables debugger
+    -engine, --engine ENGINE           chooses the execution engine, 'tree' (default), 'closure' or 'vm'
     -et,     --execution               shows the execution times of each node
     -exit,   --exit value              shows the program's exit value
     -o1,     --optimize 1              enable level 1 optimization
-    -o2,     --optimize 2              enable level 2 optimization
+    -o2,     --optimize 2              enable level 2 optimization, makes the calls in tail position in
+                                       constant stack
+    -o3,     --optimize 3              enable level 3 optimization, folds and propagates constants, inlines
+                                       small functions, hoists loop invariants, counts the loops over a
+                                       range of integers and removes dead code
+    -inline, --inline SIZE             sets the maximum number of nodes of the functions inlined at level 3,
+                                       {} by default, 0 disables inlining
+    -memo,   --memoize                 remembers the results of the functions annotated by @Memo and of the
+                                       functions without side effects, shows the hits and misses at exit
+    -memosize, --memosize SIZE         sets the maximum number of results remembered by each function,
+                                       {} by default
+    -no-cache, --no cache              does not use or store the parsed script in the directory
+                                       '{}' next to it
+    -opt-report, --optimization report shows the time and the number of nodes before and after each
+                                       optimization pass
+    -profile-gen, --profile-gen FILE   runs with the tree engine and writes the execution counts of each
+                                       line into the profile FILE
+    -profile-use, --profile-use FILE   focuses the optimization on the hot lines of the profile FILE
+    -spc,    --compile                 compiles the file into bytecode FILE.spe instead of running it
+    -stream, --stream                  tokenizes the file while parsing it, keeping only a few tokens in
+                                       memory, the timer counts the tokenizing as parsing
     -timer,  --timer                   enables the timer
     -tokens, --tokens                  shows language tokens
     -vars,   --variables               prints out all global variables after execution
@@ -42,12 +71,16 @@ ARGV:
     
 Example
     {} -ast -tokens example.sp -something
-""".format(EXE_NAME, EXE_NAME, EXE_NAME)
+""".format(EXE_NAME, EXE_NAME, EXE_NAME, opt.INLINE_BUDGET, spl_interpreter.MEMO_SIZE, spl_cache.CACHE_DIR,
+           EXE_NAME)
 
 
 def parse_arg(args):
     d = {"file": None, "dir": None, "debugger": False, "timer": False, "ast": False, "tokens": False,
-         "vars": False, "argv": [], "encoding": None, "exit": False, "optimize": 0, "exec_time": False}
+         "vars": False, "argv": [], "encoding": None, "exit": False, "optimize": 0, "exec_time": False,
+         "engine": "tree", "compile": False, "inline": opt.INLINE_BUDGET, "memo": False,
+         "memo_size": spl_interpreter.MEMO_SIZE, "opt_report": False,
+         "profile_gen": None, "profile_use": None, "stream": False, "cache": True}
     # for i in range(1, len(args), 1):
     i = 1
     while i < len(args):
@@ -72,12 +105,39 @@ def parse_arg(args):
                 elif flag == "Dfile":
                     i += 1
                     d["encoding"] = args[i]
+                elif flag == "engine":
+                    i += 1
+                    d["engine"] = args[i]
                 elif flag == "et":
                     d["exec_time"] = True
                 elif flag == "o1":
                     d["optimize"] = 1
                 elif flag == "o2":
                     d["optimize"] = 2
+                elif flag == "o3":
+                    d["optimize"] = 3
+                elif flag == "inline":
+                    i += 1
+                    d["inline"] = int(args[i])
+                elif flag == "memo":
+                    d["memo"] = True
+                elif flag == "no-cache":
+                    d["cache"] = False
+                elif flag == "memosize":
+                    i += 1
+                    d["memo_size"] = int(args[i])
+                elif flag == "opt-report":
+                    d["opt_report"] = True
+                elif flag == "profile-gen":
+                    i += 1
+                    d["profile_gen"] = args[i]
+                elif flag == "profile-use":
+                    i += 1
+                    d["profile_use"] = args[i]
+                elif flag == "spc":
+                    d["compile"] = True
+                elif flag == "stream":
+                    d["stream"] = True
                 else:
                     print("unknown flag: -" + flag)
             elif arg == "help":
@@ -103,13 +163,22 @@ def print_help():
     print(HELP)
 
 
-def interpret():
-    lex_start = time.time()
+def parse(o_level: int, options: tuple, caching: bool):
+    """
+    Tokenizes, parses, resolves and optimizes the script.
 
+    :param o_level: the optimization level
+    :param options: the optimization options
+    :param caching: whether to store the tree in the cache
+    :return: tuple(the tree, the time when the parsing started)
+    """
     lexer = spl_lexer.Lexer()
     lexer.script_dir = argv["dir"]
     lexer.file_name = file_name
-    lexer.tokenize(f)
+    if argv["stream"] and not argv["tokens"]:
+        lexer.stream(f)
+    else:
+        lexer.tokenize(f)
 
     if argv["tokens"]:
         print(lexer.tokens)
@@ -117,13 +186,48 @@ def interpret():
     parse_start = time.time()
 
     block = lexer.parse()
+    spl_resolver.resolve(block)
 
-    o_level = argv["optimize"]
-
-    if o_level > 0:
+    removed = 0
+    if o_level > 0 or argv["memo"] or argv["profile_use"]:
         optimizer = opt.Optimizer(block)
+        optimizer.inline_budget = argv["inline"]
+        optimizer.memoizing = argv["memo"]
+        if argv["profile_use"]:
+            with open(argv["profile_use"], "r") as pf:
+                optimizer.profile = spl_profile.read_profile(pf)
+        optimizer.reporting = argv["opt_report"]
         optimizer.optimize(o_level)
         block = optimizer.ast
+        removed = optimizer.removed
+        if o_level >= 3 and (argv["ast"] or argv["exec_time"]):
+            print("Dead code elimination removed {} nodes".format(removed))
+        if argv["opt_report"]:
+            print("===== Optimization Report =====")
+            for report in optimizer.report:
+                print(report)
+            print("===== End of Optimization Report =====")
+
+    if caching:
+        spl_cache.write_cache(file_name, options, lexer.imported, block, removed)
+    return block, parse_start
+
+
+def interpret():
+    lex_start = time.time()
+
+    o_level = argv["optimize"]
+    options = (o_level, argv["inline"], argv["memo"])
+    # the tokens and the optimization report need a new parse, and a profile may change without the script
+    caching = argv["cache"] and not (argv["tokens"] or argv["opt_report"] or argv["profile_use"])
+    cached = spl_cache.read_cache(file_name, options) if caching else None
+    if cached is None:
+        block, parse_start = parse(o_level, options, caching)
+    else:
+        block, removed = cached
+        parse_start = time.time()
+        if o_level >= 3 and (argv["ast"] or argv["exec_time"]):
+            print("Dead code elimination removed {} nodes".format(removed))
 
     if argv["ast"]:
         print("===== Abstract Syntax Tree =====")
@@ -131,11 +235,28 @@ def interpret():
         print("===== End of AST =====")
     if argv["debugger"]:
         spl_interpreter.DEBUG = True
+    if argv["memo"]:
+        spl_interpreter.MEMOIZE = True
+        spl_interpreter.MEMO_SIZE = argv["memo_size"]
+
+    if argv["compile"]:
+        code = spl_compiler.compile_ast(block, file_name)
+        with open(file_name + "e", "wb") as out:
+            spl_bytecode.write_spe(code, out)
+        return
 
     interpret_start = time.time()
 
-    itr = spl_interpreter.Interpreter(argv["argv"], encoding)
-    itr.set_ast(block)
+    if argv["profile_gen"]:
+        # only the tree engine counts the evaluations of the nodes
+        itr = spl_interpreter.Interpreter(argv["argv"], encoding)
+    elif argv["engine"] == "closure":
+        itr = spl_closure.ClosureInterpreter(argv["argv"], encoding)
+    elif argv["engine"] == "vm":
+        itr = spl_virtual_machine.BytecodeInterpreter(argv["argv"], encoding)
+    else:
+        itr = spl_interpreter.Interpreter(argv["argv"], encoding)
+    itr.set_ast(block, file_name)
     result = itr.interpret()
 
     end = time.time()
@@ -154,26 +275,52 @@ def interpret():
     if argv["exec_time"]:
         print(block)
 
+    if argv["profile_gen"]:
+        with open(argv["profile_gen"], "w") as pf:
+            spl_profile.write_profile(spl_profile.record_profile(block), pf)
+
+    if argv["memo"]:
+        print_memo_stats()
+
+
+def print_memo_stats():
+    called = [stats for stats in spl_interpreter.MEMO_STATS.values() if stats.hits + stats.misses > 0]
+    if len(called) == 0:
+        return
+    print("===== Memoization =====")
+    for stats in called:
+        print("{} in '{}', at line {}: {} hits, {} misses".format(stats.name, stats.file, stats.line, stats.hits,
+                                                                 stats.misses))
+    print("===== End of Memoization =====")
 
-# def virtual_machine():
-#     vm = svm.VirtualMachine(argv["argv"])
-#     vm.set_file(f)
-#     ast = vm.restore_tree()
-#     # print(ast)
-#
-#     interpret_start = time.time()
-#
-#     itr = spl_interpreter.Interpreter(argv["argv"], "utf-8")
-#     itr.set_ast(ast)
-#     result = itr.interpret()
-#
-#     end = time.time()
-#
-#     if argv["exit"]:
-#         print("Process finished with exit value " + str(result))
-#
-#     if argv["timer"]:
-#         print("Time used: execute: {}s.".format(end - interpret_start))
+
+def virtual_machine():
+    code = spl_bytecode.read_spe(f)
+
+    interpret_start = time.time()
+
+    if argv["memo"]:
+        spl_interpreter.MEMOIZE = True
+        spl_interpreter.MEMO_SIZE = argv["memo_size"]
+
+    itr = spl_virtual_machine.BytecodeInterpreter(argv["argv"], "utf-8")
+    itr.set_code(code)
+    result = itr.interpret()
+
+    end = time.time()
+
+    if argv["exit"]:
+        print("Process finished with exit value " + spl_lib.replace_bool_none(str(result)))
+
+    if argv["vars"]:
+        print(itr.env.variables)
+        print("Heap: " + str(itr.env.heap))
+
+    if argv["timer"]:
+        print("Time used: execute: {}s.".format(end - interpret_start))
+
+    if argv["memo"]:
+        print_memo_stats()
 
 
 if __name__ == "__main__":
@@ -196,11 +343,11 @@ if __name__ == "__main__":
                 raise e
             finally:
                 f.close()
-        # elif file_name[-4:] == ".spe":
-        #     f = open(file_name, "rb")
-        #     try:
-        #         virtual_machine()
-        #     except Exception as e:
-        #         raise e
-        #     finally:
-        #         f.close()
+        elif file_name[-4:] == ".spe":
+            f = open(file_name, "rb")
+            try:
+                virtual_machine()
+            except Exception as e:
+                raise e
+            finally:
+                f.close()
@@ -0,0 +1,376 @@
+""" The spl bytecode format.
+
+A compiled script is a tree of Code objects. Each Code holds a flat instruction stream of (opcode, argument)
+pairs, its own constant pool and name table, and the source line of every instruction.
+
+Code objects are stored in '.spe' files, a versioned binary format written by write_spe and read by read_spe.
+The code of an imported file is shared by all imports of it, so the codes may form a graph with cycles, in which
+each code is stored once.
+"""
+
+import struct
+import spl_parser as psr
+from spl_interpreter import String
+
+MAGIC = b"SPE"
+VERSION = 6
+
+# Opcodes. Jump arguments are indices into the instruction stream.
+NOP = 0
+LOAD_CONST = 1  # push consts[arg]
+LOAD_NAME = 2  # push the value of names[arg]
+STORE_NAME = 3  # assign TOS to names[arg], TOS is kept
+STORE_PRIVATE = 4  # assign TOS to names[arg] as private, TOS is kept
+STORE_PATH = 5  # assign TOS to the dotted name consts[arg], TOS is kept
+POP_TOP = 6
+BINARY_OP = 7  # pop right and left, push left OPERATORS[arg] right
+NEGATIVE = 8
+NOT = 9
+JUMP = 10
+POP_JUMP_IF_FALSE = 11
+AND_JUMP = 12  # pop left, if it is false push false and jump
+OR_JUMP = 13  # pop left, if it is true push true and jump
+LOAD_ATTR = 14  # replace TOS with its attribute names[arg]
+LOAD_ATTR_THIS = 15  # LOAD_ATTR without the private access check
+CALL_FUNCTION = 16  # consts[arg] is (name, argc, resolved depth), arguments are on the stack
+CALL_METHOD = 17  # consts[arg] is (name, argc, by_this), the receiver is under the arguments
+RETURN_VALUE = 18
+MAKE_FUNCTION = 19  # consts[arg] is a FunctionInfo
+MAKE_CLASS = 20  # consts[arg] is (name, superclass names, body)
+NEW = 21  # consts[arg] is (class name, argc), argc is -1 if the constructor is not called
+IMPORT = 22  # consts[arg] is (module name, resolved path of the file, body)
+GET_ITER = 23  # replace TOS with an iterator over it
+FOR_ITER = 24  # stack is [iterator, result], push the next element or pop the iterator and jump
+ROT_TWO = 25
+SETUP_TRY = 26  # push an exception handler at arg
+POP_TRY = 27
+CATCH = 28  # TOS is the exception, push whether it matches any of the class names consts[arg]
+RERAISE = 29  # pop the exception and raise it
+THROW = 30
+JUMP_CALL = 31  # CALL_FUNCTION in tail position, runs the called function in the current frame
+ABSTRACT_METHOD = 32
+INVALID = 33
+LOAD_LOCAL = 34  # push names[arg], resolved in the working environment
+LOAD_OUTER = 35  # push the name consts[arg] is (name, depth), resolved in an outer environment
+LOAD_HEAP = 36  # push names[arg], resolved in the heap
+STORE_LOCAL = 37  # assign TOS to names[arg], resolved in the working environment, TOS is kept
+STORE_OUTER = 38  # assign TOS to the name consts[arg] is (name, depth), resolved in an outer environment
+DUP_TOP = 39
+DUP_TOP_TWO = 40
+STORE_ATTR = 41  # pop the object under TOS, assign TOS to its attribute names[arg], TOS is kept
+STORE_ITEM = 42  # stack is [object, index, value], call '__setitem__' and push the value, arg is whether by 'this'
+
+OPCODE_NAMES = {v: k for k, v in dict(globals()).items() if k.isupper() and isinstance(v, int) and
+                k not in {"VERSION"}}
+
+# The opcodes of the class bodies which only define methods and fields with literal values
+DECLARATIVE_OPCODES = {NOP, LOAD_CONST, NEGATIVE, STORE_NAME, STORE_PRIVATE, STORE_LOCAL, POP_TOP, MAKE_FUNCTION,
+                       RETURN_VALUE}
+
+OPERATORS = ["+", "-", "*", "/", "%", "==", "!=", ">", "<", ">=", "<=", "<<", ">>", "&", "^", "|",
+             "===", "!==", "instanceof"]
+
+OPERATOR_INDEX = {op: i for i, op in enumerate(OPERATORS)}
+
+
+class Code:
+    """
+    A compiled unit: a script, an imported module, a class body or a function body.
+
+    The tree-walking interpreter evaluates a Code as if it was a node, so that functions compiled
+    to bytecode can still be called from the interpreter.
+
+    :type instructions: list of int
+    :type consts: list
+    :type names: list of str
+    :type lines: list of int
+    """
+    type = psr.BYTECODE
+
+    def __init__(self, name: str, file: str):
+        self.name = name
+        self.file = file
+        self.instructions = []
+        self.consts = []
+        self.names = []
+        self.lines = []  # the line of each instruction, indexed by instruction index // 2
+        self.execution = 0
+        self.caches = {}  # the inline caches of the attribute accesses, by instruction index
+
+    def __str__(self):
+        return "Code<{}>".format(self.name)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def line_of(self, pc):
+        """
+        Returns the source line of the instruction just executed.
+
+        :param pc: the program counter after that instruction
+        :return: the line number
+        """
+        return self.lines[(pc - 2) // 2]
+
+    def is_declarative(self):
+        """
+        Returns whether this code only binds constants and functions to names.
+
+        :return: whether this code is declarative
+        """
+        ins = self.instructions
+        for i in range(0, len(ins), 2):
+            if ins[i] not in DECLARATIVE_OPCODES:
+                return False
+        return True
+
+    def all_names(self):
+        """
+        Returns all names used by this code and its nested codes, including the function names.
+
+        :return: the set of names
+        """
+        names = set()
+        seen = {self}
+        pending = [self]
+        while pending:
+            code = pending.pop()
+            names.update(code.names)
+            for const in code.consts:
+                if isinstance(const, FunctionInfo):
+                    names.add(const.name)
+                for nested in _nested_codes(const):
+                    if nested not in seen:
+                        seen.add(nested)
+                        pending.append(nested)
+        return names
+
+    def disassemble(self, indent="", listed=None):
+        """
+        Returns a readable listing of this code and its nested codes.
+
+        :param indent: the indentation of this listing
+        :param listed: the codes already listed, which are not listed again
+        :return: the listing
+        """
+        if listed is None:
+            listed = set()
+        if self in listed:
+            return "{}Code {} ({}), listed above".format(indent, self.name, self.file)
+        listed.add(self)
+        lst = ["{}Code {} ({})".format(indent, self.name, self.file)]
+        nested = []
+        for i in range(0, len(self.instructions), 2):
+            op = self.instructions[i]
+            arg = self.instructions[i + 1]
+            if op in {LOAD_NAME, STORE_NAME, STORE_PRIVATE, LOAD_ATTR, LOAD_ATTR_THIS, LOAD_LOCAL, LOAD_HEAP,
+                      STORE_LOCAL, STORE_ATTR}:
+                detail = self.names[arg]
+            elif op == BINARY_OP:
+                detail = OPERATORS[arg]
+            elif op in {JUMP, POP_JUMP_IF_FALSE, AND_JUMP, OR_JUMP, FOR_ITER, SETUP_TRY}:
+                detail = "-> {}".format(arg)
+            elif op in {NOP, POP_TOP, NEGATIVE, NOT, RETURN_VALUE, GET_ITER, ROT_TWO, POP_TRY, RERAISE, THROW,
+                        ABSTRACT_METHOD, INVALID, DUP_TOP, DUP_TOP_TWO, STORE_ITEM}:
+                detail = ""
+            else:
+                detail = str(self.consts[arg])
+                nested.extend(x for x in _nested_codes(self.consts[arg]))
+            lst.append("{}{:>6} {:>4} {:<18} {}".format(indent, i, self.lines[i // 2], OPCODE_NAMES[op], detail))
+        for code in nested:
+            lst.append(code.disassemble(indent + "    ", listed))
+        return "\n".join(lst)
+
+
+class FunctionInfo:
+    """
+    The constant of MAKE_FUNCTION.
+
+    :type params: list of str
+    :type presets: list of Code
+    :type body: Code
+    """
+
+    def __init__(self, name: str, params: list, presets: list, body: Code, auth: int, const: bool, memo: bool):
+        self.name = name
+        self.params = params
+        self.presets = presets  # None for parameters without default value
+        self.body = body
+        self.auth = auth
+        self.const = const
+        self.memo = memo  # whether the results are remembered when memoization is enabled
+        self.nodes = None  # the params and presets as nodes, built by the virtual machine at the first use
+
+    def __str__(self):
+        return "Function {}({})".format(self.name, ", ".join(self.params))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _nested_codes(const):
+    if isinstance(const, Code):
+        yield const
+    elif isinstance(const, FunctionInfo):
+        for preset in const.presets:
+            if preset is not None:
+                yield preset
+        yield const.body
+    elif isinstance(const, tuple):
+        for x in const:
+            yield from _nested_codes(x)
+
+
+# Serialization
+
+def write_spe(code: Code, file):
+    """
+    Writes a compiled script into a binary file.
+
+    :param code: the code of the script
+    :param file: the file opened in mode 'wb'
+    """
+    out = bytearray(MAGIC)
+    out += struct.pack("<H", VERSION)
+    _encode(code, out, {})
+    file.write(bytes(out))
+
+
+def read_spe(file) -> Code:
+    """
+    Reads a compiled script from a binary file.
+
+    :param file: the file opened in mode 'rb'
+    :return: the code of the script
+    """
+    data = file.read()
+    if data[:3] != MAGIC:
+        raise BytecodeException("Not a spl bytecode file")
+    version = struct.unpack_from("<H", data, 3)[0]
+    if version != VERSION:
+        raise BytecodeException("Unsupported bytecode version {}, expected {}".format(version, VERSION))
+    return _Decoder(data, 5).decode()
+
+
+def _encode(value, out: bytearray, codes: dict):
+    """
+    Encodes a constant.
+
+    :param value: the constant
+    :param out: the encoded data
+    :param codes: the index of each code already encoded, a code is encoded once and then referred by its index
+    """
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        if -(1 << 63) <= value < (1 << 63):
+            out += b"i"
+            out += struct.pack("<q", value)
+        else:
+            out += b"I"
+            _encode_str(str(value), out)
+    elif isinstance(value, float):
+        out += b"f"
+        out += struct.pack("<d", value)
+    elif isinstance(value, str):
+        out += b"s"
+        _encode_str(value, out)
+    elif isinstance(value, String):
+        out += b"S"
+        _encode_str(value.literal, out)
+    elif isinstance(value, tuple) or isinstance(value, list):
+        out += b"t"
+        out += struct.pack("<I", len(value))
+        for x in value:
+            _encode(x, out, codes)
+    elif isinstance(value, FunctionInfo):
+        out += b"u"
+        for x in (value.name, value.params, value.presets, value.body, value.auth, value.const, value.memo):
+            _encode(x, out, codes)
+    elif isinstance(value, Code) and value in codes:
+        out += b"r"
+        out += struct.pack("<I", codes[value])
+    elif isinstance(value, Code):
+        codes[value] = len(codes)
+        out += b"c"
+        _encode_str(value.name, out)
+        _encode_str(value.file, out)
+        out += struct.pack("<I", len(value.instructions))
+        out += struct.pack("<{}i".format(len(value.instructions)), *value.instructions)
+        out += struct.pack("<{}I".format(len(value.lines)), *value.lines)
+        _encode(value.consts, out, codes)
+        _encode(value.names, out, codes)
+    else:
+        raise BytecodeException("Cannot encode constant {}".format(value))
+
+
+def _encode_str(s: str, out: bytearray):
+    b = s.encode("utf-8")
+    out += struct.pack("<I", len(b))
+    out += b
+
+
+class _Decoder:
+    def __init__(self, data: bytes, index: int):
+        self.data = data
+        self.index = index
+        self.codes = []  # the decoded codes, in the order of their indices
+
+    def unpack(self, fmt):
+        res = struct.unpack_from(fmt, self.data, self.index)
+        self.index += struct.calcsize(fmt)
+        return res
+
+    def decode_str(self):
+        length = self.unpack("<I")[0]
+        s = self.data[self.index: self.index + length].decode("utf-8")
+        self.index += length
+        return s
+
+    def decode(self):
+        tag = self.data[self.index: self.index + 1]
+        self.index += 1
+        if tag == b"N":
+            return None
+        elif tag == b"T":
+            return True
+        elif tag == b"F":
+            return False
+        elif tag == b"i":
+            return self.unpack("<q")[0]
+        elif tag == b"I":
+            return int(self.decode_str())
+        elif tag == b"f":
+            return self.unpack("<d")[0]
+        elif tag == b"s":
+            return self.decode_str()
+        elif tag == b"S":
+            return String(self.decode_str())
+        elif tag == b"t":
+            length = self.unpack("<I")[0]
+            return tuple(self.decode() for _ in range(length))
+        elif tag == b"u":
+            name, params, presets, body, auth, const, memo = (self.decode() for _ in range(7))
+            return FunctionInfo(name, list(params), list(presets), body, auth, const, memo)
+        elif tag == b"c":
+            code = Code(self.decode_str(), self.decode_str())
+            self.codes.append(code)
+            length = self.unpack("<I")[0]
+            code.instructions = list(self.unpack("<{}i".format(length)))
+            code.lines = list(self.unpack("<{}I".format(length // 2)))
+            code.consts = list(self.decode())
+            code.names = list(self.decode())
+            return code
+        elif tag == b"r":
+            return self.codes[self.unpack("<I")[0]]
+        else:
+            raise BytecodeException("Broken bytecode file")
+
+
+class BytecodeException(Exception):
+    def __init__(self, msg=""):
+        Exception.__init__(self, msg)
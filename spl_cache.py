@@ -0,0 +1,134 @@
+""" The on-disk cache of parsed scripts.
+
+The tree of a script, after resolving and optimization, is stored in the directory '__splcache__' next to the
+script, like the '__pycache__' of python. A cached tree is only used if the script, every file it imports, the
+optimization options, the working directory and the interpreter are the same as when it was stored.
+
+A cache file holds a header and the pickled tree, written by write_cache and read by read_cache.
+"""
+
+import os
+import gc
+import struct
+import pickle
+import hashlib
+import spl_lexer
+import spl_parser
+import spl_resolver
+import spl_optimizer
+import spl_interpreter
+
+MAGIC = b"SPC"
+VERSION = 1
+
+CACHE_DIR = "__splcache__"
+
+# The modules which build the trees, a cache stored by another version of them is not used
+FRONT_END = (spl_lexer, spl_parser, spl_resolver, spl_optimizer, spl_interpreter)
+
+
+def cache_file(file_name: str, options: tuple) -> str:
+    """
+    Returns the path of the cache file of a script.
+
+    :param file_name: the name of the script
+    :param options: the optimization options, starting with the optimization level
+    :return: the path of the cache file
+    """
+    directory, name = os.path.split(file_name)
+    # each set of options has its own file, so that runs with different options do not overwrite each other
+    digest = hashlib.sha256(repr(options).encode()).hexdigest()[:8]
+    return os.path.join(directory, CACHE_DIR, "{}.o{}.{}.spc".format(name, options[0], digest))
+
+
+def cache_key(file_name: str, options: tuple) -> tuple:
+    """
+    Returns what a cached tree depends on, except the contents of the source files.
+
+    :param file_name: the name of the script
+    :param options: the optimization options
+    :return: the key
+    """
+    stamps = []
+    for module in FRONT_END:
+        stat = os.stat(module.__file__)
+        stamps.append((module.__name__, stat.st_size, stat.st_mtime_ns))
+    # the nodes keep the file names, and the system libraries are found from the working directory
+    return file_name, os.getcwd(), options, tuple(stamps)
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def read_cache(file_name: str, options: tuple):
+    """
+    Returns the cached tree of a script, if it is still valid.
+
+    :param file_name: the name of the script
+    :param options: the optimization options
+    :return: tuple(the tree, the number of nodes removed by dead code elimination), or None if there is no valid
+        cache of the script
+    """
+    try:
+        with open(cache_file(file_name, options), "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC or struct.unpack("<H", file.read(2))[0] != VERSION:
+                return None
+            key, sources = pickle.load(file)
+            if key != cache_key(file_name, options):
+                return None
+            for path, digest in sources:
+                if file_hash(path) != digest:
+                    return None
+            return load_tree(file)
+    except Exception:
+        # a missing or broken cache is just not used
+        return None
+
+
+def write_cache(file_name: str, options: tuple, imported: set, ast: spl_parser.BlockStmt, removed: int):
+    """
+    Stores the tree of a script, ignoring the errors.
+
+    :param file_name: the name of the script
+    :param options: the optimization options
+    :param imported: the resolved paths of the files imported by the script
+    :param ast: the tree, resolved and optimized
+    :param removed: the number of nodes removed by dead code elimination
+    """
+    path = cache_file(file_name, options)
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        sources = [(source, file_hash(source)) for source in [file_name] + sorted(imported)]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<H", VERSION))
+            pickle.dump((cache_key(file_name, options), sources), file)
+            dump_tree((ast, removed), file)
+        os.replace(temp, path)
+    except (OSError, pickle.PicklingError, RecursionError):
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def load_tree(file):
+    # the garbage collector would scan the tree again and again while it is being built
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(file)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump_tree(tree, file):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        pickle.dump(tree, file, pickle.HIGHEST_PROTOCOL)
+    finally:
+        if enabled:
+            gc.enable()
@@ -0,0 +1,943 @@
+""" The closure-compiled execution engine.
+
+Translates the abstract syntax tree into nested python closures once, so that the children and the operator
+of each node are bound ahead of execution, instead of being dispatched through the node table every time.
+
+Each compiled node is a callable which takes the working environment and returns the evaluation result,
+as spl_interpreter.evaluate does. Nodes without a specialized compiler fall back to the tree-walking
+interpreter.
+"""
+
+from spl_interpreter import *
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    An interpreter which compiles the abstract syntax tree into closures before running it.
+    """
+
+    def __init__(self, argv, encoding):
+        Interpreter.__init__(self, argv, encoding)
+
+    def interpret(self):
+        """
+        Starts the interpretation.
+
+        :return: the exit value
+        """
+        return run_body(compile_node(self.ast), self.env)
+
+
+def compile_node(node):
+    """
+    Returns the closure of a node, compiling it at the first time.
+
+    :param node: the node in abstract syntax tree, or a raw value produced by the optimizer
+    :return: the closure, which takes the working environment and returns the evaluation result
+    """
+    if node is None:
+        return _null
+    if type(node) in SELF_RETURN_TABLE_2:
+        return _constant(node)
+    closure = node.__dict__.get("closure")
+    if closure is None:
+        compiler = COMPILER_TABLE.get(node.type, compile_fallback)
+        closure = compiler(node)
+        node.closure = closure
+    return closure
+
+
+def _null(env):
+    return None
+
+
+def _constant(value):
+    def constant(env):
+        return value
+
+    return constant
+
+
+def compile_fallback(node: Node):
+    def fallback(env):
+        return evaluate(node, env)
+
+    return fallback
+
+
+def compile_literal(node: LiteralNode):
+    return _constant(String(node.literal))
+
+
+def compile_boolean(node: BooleanStmt):
+    return _constant(eval_boolean_stmt(node, None))
+
+
+def compile_name(node: NameNode):
+    name = node.name
+    depth = node.depth
+    line_file = (node.line_num, node.file)
+
+    if depth is None:
+        def name_(env):
+            return env.get(name, line_file)
+
+        return name_
+    elif depth == 0:
+        def local_name(env):
+            try:
+                return env.variables[name]
+            except KeyError:
+                return env.get(name, line_file)
+
+        return local_name
+    else:
+        def resolved_name(env):
+            return env.resolved_get(name, depth, line_file)
+
+        return resolved_name
+
+
+def may_jump(node) -> bool:
+    """
+    Returns whether a statement may contain 'return', 'break' or 'continue', not counting nested functions.
+
+    :param node: the statement
+    :return: whether it may complete abruptly
+    """
+    if node is None or type(node) in SELF_RETURN_TABLE_2:
+        return False
+    t = node.type
+    if t == RETURN_STMT or t == BREAK_STMT or t == CONTINUE_STMT:
+        return True
+    elif t == BLOCK_STMT:
+        return any(may_jump(line) for line in node.lines)
+    elif t == IF_STMT:
+        return may_jump(node.then_block) or may_jump(node.else_block)
+    elif t == WHILE_STMT or t == FOR_LOOP_STMT:
+        return may_jump(node.body)
+    elif t == TRY_STMT:
+        return may_jump(node.try_block) or may_jump(node.finally_block) or \
+            any(may_jump(cat.then) for cat in node.catch_blocks)
+    else:
+        return False
+
+
+def compile_break(node: BreakStmt):
+    completion = Completion(BREAK, None, (node.line_num, node.file))
+
+    def break_(env):
+        return completion
+
+    return break_
+
+
+def compile_continue(node: ContinueStmt):
+    completion = Completion(CONTINUE, None, (node.line_num, node.file))
+
+    def continue_(env):
+        return completion
+
+    return continue_
+
+
+def compile_block(node: BlockStmt):
+    lines = [compile_node(line) for line in node.lines]
+
+    if not may_jump(node):
+        def block(env):
+            result = 0
+            for line in lines:
+                result = line(env)
+            return result
+
+        return block
+
+    def jumping_block(env):  # the same as eval_block
+        result = 0
+        for line in lines:
+            result = line(env)
+            if type(result) is Completion:
+                return result
+        return result
+
+    return jumping_block
+
+
+def run_body(body, env: Environment):
+    """
+    Runs a compiled body of a function, a class, a module or the script, where 'return' stops.
+
+    :param body: the closure of the body
+    :param env: the working environment
+    :return: the returned value, or the value of the last statement if nothing is returned
+    """
+    result = body(env)
+    if type(result) is Completion:
+        return body_result(result)
+    return result
+
+
+def compile_store(key: Node):
+    """
+    Compiles the target of an assignment.
+
+    :param key: the left side of the assignment
+    :return: a function which takes the working environment and the value, and stores the value
+    """
+    t = key.type
+    if t == NAME_NODE:
+        name = key.name
+        if key.auth == lex.PRIVATE:
+            def store_private(env, value):
+                env.assign(name, value)
+                env.add_private(name)
+
+            return store_private
+        elif key.depth is not None:
+            depth = key.depth
+
+            def resolved_store(env, value):
+                env.resolved_assign(name, depth, value)
+
+            return resolved_store
+        else:
+            def store(env, value):
+                env.assign(name, value)
+
+            return store
+    elif t == DOT:
+        name_lst = []
+        while isinstance(key, Dot):
+            name_lst.append(key.right.name)
+            key = key.left
+        name_lst.append(key.name)
+        name_lst.reverse()
+        path = name_lst[:-1]
+        last = name_lst[-1]
+        line_file = (key.line_num, key.file)
+
+        def store_dot(env, value):
+            scope = env
+            for n in path:
+                scope = scope.get(n, line_file).env
+            scope.assign(last, value)
+
+        return store_dot
+    else:
+        def store_unknown(env, value):
+            raise InterpretException("Unknown assignment, in {}, at line {}".format(key.file, key.line_num))
+
+        return store_unknown
+
+
+def compile_assignment(node: AssignmentNode):
+    store = compile_store(node.left)
+    right = compile_node(node.right)
+
+    def assign(env):
+        value = right(env)
+        store(env, value)
+        return value
+
+    return assign
+
+
+def compile_operator(node: OperatorNode):
+    left = compile_node(node.left)
+    right = compile_node(node.right)
+    symbol = node.operation
+    if symbol in lex.LAZY:
+        return compile_lazy_operator(symbol, left, right)
+    op = NUMBER_OPERATORS.get(symbol, ARITHMETIC_TABLE[symbol])
+
+    def operator(env):
+        lv = left(env)
+        rv = right(env)
+        t = type(lv)
+        if t is int or t is float:
+            return op(lv, rv)
+        return value_arithmetic(lv, rv, symbol, env)
+
+    return operator
+
+
+def compile_update(node: UpdateNode):
+    key = node.left
+    right = compile_node(node.right)
+    symbol = node.operation
+    op = NUMBER_OPERATORS[symbol]
+    line_file = (node.line_num, node.file)
+
+    def update_value(lv, env):
+        rv = right(env)
+        t = type(lv)
+        if (t is int or t is float) and type(rv) in NUMBER_TYPES:
+            return op(lv, rv)
+        return value_arithmetic(lv, rv, symbol, env)
+
+    if key.type == NAME_NODE and key.depth is not None and key.depth != HEAP_DEPTH and key.auth != lex.PRIVATE:
+        name = key.name
+        depth = key.depth
+        fallback = compile_store(key)
+
+        def update_name(env):
+            scope = env
+            d = depth
+            while d > 0 and scope is not None:
+                scope = scope.outer
+                d -= 1
+            if scope is not None and name in scope.variables:
+                variables = scope.variables
+                value = update_value(variables[name], env)
+                variables[name] = value
+                return value
+            value = update_value(env.get(name, line_file), env)
+            fallback(env, value)
+            return value
+
+        return update_name
+    elif key.type == NAME_NODE:
+        name = key.name
+        store = compile_store(key)
+
+        def update(env):
+            value = update_value(env.get(name, line_file), env)
+            store(env, value)
+            return value
+
+        return update
+    elif key.type == DOT:
+        left = compile_node(key.left)
+        obj = key.right
+        by_this = isinstance(key.left, NameNode) and key.left.name == "this"
+        cache = key.cache
+        if obj.type == NAME_NODE:
+            name = obj.name
+
+            def update_attribute(env):
+                instance = left(env)
+                if dot_entry(cache, instance, name, by_this, line_file) is not None:
+                    raise SplException("Cannot assign attribute '{}' of a native object, in file {}, at line {}"
+                                       .format(name, node.file, node.line_num))
+                scope = instance.env
+                value = update_value(scope.variables[name], env)
+                scope.assign(name, value)
+                return value
+
+            return update_attribute
+        elif obj.type == FUNCTION_CALL and obj.f_name == "__getitem__":
+            args = compile_args(obj)
+            set_cache = node.cache
+
+            def call(c, instance, name, values):
+                entry = dot_entry(c, instance, name, by_this, line_file)
+                if entry is None:
+                    return call_method(instance, name, values, line_file)
+                try:
+                    return entry(instance, *values)
+                except IndexError as ie:
+                    raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}"
+                                                   .format(node.file, node.line_num))
+
+            def update_item(env):
+                instance = left(env)
+                values = [arg(env) for arg in args]
+                value = update_value(call(cache, instance, "__getitem__", values), env)
+                values.append(value)
+                call(set_cache, instance, "__setitem__", values)
+                return value
+
+            return update_item
+    return compile_fallback(node)
+
+
+def compile_lazy_operator(symbol, left, right):
+    def check(lv):
+        if not (lv is None or isinstance(lv, bool) or isinstance(lv, int) or isinstance(lv, float)):
+            raise InterpretException("Operator '||' '&&' do not support type.")
+
+    if symbol == "&&":
+        def and_(env):
+            lv = left(env)
+            check(lv)
+            return right(env) if lv else False
+
+        return and_
+    else:
+        def or_(env):
+            lv = left(env)
+            check(lv)
+            return True if lv else right(env)
+
+        return or_
+
+
+def compile_negative(node: NegativeExpr):
+    value = compile_node(node.value)
+
+    def negative(env):
+        return -value(env)
+
+    return negative
+
+
+def compile_inline(node: InlineNode):
+    params = node.params
+    args = [compile_node(arg) for arg in node.args.lines]
+    body = compile_node(node.body)
+
+    def inline(env):
+        variables = env.variables
+        for i in range(len(params)):
+            variables[params[i]] = args[i](env)
+        result = body(env)
+        if type(result) is Completion:
+            return body_result(result)
+        return result
+
+    return inline
+
+
+def compile_invariant(node: InvariantNode):
+    name = node.name
+    value = compile_node(node.value)
+
+    def invariant(env):
+        v = env.variables.get(name)
+        if v is None:
+            v = value(env)
+            env.variables[name] = v
+        return v
+
+    return invariant
+
+
+def compile_not(node: NotExpr):
+    value = compile_node(node.value)
+
+    def not_(env):
+        return not bool(value(env))
+
+    return not_
+
+
+def compile_return(node: ReturnStmt):
+    value = compile_node(node.value)
+
+    if isinstance(node.value, JumpNode):
+        def tail_return(env):
+            result = value(env)
+            if type(result) is Completion:
+                return result
+            return Completion(RETURN, result, None)
+
+        return tail_return
+
+    def return_(env):
+        return Completion(RETURN, value(env), None)
+
+    return return_
+
+
+def compile_throw(node: ThrowStmt):
+    value = compile_node(node.value)
+
+    def throw(env):
+        raise RuntimeException(value(env))
+
+    return throw
+
+
+def compile_if(node: IfStmt):
+    condition = compile_node(node.condition)
+    then_block = compile_node(node.then_block)
+    else_block = compile_node(node.else_block)
+
+    def if_(env):
+        if condition(env):
+            return then_block(env)
+        else:
+            return else_block(env)
+
+    return if_
+
+
+def compile_while(node: WhileStmt):
+    condition = compile_node(node.condition)
+    body = compile_node(node.body)
+
+    if not may_jump(node.body):
+        def while_(env):
+            result = 0
+            while condition(env):
+                result = body(env)
+            return result
+
+        return while_
+
+    def jumping_while(env):
+        result = 0
+        while condition(env):
+            result = body(env)
+            if type(result) is Completion:
+                if result.kind == CONTINUE:
+                    result = None
+                else:
+                    return exit_loop(result)
+        return result
+
+    return jumping_while
+
+
+def compile_for_loop(node: ForLoopStmt):
+    lines = node.condition.lines
+    body = compile_node(node.body)
+    if len(lines) == 3:
+        start = compile_node(lines[0])
+        end = compile_node(lines[1])
+        step = compile_node(lines[2])
+
+        if not may_jump(node.body):
+            def for_loop(env):
+                result = start(env)
+                while end(env):
+                    result = body(env)
+                    step(env)
+                return result
+
+            return for_loop
+
+        def jumping_for_loop(env):
+            result = start(env)
+            while end(env):
+                result = body(env)
+                if type(result) is Completion:
+                    if result.kind == CONTINUE:
+                        result = None
+                    else:
+                        return exit_loop(result)
+                step(env)
+            return result
+
+        return jumping_for_loop
+    elif len(lines) == 2:
+        invariant = lines[0].name
+        target = compile_node(lines[1])
+        line_file = (node.line_num, node.file)
+
+        def for_each_loop(env):
+            iterable = target(env)
+            if isinstance(iterable, Iterable):
+                result = None
+                for x in iterable:
+                    env.assign(invariant, x)
+                    result = body(env)
+                    if type(result) is Completion:
+                        if result.kind == CONTINUE:
+                            result = None
+                        else:
+                            return exit_loop(result)
+                return result
+            elif isinstance(iterable, ClassInstance) and is_subclass_of(class_of(iterable), "Iterable", env):
+                iterator: ClassInstance = call_method(iterable, "__iter__", [], line_file)
+                result = None
+                while True:
+                    res = call_method(iterator, "__next__", [], line_file)
+                    if isinstance(res, ClassInstance) and is_subclass_of(class_of(res), "StopIteration", env):
+                        break
+                    env.assign(invariant, res)
+                    result = body(env)
+                    if type(result) is Completion:
+                        if result.kind == CONTINUE:
+                            result = None
+                        else:
+                            return exit_loop(result)
+                return result
+            else:
+                raise SplException("For-each loop on non-iterable objects, in {}, at line {}"
+                                   .format(node.file, node.line_num))
+
+        return for_each_loop
+    else:
+        return compile_fallback(node)
+
+
+def compile_range(node: RangeNode):
+    lines = node.loop.condition.lines
+    start = compile_node(node.start)
+    bound = compile_node(node.bound)
+    step = compile_node(node.step)
+    end = compile_node(lines[1])
+    increment = compile_node(lines[2])
+    body = compile_node(node.body)
+    name = node.index.name
+    operation = node.operation
+    negative = node.negative
+
+    def range_loop(env):
+        result = start(env)
+        indices = counted_range(result, operation, bound(env), step(env), negative)
+        if indices is None:
+            # the loop goes on from its initialization
+            while end(env):
+                result = body(env)
+                if type(result) is Completion:
+                    if result.kind == CONTINUE:
+                        result = None
+                    else:
+                        return exit_loop(result)
+                increment(env)
+            return result
+        variables = scope_of(env, name).variables
+        for i in indices:
+            variables[name] = i
+            result = body(env)
+            if type(result) is Completion:
+                if result.kind == CONTINUE:
+                    result = None
+                else:
+                    return exit_loop(result)
+        if len(indices) > 0:
+            # the index stops at the first value out of the range
+            variables[name] = indices[-1] + indices.step
+        return result
+
+    return range_loop
+
+
+def compile_def(node: DefStmt):
+    def def_(env):
+        return eval_def(node, env)
+
+    return def_
+
+
+def compile_class_stmt(node: ClassStmt):
+    def class_stmt(env):
+        return eval_class_stmt(node, env)
+
+    return class_stmt
+
+
+def compile_import(node: ImportStmt):
+    # the block of a later import of the same file is compiled only if it runs before the first import
+    block = compile_node(node.block) if node.source is None else None
+    name = node.class_name
+    path = node.path
+
+    def import_(env):
+        imp = MODULES.get(path)
+        if imp is None:
+            imp = new_module(name, path, env)
+            run_body(compile_node(node.source.block) if block is None else block, imp.env)
+        env.add_heap(name, imp)
+        return imp
+
+    return import_
+
+
+def compile_args(node):
+    """
+    Compiles the arguments of a call.
+
+    :param node: the call node, whose args is a BlockStmt or None
+    :return: the list of compiled arguments
+    """
+    if node.args is None:
+        return []
+    return [compile_node(arg) for arg in node.args.lines]
+
+
+def invoke(func: Function, args: list, node, env: Environment):
+    """
+    Calls a spl function with evaluated arguments.
+
+    :param func: the function to be called
+    :param args: the evaluated arguments
+    :param node: the call node, used for presets and error messages
+    :param env: the environment where the presets are evaluated
+    :return: the function result
+    """
+    scope = invoke_scope(func, args, node, env)
+    if func.memo is not None:
+        return memo_call(func, scope, run_function)
+    result = compile_node(func.body)(scope)
+    release_scope(scope)
+    if type(result) is Completion:
+        return body_result(result)
+    return result
+
+
+def invoke_scope(func: Function, args: list, node, env: Environment) -> Environment:
+    """
+    Returns the scope of a spl function call, with the evaluated arguments bound to the parameters.
+
+    :param func: the function to be called
+    :param args: the evaluated arguments
+    :param node: the call node, used for presets and error messages
+    :param env: the environment where the presets are evaluated
+    :return: the function scope
+    """
+    scope = function_scope(env.heap, func.outer_scope, node.f_name)
+
+    params = func.params
+    if len(args) > len(params):
+        raise SplException("Too few or too many arguments for function '{}', in '{}', at line {}"
+                           .format(node.f_name, node.file, node.line_num))
+    for i in range(len(params)):
+        if i < len(args):
+            scope.variables[params[i].name] = args[i]
+        else:
+            scope.variables[params[i].name] = compile_node(func.presets[i])(env)
+    return scope
+
+
+def run_closure(body, env: Environment):
+    return compile_node(body)(env)
+
+
+def run_function(body, env: Environment):
+    return run_body(compile_node(body), env)
+
+
+def call_method(instance, name: str, args: list, line_file: tuple):
+    """
+    Calls a method of a class instance or a module.
+
+    :param instance: the class instance or module
+    :param name: the method name
+    :param args: the evaluated arguments
+    :param line_file: the line number and file name of the call
+    :return: the method result
+    """
+    func = instance.env.get(name, line_file)
+    if isinstance(func, Function):
+        call = FuncCall(line_file, name)
+        return invoke(func, args, call, instance.env)
+    elif isinstance(func, NativeFunction):
+        return func.call(args)
+    else:
+        raise InterpretException("Not a function call")
+
+
+def compile_call(node: FuncCall):
+    f_name = node.f_name
+    line_file = (node.line_num, node.file)
+    args = compile_args(node)
+
+    depth = node.depth
+
+    def call(env):
+        if depth is None:
+            func = env.get(f_name, line_file)
+        else:
+            func = env.resolved_get(f_name, depth, line_file)
+        values = [arg(env) for arg in args]
+        if isinstance(func, Function):
+            return invoke(func, values, node, env)
+        elif isinstance(func, NativeFunction):
+            result = func.call(values)
+            if isinstance(result, BlockStmt):
+                # Special case for "eval"
+                return compile_node(result)(env)
+            else:
+                return result
+        else:
+            raise InterpretException("Not a function call")
+
+    return call
+
+
+def compile_anonymous_call(node: AnonymousCall):
+    left = compile_node(node.left)
+    fc = FuncCall((node.line_num, node.file), "=>")
+    fc.args = node.right.args
+    call = compile_node(fc)
+
+    def anonymous_call(env):
+        env.assign("=>", left(env))
+        return call(env)
+
+    return anonymous_call
+
+
+def compile_dot(node: Dot):
+    left = compile_node(node.left)
+    obj = node.right
+    by_this = isinstance(node.left, NameNode) and node.left.name == "this"
+    line_file = (node.line_num, node.file)
+    cache = node.cache
+    if obj.type == NAME_NODE:
+        name = obj.name
+
+        def attribute(env):
+            instance = left(env)
+            entry = dot_entry(cache, instance, name, by_this, line_file)
+            if entry is None:
+                return instance.env.variables[name]
+            return entry
+
+        return attribute
+    elif obj.type == FUNCTION_CALL:
+        name = obj.f_name
+        args = compile_args(obj)
+
+        def method(env):
+            instance = left(env)
+            entry = dot_entry(cache, instance, name, by_this, line_file)
+            if entry is None:
+                func = instance.env.get(name, line_file)
+                values = [arg(env) for arg in args]
+                if isinstance(func, Function):
+                    return invoke(func, values, obj, env)
+                elif isinstance(func, NativeFunction):
+                    return func.call(values)
+                else:
+                    raise InterpretException("Not a function call")
+            values = [arg(env) for arg in args]
+            try:
+                return entry(instance, *values)
+            except IndexError as ie:
+                raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}"
+                                               .format(node.file, node.line_num))
+
+        return method
+    else:
+        return compile_fallback(node)
+
+
+def compile_class_init(node: ClassInit):
+    class_name = node.class_name
+    line_file = (node.line_num, node.file)
+    args = compile_args(node)
+    call = FuncCall(line_file, class_name)
+
+    def inherit(cla: Class, scope: Environment):
+        for sc in cla.superclass_names:
+            inherit(cla.outer_scope.get_class(sc), scope)
+        run_body(compile_node(cla.body), scope)  # this step just fills the scope
+
+    def class_init(env):
+        cla: Class = env.get_class(class_name, line_file)
+
+        scope = layout_scope(cla, env)
+        if scope is None:
+            scope = Environment(False, env.heap)
+            scope.scope_name = "Class scope<{}>".format(cla.class_name)
+            inherit(cla, scope)
+            scope.outer = cla.outer_scope
+            for k in scope.variables:
+                v = scope.variables[k]
+                if isinstance(v, Function):
+                    v.outer_scope = scope
+
+        instance = ClassInstance(scope, cla)
+
+        if node.args:
+            constructor = scope.get(cla.class_name, line_file)
+            if not isinstance(constructor, Function):
+                raise InterpretException("Not a function call")
+            values = [arg(env) for arg in args]
+            invoke(constructor, values, call, scope)
+        return instance
+
+    return class_init
+
+
+def compile_try(node: TryStmt):
+    try_block = compile_node(node.try_block)
+    catches = [([line.right.name for line in cat.condition.lines], compile_node(cat.then))
+               for cat in node.catch_blocks]
+    finally_block = compile_node(node.finally_block) if node.finally_block else None
+
+    def try_block_(env):
+        try:
+            return try_block(env)
+        except RuntimeException as re:  # catches the exceptions thrown by SPL program
+            exception_class = class_of(re.exception)
+            for names, then in catches:
+                for catch_name in names:
+                    if is_subclass_of(exception_class, catch_name, env):
+                        return then(env)
+            raise re
+        except Exception as e:  # catches the exceptions raised by python
+            for names, then in catches:
+                for catch_name in names:
+                    if catch_name == "Exception":
+                        return then(env)
+            raise e
+
+    if finally_block is None:
+        return try_block_
+
+    def try_(env):
+        try:
+            result = try_block_(env)
+        except BaseException:
+            final = finally_block(env)
+            if type(final) is Completion:  # a 'return' in the finally block overrides the exception
+                return final
+            raise
+        final = finally_block(env)
+        if type(final) is not Completion and type(result) is Completion:
+            return result
+        return final
+
+    return try_
+
+
+def compile_jump(node: JumpNode):
+    to = node.to
+    line_file = (node.line_num, node.file)
+    args = compile_args(node)
+    call = compile_node(node.call)
+    depth = node.depth
+
+    def jump(env):
+        if depth is None:
+            func = env.get(to, line_file)
+        else:
+            func = env.resolved_get(to, depth, line_file)
+        if isinstance(func, Function) and func.memo is None:
+            values = [arg(env) for arg in args]
+            return Completion(TAIL_CALL, (run_closure, func.body, invoke_scope(func, values, node.call, env)), None)
+        return call(env)
+
+    return jump
+
+
+COMPILER_TABLE = {
+    INT_NODE: lambda n: _constant(n.value),
+    FLOAT_NODE: lambda n: _constant(n.value),
+    LITERAL_NODE: compile_literal,
+    NAME_NODE: compile_name,
+    BOOLEAN_STMT: compile_boolean,
+    NULL_STMT: lambda n: _null,
+    BREAK_STMT: compile_break,
+    CONTINUE_STMT: compile_continue,
+    ASSIGNMENT_NODE: compile_assignment,
+    DOT: compile_dot,
+    ANONYMOUS_CALL: compile_anonymous_call,
+    OPERATOR_NODE: compile_operator,
+    UPDATE_NODE: compile_update,
+    NUMBER_OPERATOR: compile_operator,
+    NEGATIVE_EXPR: compile_negative,
+    INVARIANT_NODE: compile_invariant,
+    INLINE_NODE: compile_inline,
+    RANGE_NODE: compile_range,
+    NOT_EXPR: compile_not,
+    RETURN_STMT: compile_return,
+    BLOCK_STMT: compile_block,
+    IF_STMT: compile_if,
+    WHILE_STMT: compile_while,
+    FOR_LOOP_STMT: compile_for_loop,
+    DEF_STMT: compile_def,
+    FUNCTION_CALL: compile_call,
+    CLASS_STMT: compile_class_stmt,
+    CLASS_INIT: compile_class_init,
+    THROW_STMT: compile_throw,
+    TRY_STMT: compile_try,
+    JUMP_NODE: compile_jump,
+    IMPORT_STMT: compile_import
+}
@@ -0,0 +1,511 @@
+""" The spl bytecode compiler, 'spc'.
+
+Compiles the abstract syntax tree produced by spl_parser into spl_bytecode Code objects, which are run by
+spl_virtual_machine.
+"""
+
+from spl_parser import *
+from spl_bytecode import *
+import spl_interpreter as inter
+
+
+class _Loop:
+    """
+    A loop enclosing the statement being compiled.
+    """
+
+    def __init__(self, for_each: bool):
+        self.for_each = for_each
+        self.break_jumps = []
+        self.continue_jumps = []
+
+
+class _Try:
+    """
+    A try statement enclosing the statement being compiled.
+    """
+
+    def __init__(self, finally_block):
+        self.finally_block = finally_block
+        self.handlers = 0  # number of handlers of this statement that are currently set up
+
+
+class Compiler:
+    """
+    Compiles one Code object. Nested functions, classes and modules are compiled by nested compilers.
+
+    :type blocks: list
+    :type modules: dict
+    """
+
+    def __init__(self, name: str, file: str):
+        self.code = Code(name, file)
+        self.const_index = {}
+        self.name_index = {}
+        self.line = 0
+        self.blocks = []  # the enclosing loops and try statements, innermost last
+        self.modules = {}  # the code of each imported file, by path, shared with the nested compilers
+
+    def compile(self, node) -> Code:
+        """
+        Compiles a node as the whole body of the code.
+
+        :param node: the root node
+        :return: the compiled code
+        """
+        self.visit(node)
+        self.emit(RETURN_VALUE)
+        return self.code
+
+    # Emitting
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        index = len(self.code.instructions)
+        self.code.instructions.append(op)
+        self.code.instructions.append(arg)
+        self.code.lines.append(self.line)
+        return index
+
+    def here(self) -> int:
+        return len(self.code.instructions)
+
+    def patch(self, index: int, target: int = None):
+        self.code.instructions[index + 1] = self.here() if target is None else target
+
+    def const(self, value) -> int:
+        key = (type(value), value.literal if isinstance(value, inter.String) else value)
+        try:
+            return self.const_index[key]
+        except (KeyError, TypeError):
+            index = len(self.code.consts)
+            self.code.consts.append(value)
+            try:
+                self.const_index[key] = index
+            except TypeError:
+                pass
+            return index
+
+    def name(self, name: str) -> int:
+        if name in self.name_index:
+            return self.name_index[name]
+        index = len(self.code.names)
+        self.code.names.append(name)
+        self.name_index[name] = index
+        return index
+
+    def nested(self, name: str, node, file: str) -> Code:
+        return self.nested_compiler(name, file).compile(node)
+
+    def nested_compiler(self, name: str, file: str):
+        """
+        Returns a compiler of a nested code, sharing the imported modules of this compiler.
+
+        :param name: the name of the nested code
+        :param file: the name of the source file of the nested code
+        :return: the new compiler
+        """
+        compiler = Compiler(name, file)
+        compiler.line = self.line
+        compiler.modules = self.modules
+        return compiler
+
+    # Visiting
+
+    def visit(self, node):
+        """
+        Compiles a node, the code leaves exactly one value on the stack.
+
+        :param node: the node, or a raw value produced by the optimizer
+        """
+        if node is None or type(node) in inter.SELF_RETURN_TABLE_2:
+            self.emit(LOAD_CONST, self.const(node))
+            return
+        if node.line_num > 0:
+            self.line = node.line_num
+        VISIT_TABLE[node.type](self, node)
+
+    def visit_block(self, node: BlockStmt):
+        if len(node.lines) == 0:
+            self.emit(LOAD_CONST, self.const(0))
+        for i in range(len(node.lines)):
+            if i > 0:
+                self.emit(POP_TOP)
+            self.visit(node.lines[i])
+
+    def visit_name(self, node: NameNode):
+        depth = node.depth
+        if depth is None:
+            self.emit(LOAD_NAME, self.name(node.name))
+        elif depth == 0:
+            self.emit(LOAD_LOCAL, self.name(node.name))
+        elif depth == HEAP_DEPTH:
+            self.emit(LOAD_HEAP, self.name(node.name))
+        else:
+            self.emit(LOAD_OUTER, self.const((node.name, depth)))
+
+    def store(self, key: Node):
+        """
+        Assigns the value on the top of the stack to the target, the value is kept.
+
+        :param key: the left side of the assignment
+        """
+        if key.type == NAME_NODE:
+            if key.auth == lex.PRIVATE:
+                self.emit(STORE_PRIVATE, self.name(key.name))
+            elif key.depth is None:
+                self.emit(STORE_NAME, self.name(key.name))
+            elif key.depth == 0:
+                self.emit(STORE_LOCAL, self.name(key.name))
+            else:
+                self.emit(STORE_OUTER, self.const((key.name, key.depth)))
+        elif key.type == DOT:
+            name_lst = []
+            while isinstance(key, Dot):
+                name_lst.append(key.right.name)
+                key = key.left
+            name_lst.append(key.name)
+            name_lst.reverse()
+            self.emit(STORE_PATH, self.const(tuple(name_lst)))
+        else:
+            raise CompileException("Unknown assignment, in {}, at line {}".format(key.file, key.line_num))
+
+    def visit_assignment(self, node: AssignmentNode):
+        self.visit(node.right)
+        self.store(node.left)
+
+    def visit_operator(self, node: OperatorNode):
+        self.visit(node.left)
+        if node.operation in lex.LAZY:
+            jump = self.emit(AND_JUMP if node.operation == "&&" else OR_JUMP)
+            self.visit(node.right)
+            self.patch(jump)
+        else:
+            self.visit(node.right)
+            self.emit(BINARY_OP, OPERATOR_INDEX[node.operation])
+
+    def visit_update(self, node: UpdateNode):
+        key = node.left
+        op = OPERATOR_INDEX[node.operation]
+        if key.type == NAME_NODE:
+            self.visit(key)
+            self.visit(node.right)
+            self.emit(BINARY_OP, op)
+            self.store(key)
+            return
+        if key.type == DOT:
+            by_this = isinstance(key.left, NameNode) and key.left.name == "this"
+            obj = key.right
+            if obj.type == NAME_NODE:
+                self.visit(key.left)
+                self.emit(DUP_TOP)
+                self.emit(LOAD_ATTR_THIS if by_this else LOAD_ATTR, self.name(obj.name))
+                self.visit(node.right)
+                self.emit(BINARY_OP, op)
+                self.emit(ROT_TWO)
+                self.emit(STORE_ATTR, self.name(obj.name))
+                return
+            elif obj.type == FUNCTION_CALL and obj.f_name == "__getitem__" and len(obj.args.lines) == 1:
+                self.visit(key.left)
+                self.visit(obj.args.lines[0])
+                self.emit(DUP_TOP_TWO)
+                self.emit(CALL_METHOD, self.const(("__getitem__", 1, by_this)))
+                self.visit(node.right)
+                self.emit(BINARY_OP, op)
+                self.emit(STORE_ITEM, 1 if by_this else 0)
+                return
+        raise CompileException("Unknown assignment, in {}, at line {}".format(node.file, node.line_num))
+
+    def visit_unary(self, node: UnaryOperator):
+        self.visit(node.value)
+        self.emit(NEGATIVE if node.type == NEGATIVE_EXPR else NOT)
+
+    def visit_args(self, node) -> int:
+        if node.args is None:
+            return 0
+        for arg in node.args.lines:
+            self.visit(arg)
+        return len(node.args.lines)
+
+    def visit_call(self, node: FuncCall):
+        argc = self.visit_args(node)
+        self.emit(CALL_FUNCTION, self.const((node.f_name, argc, node.depth)))
+
+    def visit_anonymous_call(self, node: AnonymousCall):
+        self.visit(node.left)
+        self.emit(STORE_NAME, self.name("=>"))
+        self.emit(POP_TOP)
+        argc = self.visit_args(node.right)
+        self.emit(CALL_FUNCTION, self.const(("=>", argc, None)))
+
+    def visit_dot(self, node: Dot):
+        self.visit(node.left)
+        by_this = isinstance(node.left, NameNode) and node.left.name == "this"
+        obj = node.right
+        if obj.type == NAME_NODE:
+            self.emit(LOAD_ATTR_THIS if by_this else LOAD_ATTR, self.name(obj.name))
+        elif obj.type == FUNCTION_CALL:
+            argc = self.visit_args(obj)
+            self.emit(CALL_METHOD, self.const((obj.f_name, argc, by_this)))
+        else:
+            raise CompileException("Unknown Syntax, in {}, at line {}".format(node.file, node.line_num))
+
+    def visit_class_init(self, node: ClassInit):
+        argc = self.visit_args(node) if node.args else -1
+        self.emit(NEW, self.const((node.class_name, argc)))
+
+    def visit_if(self, node: IfStmt):
+        self.visit(node.condition)
+        to_else = self.emit(POP_JUMP_IF_FALSE)
+        self.visit(node.then_block)
+        to_end = self.emit(JUMP)
+        self.patch(to_else)
+        self.visit(node.else_block)
+        self.patch(to_end)
+
+    def visit_while(self, node: WhileStmt):
+        self.emit(LOAD_CONST, self.const(0))  # the result
+        start = self.here()
+        self.visit(node.condition)
+        to_end = self.emit(POP_JUMP_IF_FALSE)
+        self.emit(POP_TOP)
+        loop = _Loop(False)
+        self.blocks.append(loop)
+        self.visit(node.body)
+        self.blocks.pop()
+        self.emit(JUMP, start)
+        for jump in loop.continue_jumps:
+            self.patch(jump, start)
+        self.patch(to_end)
+        for jump in loop.break_jumps:
+            self.patch(jump)
+
+    def visit_for_loop(self, node: ForLoopStmt):
+        lines = node.condition.lines
+        if len(lines) == 3:
+            self.visit(lines[0])  # the result
+            start = self.here()
+            self.visit(lines[1])
+            to_end = self.emit(POP_JUMP_IF_FALSE)
+            self.emit(POP_TOP)
+            loop = _Loop(False)
+            self.blocks.append(loop)
+            self.visit(node.body)
+            self.blocks.pop()
+            for jump in loop.continue_jumps:
+                self.patch(jump)
+            self.visit(lines[2])
+            self.emit(POP_TOP)
+            self.emit(JUMP, start)
+            self.patch(to_end)
+            for jump in loop.break_jumps:
+                self.patch(jump)
+        elif len(lines) == 2:
+            self.visit(lines[1])
+            self.emit(GET_ITER)
+            self.emit(LOAD_CONST, self.const(None))  # the result
+            start = self.here()
+            to_end = self.emit(FOR_ITER)
+            self.emit(STORE_NAME, self.name(lines[0].name))
+            self.emit(POP_TOP)
+            self.emit(POP_TOP)
+            loop = _Loop(True)
+            self.blocks.append(loop)
+            self.visit(node.body)
+            self.blocks.pop()
+            self.emit(JUMP, start)
+            for jump in loop.continue_jumps:
+                self.patch(jump, start)
+            for jump in loop.break_jumps:
+                self.patch(jump)
+            if loop.break_jumps:
+                # stack is [iterator, result]
+                self.emit(ROT_TWO)
+                self.emit(POP_TOP)
+            self.patch(to_end)
+        else:
+            raise CompileException("Wrong argument number for 'for' loop, in {}, at line {}"
+                                   .format(node.file, node.line_num))
+
+    def unwind(self, until: int):
+        """
+        Leaves the try statements in self.blocks[until:], running their finally blocks.
+
+        :param until: the index in self.blocks of the outermost block to leave
+        """
+        blocks = self.blocks
+        for i in range(len(blocks) - 1, until - 1, -1):
+            block = blocks[i]
+            if isinstance(block, _Try) and block.handlers > 0:
+                for _ in range(block.handlers):
+                    self.emit(POP_TRY)
+                if block.finally_block is not None:
+                    self.blocks = blocks[:i]
+                    self.visit(block.finally_block)
+                    self.emit(POP_TOP)
+                    self.blocks = blocks
+
+    def visit_break(self, node, is_break=True):
+        i = len(self.blocks) - 1
+        while i >= 0 and not isinstance(self.blocks[i], _Loop):
+            i -= 1
+        if i < 0:
+            raise CompileException("'{}' outside loop, in file {}, at line {}"
+                                   .format("break" if is_break else "continue", node.file, node.line_num))
+        loop: _Loop = self.blocks[i]
+        self.unwind(i + 1)
+        self.emit(LOAD_CONST, self.const(None))  # the result
+        if is_break:
+            loop.break_jumps.append(self.emit(JUMP))
+        else:
+            loop.continue_jumps.append(self.emit(JUMP))
+
+    def visit_continue(self, node):
+        self.visit_break(node, False)
+
+    def visit_return(self, node: ReturnStmt):
+        value = node.value
+        if isinstance(value, JumpNode) and not any(isinstance(b, _Try) and b.handlers > 0 for b in self.blocks):
+            # a tail call, which re-uses the current frame if it calls a compiled function
+            argc = self.visit_args(value)
+            self.emit(JUMP_CALL, self.const((value.to, argc, value.depth)))
+        else:
+            self.visit(value)
+            self.unwind(0)
+        self.emit(RETURN_VALUE)
+
+    def visit_throw(self, node: ThrowStmt):
+        self.visit(node.value)
+        self.emit(THROW)
+
+    def visit_try(self, node: TryStmt):
+        block = _Try(node.finally_block)
+        setup_finally = None
+        setup_catch = None
+        if node.finally_block is not None:
+            setup_finally = self.emit(SETUP_TRY)
+            block.handlers += 1
+        if node.catch_blocks:
+            setup_catch = self.emit(SETUP_TRY)
+            block.handlers += 1
+        self.blocks.append(block)
+        self.visit(node.try_block)
+        if setup_catch is not None:
+            self.emit(POP_TRY)
+            block.handlers -= 1
+            to_end = [self.emit(JUMP)]
+            self.patch(setup_catch)
+            for cat in node.catch_blocks:
+                names = tuple(line.right.name for line in cat.condition.lines)
+                self.emit(CATCH, self.const(names))
+                to_next = self.emit(POP_JUMP_IF_FALSE)
+                self.emit(POP_TOP)
+                self.visit(cat.then)
+                to_end.append(self.emit(JUMP))
+                self.patch(to_next)
+            self.emit(RERAISE)
+            for jump in to_end:
+                self.patch(jump)
+        self.blocks.pop()
+        if setup_finally is not None:
+            self.emit(POP_TRY)
+            self.emit(POP_TOP)
+            self.visit(node.finally_block)
+            to_end = self.emit(JUMP)
+            self.patch(setup_finally)
+            self.visit(node.finally_block)
+            self.emit(POP_TOP)
+            self.emit(RERAISE)
+            self.patch(to_end)
+
+    def visit_def(self, node: DefStmt):
+        presets = []
+        for preset in node.presets:
+            if isinstance(preset, InvalidToken):
+                presets.append(None)
+            else:
+                presets.append(self.nested(node.name, preset, node.file))
+        body = self.nested(node.name, node.body, node.file)
+        info = FunctionInfo(node.name, [p.name for p in node.params], presets, body, node.auth, node.const,
+                            node.memo)
+        self.emit(MAKE_FUNCTION, self.const(info))
+
+    def visit_class(self, node: ClassStmt):
+        body = self.nested(node.class_name, node.block, node.file)
+        self.emit(MAKE_CLASS, self.const((node.class_name, tuple(node.superclass_names), body)))
+
+    def visit_import(self, node: ImportStmt):
+        # all imports of a file share the code of the first one
+        body = self.modules.get(node.path)
+        if body is None:
+            source = node if node.source is None else node.source
+            compiler = self.nested_compiler(source.class_name, node.path)
+            # registered before compiling, for the files importing themselves
+            body = self.modules[node.path] = compiler.code
+            compiler.compile(source.block)
+        self.emit(IMPORT, self.const((node.class_name, node.path, body)))
+
+    def visit_jump(self, node: JumpNode):
+        # not in the tail position, so it is just a call
+        argc = self.visit_args(node)
+        self.emit(CALL_FUNCTION, self.const((node.to, argc, node.depth)))
+
+
+def compile_ast(ast: BlockStmt, file_name: str) -> Code:
+    """
+    Compiles a parsed script into bytecode.
+
+    :param ast: the root of the abstract syntax tree
+    :param file_name: the name of the source file
+    :return: the compiled code
+    """
+    return Compiler("main", file_name).compile(ast)
+
+
+def _unsupported(compiler: Compiler, node: Node):
+    raise CompileException("Cannot compile {}, in {}, at line {}".format(type(node).__name__, node.file,
+                                                                        node.line_num))
+
+
+VISIT_TABLE = {
+    INT_NODE: lambda c, n: c.emit(LOAD_CONST, c.const(n.value)),
+    FLOAT_NODE: lambda c, n: c.emit(LOAD_CONST, c.const(n.value)),
+    LITERAL_NODE: lambda c, n: c.emit(LOAD_CONST, c.const(inter.String(n.literal))),
+    NAME_NODE: Compiler.visit_name,
+    BOOLEAN_STMT: lambda c, n: c.emit(LOAD_CONST, c.const(n.value == "true")),
+    NULL_STMT: lambda c, n: c.emit(LOAD_CONST, c.const(None)),
+    BREAK_STMT: Compiler.visit_break,
+    CONTINUE_STMT: Compiler.visit_continue,
+    ASSIGNMENT_NODE: Compiler.visit_assignment,
+    DOT: Compiler.visit_dot,
+    ANONYMOUS_CALL: Compiler.visit_anonymous_call,
+    OPERATOR_NODE: Compiler.visit_operator,
+    UPDATE_NODE: Compiler.visit_update,
+    NUMBER_OPERATOR: Compiler.visit_operator,
+    NEGATIVE_EXPR: Compiler.visit_unary,
+    NOT_EXPR: Compiler.visit_unary,
+    INVARIANT_NODE: lambda c, n: c.visit(n.value),  # the stack machine evaluates it as often as the expression
+    INLINE_NODE: lambda c, n: c.visit(n.call),
+    RANGE_NODE: lambda c, n: c.visit(n.loop),
+    RETURN_STMT: Compiler.visit_return,
+    BLOCK_STMT: Compiler.visit_block,
+    IF_STMT: Compiler.visit_if,
+    WHILE_STMT: Compiler.visit_while,
+    FOR_LOOP_STMT: Compiler.visit_for_loop,
+    DEF_STMT: Compiler.visit_def,
+    FUNCTION_CALL: Compiler.visit_call,
+    CLASS_STMT: Compiler.visit_class,
+    CLASS_INIT: Compiler.visit_class_init,
+    INVALID_TOKEN: lambda c, n: c.emit(INVALID),
+    ABSTRACT: lambda c, n: c.emit(ABSTRACT_METHOD),
+    THROW_STMT: Compiler.visit_throw,
+    TRY_STMT: Compiler.visit_try,
+    TYPE_NODE: _unsupported,
+    CATCH_STMT: _unsupported,
+    JUMP_NODE: Compiler.visit_jump,
+    IMPORT_STMT: Compiler.visit_import
+}
+
+
+class CompileException(Exception):
+    def __init__(self, msg=""):
+        Exception.__init__(self, msg)
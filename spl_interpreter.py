@@ -1,11 +1,14 @@
+import math
+import operator as operator_lib
+from collections import OrderedDict
 from spl_parser import *
 from spl_lib import *
 from spl_lexer import BINARY_OPERATORS
+from spl_resolver import walk
 
 LST = [72, 97, 112, 112, 121, 32, 66, 105, 114, 116, 104, 100, 97, 121, 32,
        73, 115, 97, 98, 101, 108, 108, 97, 33, 33, 33]
 
-<<<<<<< HEAD
 
 class Counter:
     def __init__(self):
@@ -60,6 +63,28 @@ DEBUG = False
 
 ID_COUNTER = Counter()
 
+# Counts the class definitions, the class layouts built before the last definition may be out of date
+CLASS_COUNTER = Counter()
+
+# The maximum number of classes, native types and modules remembered by the inline cache of an attribute access
+MAX_POLYMORPHISM = 4
+
+# The function scopes which can be reused by the next calls
+FREE_SCOPES = []
+MAX_FREE_SCOPES = 256
+
+# Whether the functions marked by DefStmt.memo remember their results, set by the '-memo' flag
+MEMOIZE = False
+
+# The maximum number of results remembered by each memoized function
+MEMO_SIZE = 1024
+
+# The hits and misses of the memoized functions, by (name, file, line) of their definitions
+MEMO_STATS = {}
+
+# The modules of the running interpreter, by the resolved path of their files
+MODULES = {}
+
 
 class Environment:
     """
@@ -69,8 +94,9 @@ class Environment:
     :type variables: dict
     :type privates: set
     :type outer: Environment
-    :type temp_vars: list
+    :type captured: bool
     """
+    __slots__ = ("is_global", "heap", "variables", "constants", "privates", "outer", "scope_name", "captured")
 
     def __init__(self, is_global, heap):
         self.is_global = is_global
@@ -79,15 +105,9 @@ class Environment:
         self.constants = {}
         self.privates = set()
         self.outer = None  # Outer environment, only used for inner functions
-        self.temp_vars = []
 
         self.scope_name = None
-
-        # environment signals
-        self.terminated = False
-        self.exit_value = None
-        self.broken = False
-        self.paused = False
+        self.captured = False  # whether a function or a class defined in this environment refers to it
 
         if is_global:
             self._add_natives()
@@ -135,17 +155,6 @@ class Environment:
     def add_heap(self, k, v):
         self.heap[k] = v
 
-    def terminate(self, exit_value):
-        self.terminated = True
-        self.broken = True
-        self.exit_value = exit_value
-
-    def break_loop(self):
-        self.broken = True
-
-    def pause_loop(self):
-        self.paused = True
-
     def assign(self, key, value):
         # if self.is_global:
         #     self.heap[key] = value
@@ -217,12 +226,49 @@ class Environment:
         :return:
         """
         v = self.inner_get(key)
-        if v == NULLPTR:
+        if v is NULLPTR:
             raise SplException("Name '{}' is not defined, in file {}, at line {}"
                                .format(key, line_file[1], line_file[0]))
         else:
             return v
 
+    def resolved_get(self, key: str, depth: int, line_file: tuple):
+        """
+        Returns the value of a key resolved by spl_resolver, without searching the outer environments.
+
+        :param key: the name
+        :param depth: the resolved depth, or HEAP_DEPTH
+        :param line_file: the line number and file name, for error message
+        :return: the value
+        """
+        try:
+            if depth == HEAP_DEPTH:
+                return self.heap[key]
+            scope = self
+            while depth > 0:
+                scope = scope.outer
+                depth -= 1
+            return scope.variables[key]
+        except (KeyError, AttributeError):  # not bound where it was resolved, happens only with eval or -o2 jumps
+            return self.get(key, line_file)
+
+    def resolved_assign(self, key: str, depth: int, value):
+        """
+        Assigns a key resolved by spl_resolver, without searching the outer environments.
+
+        :param key: the name
+        :param depth: the resolved depth
+        :param value: the value
+        """
+        scope = self
+        while depth > 0 and scope is not None:
+            scope = scope.outer
+            depth -= 1
+        if scope is not None and key in scope.variables:
+            scope.variables[key] = value
+        else:
+            self.assign(key, value)
+
     def direct_get(self, key: str):
         if key in self.constants:
             return self.constants[key]
@@ -231,7 +277,7 @@ class Environment:
 
     def contains_key(self, key: str):
         v = self.inner_get(key)
-        if v == NULLPTR:
+        if v is NULLPTR:
             return False
         else:
             return True
@@ -239,6 +285,27 @@ class Environment:
     def get_heap(self, class_name):
         return self.heap[class_name]
 
+    def get_class(self, class_name: str, line_file=(0, "interpreter")):
+        """
+        Returns the class of that name, which may be qualified by module names.
+
+        :param class_name: the class name, such as 'queue.LinkedList'
+        :param line_file: the line number and file name, for error message
+        :return: the Class
+        """
+        names = class_name.split(".")
+        scope = self
+        while scope:
+            cla = scope.constants.get(names[0], scope.variables.get(names[0]))
+            if isinstance(cla, Class) or isinstance(cla, Module):
+                break
+            scope = scope.outer
+        else:
+            cla = self.get(names[0], line_file)
+        for name in names[1:]:
+            cla = cla.env.get(name, line_file)
+        return cla
+
     def attributes(self):
         return {**self.constants, **self.variables}
 
@@ -277,6 +344,7 @@ class Function:
         self.presets: list = presets
         self.body = body
         self.outer_scope = None
+        self.memo: Memo = None  # the remembered results, None if the function is not memoized
 
     def __str__(self):
         return "Function<{}>".format(id(self))
@@ -286,10 +354,24 @@ class Function:
 
 
 class Class:
+    """
+    :type layout: ClassLayout
+    :type mro: list of Class
+    :type ancestors: frozenset of str
+    :type specials: frozenset of str
+    """
+
     def __init__(self, class_name: str, body: psr.BlockStmt):
         self.class_name = class_name
         self.body = body
         self.superclass_names = []
+        self.outer_scope = None
+        self.layout = None
+        self.mro = None  # this class and all its ancestors, built by linearize
+        self.ancestors = None  # the names of the classes in mro
+        self.specials = None  # the special method names which may be defined by the classes in mro
+        self.generation = -1  # the value of CLASS_COUNTER when mro was built
+        CLASS_COUNTER.increment()
 
     def __str__(self):
         if len(self.superclass_names):
@@ -301,6 +383,26 @@ class Class:
         return self.__str__()
 
 
+class ClassLayout:
+    """
+    The attributes which every instance of a class starts with, built once from the class bodies of the
+    whole hierarchy.
+
+    ===== Attributes =====
+    :param generation: the value of CLASS_COUNTER when this layout was built
+    :param variables: the (name, value) of the variables, in definition order, None if the class has no layout
+    :param constants: the (name, value) of the constants, in definition order
+    :param privates: the private names
+    """
+
+    def __init__(self, generation: int, scope_name, variables, constants, privates):
+        self.generation = generation
+        self.scope_name = scope_name
+        self.variables = variables
+        self.constants = constants
+        self.privates = privates
+
+
 class NullPointer:
     def __init__(self):
         pass
@@ -355,6 +457,9 @@ class String(NativeType, Iterable):
         else:
             raise TypeException("Cannot add <string> with {}".format(typeof(other)))
 
+    def __hash__(self):
+        return hash(self.literal)
+
     def __getitem__(self, index):
         return self.literal[index]
 
@@ -722,8 +827,6 @@ PRIMITIVE_FUNC_TABLE = {
     "void": "NoneType"
 }
 
-=======
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
 
 class Interpreter:
     """
@@ -733,17 +836,19 @@ class Interpreter:
     """
 
     def __init__(self, argv, encoding):
+        MODULES.clear()
         self.ast = None
         self.argv = argv
         self.env = Environment(True, {})
         self.env.add_heap("system", System(argv, encoding))
         self.env.scope_name = "Global"
 
-    def set_ast(self, ast: BlockStmt):
+    def set_ast(self, ast: BlockStmt, file_name: str = "console"):
         """
         Sets up the abstract syntax tree to be interpreted.
 
         :param ast: the root of the abstract syntax tree to be interpreted
+        :param file_name: the name of the script file
         :return: None
         """
         self.ast = ast
@@ -754,7 +859,7 @@ class Interpreter:
 
         :return: the exit value
         """
-        return evaluate(self.ast, self.env)
+        return evaluate_body(self.ast, self.env)
 
 
 class Module:
@@ -768,31 +873,29 @@ class ClassInstance:
     ===== Attributes =====
     :param class_name: name of this class
     :param env: instance attributes
+    :type cla: Class
     """
 
-    def __init__(self, env: Environment, class_name: str):
-        self.class_name = class_name
+    def __init__(self, env: Environment, cla):
+        self.class_name = cla.class_name
+        self.cla = cla  # the class object this instance is created from
         self.env = env
         self.env.variables["id"] = ID_COUNTER.get()
         ID_COUNTER.increment()
         self.env.variables["this"] = self
 
     def __hash__(self):
-        if self.env.contains_key("__hash__"):
-            call = psr.FuncCall((0, "interpreter"), "__hash__")
-            call.args = []
-            return inter.evaluate(call, self.env)
+        if has_special(self, "__hash__"):
+            return call_special(self, "__hash__", [])
         else:
-            return hash(self)
+            return object.__hash__(self)
 
     def __repr__(self):
         return self.__str__()
 
     def __str__(self):
-        if self.env.contains_key("__str__"):
-            call = psr.FuncCall((0, "interpreter"), "__str__")
-            call.args = []
-            return str(evaluate(call, self.env))
+        if has_special(self, "__str__"):
+            return str(call_special(self, "__str__", []))
         else:
             return self.class_name + ": " + str(self.env.variables)
         # return bytes(LST).decode("ascii")
@@ -805,20 +908,174 @@ class RuntimeException(SplException):
         self.exception = exception
 
 
+RETURN = 0
+BREAK = 1
+CONTINUE = 2
+TAIL_CALL = 3
+
+
+class Completion:
+    """
+    The result of a statement which completes abruptly, by 'return', 'break' or 'continue'.
+
+    It is passed up as the statement value, through blocks, if's and try's, until the loop or the function call
+    which it stops. Expressions never see it.
+
+    The value of a TAIL_CALL is the call still to be made, as (run, body, scope): the calling function returns first,
+    then its caller runs body in the prepared scope.
+    """
+    __slots__ = ("kind", "value", "line_file")
+
+    def __init__(self, kind: int, value, line_file):
+        self.kind = kind
+        self.value = value
+        self.line_file = line_file
+
+
+def body_result(completion: Completion):
+    """
+    Returns the value of a function, class, module or script body which completed abruptly.
+
+    :param completion: the completion of the body
+    :return: the returned value
+    """
+    if completion.kind == RETURN:
+        return completion.value
+    if completion.kind == TAIL_CALL:
+        return tail_call(completion)
+    raise SplException("'{}' outside loop, in file {}, at line {}"
+                       .format("break" if completion.kind == BREAK else "continue",
+                               completion.line_file[1], completion.line_file[0]))
+
+
+def tail_call(completion: Completion):
+    """
+    Makes the calls in tail position one after another, so that a chain of tail calls runs in constant python stack.
+
+    :param completion: the completion of the first tail call
+    :return: the result of the last call
+    """
+    while True:
+        run, body, scope = completion.value
+        result = run(body, scope)
+        release_scope(scope)
+        if type(result) is not Completion:
+            return result
+        if result.kind != TAIL_CALL:
+            return body_result(result)
+        completion = result
+
+
+def evaluate_body(body, env: Environment):
+    """
+    Evaluates the body of a function, a class, a module or the script, where 'return' stops.
+
+    :param body: the body
+    :param env: the working environment
+    :return: the returned value, or the value of the last statement if nothing is returned
+    """
+    result = evaluate(body, env)
+    if type(result) is Completion:
+        return body_result(result)
+    return result
+
+
 def eval_for_loop(node: ForLoopStmt, env: Environment):
     con: BlockStmt = node.condition
     start = con.lines[0]
     end = con.lines[1]
     step = con.lines[2]
     result = evaluate(start, env)
-    while not env.broken and evaluate(end, env):
+    while evaluate(end, env):
         result = evaluate(node.body, env)
-        env.paused = False
+        if type(result) is Completion:
+            if result.kind == CONTINUE:
+                result = None
+            else:
+                return exit_loop(result)
         evaluate(step, env)
-    env.broken = False
     return result
 
 
+def eval_range(node: RangeNode, env: Environment):
+    result = evaluate(node.start, env)
+    indices = counted_range(result, node.operation, evaluate(node.bound, env), evaluate(node.step, env),
+                            node.negative)
+    if indices is None:
+        # the loop goes on from its initialization
+        con = node.loop.condition
+        while evaluate(con.lines[1], env):
+            result = evaluate(node.body, env)
+            if type(result) is Completion:
+                if result.kind == CONTINUE:
+                    result = None
+                else:
+                    return exit_loop(result)
+            evaluate(con.lines[2], env)
+        return result
+    name = node.index.name
+    variables = scope_of(env, name).variables
+    for i in indices:
+        variables[name] = i
+        result = evaluate(node.body, env)
+        if type(result) is Completion:
+            if result.kind == CONTINUE:
+                result = None
+            else:
+                return exit_loop(result)
+    if len(indices) > 0:
+        # the index stops at the first value out of the range
+        variables[name] = indices[-1] + indices.step
+    return result
+
+
+def counted_range(start, operation: str, bound, step, negative: bool):
+    """
+    Returns the values taken by the index of a counted loop, or None if they are not a range of integers.
+
+    :param start: the initial index
+    :param operation: the comparison between the index and the bound
+    :param bound: the bound
+    :param step: the value added to the index, or subtracted if negative is True
+    :param negative: whether the step is subtracted
+    :return: the range of the index, or None
+    """
+    if type(start) is not int or type(step) is not int:
+        return None
+    if type(bound) is float:
+        if not math.isfinite(bound):
+            return None
+    elif type(bound) is not int:
+        return None
+    if negative:
+        step = -step
+    if operation == "<":
+        stop = math.ceil(bound)
+    elif operation == "<=":
+        stop = math.floor(bound) + 1
+    elif operation == ">":
+        stop = math.floor(bound)
+    else:
+        stop = math.ceil(bound) - 1
+    if step == 0 or (step > 0) != (operation[0] == "<"):
+        # the loop never ends, or does not move towards the bound
+        return None
+    return range(start, stop, step)
+
+
+def scope_of(env: Environment, name: str) -> Environment:
+    """
+    Returns the environment where a variable is stored, which must exist.
+
+    :param env: the working environment
+    :param name: the name of the variable
+    :return: the environment holding the variable
+    """
+    while name not in env.variables:
+        env = env.outer
+    return env
+
+
 def eval_for_each_loop(node: ForLoopStmt, env: Environment):
     con: BlockStmt = node.condition
     invariant = con.lines[0].name
@@ -829,65 +1086,68 @@ def eval_for_each_loop(node: ForLoopStmt, env: Environment):
         for x in iterable:
             env.assign(invariant, x)
             result = evaluate(node.body, env)
-            env.paused = False
-            if env.broken:
-                break
-        env.broken = False
+            if type(result) is Completion:
+                if result.kind == CONTINUE:
+                    result = None
+                else:
+                    return exit_loop(result)
         return result
-    elif isinstance(iterable, ClassInstance) and is_subclass_of(env.get_class(iterable.class_name), "Iterable", env):
-        lf = (0, "interpreter")
-        ite = FuncCall(lf, "__iter__")
-        iterator: ClassInstance = evaluate(ite, iterable.env)
+    elif isinstance(iterable, ClassInstance) and is_subclass_of(class_of(iterable), "Iterable", env):
+        iterator: ClassInstance = call_special(iterable, "__iter__", [])
         result = None
-        while not env.broken:
-            nex = FuncCall(lf, "__next__")
-            res = evaluate(nex, iterator.env)
-            if isinstance(res, ClassInstance) and is_subclass_of(env.get_class(res.class_name), "StopIteration", env):
+        while True:
+            res = call_special(iterator, "__next__", [])
+            if isinstance(res, ClassInstance) and is_subclass_of(class_of(res), "StopIteration", env):
                 break
             env.assign(invariant, res)
             result = evaluate(node.body, env)
-            env.paused = False
-        env.broken = False
+            if type(result) is Completion:
+                if result.kind == CONTINUE:
+                    result = None
+                else:
+                    return exit_loop(result)
         return result
     else:
         raise SplException("For-each loop on non-iterable objects, in {}, at line {}".format(node.file, node.line_num))
 
 
 def eval_try_catch(node: TryStmt, env: Environment):
+    if node.finally_block is None:
+        return eval_try_block(node, env)
     try:
-        result = evaluate(node.try_block, env)
-        env.terminated = False
+        result = eval_try_block(node, env)
+    except BaseException:
+        final = evaluate(node.finally_block, env)
+        if type(final) is Completion:  # a 'return' in the finally block overrides the exception
+            return final
+        raise
+    final = evaluate(node.finally_block, env)
+    if type(final) is not Completion and type(result) is Completion:
         return result
+    return final
+
+
+def eval_try_block(node: TryStmt, env: Environment):
+    try:
+        return evaluate(node.try_block, env)
     except RuntimeException as re:  # catches the exceptions thrown by SPL program
         exception: ClassInstance = re.exception
-        exception_class = env.get_class(exception.class_name)
+        exception_class = class_of(exception)
         catches = node.catch_blocks
         for cat in catches:
             for line in cat.condition.lines:
                 catch_name = line.right.name
                 if is_subclass_of(exception_class, catch_name, env):
-                    result = evaluate(cat.then, env)
-                    env.terminated = False
-                    return result
-                    # if node.finally_block is None:
-                    #     return result
-                    # else:
-                    #     env.terminated = False
+                    return evaluate(cat.then, env)
         raise re
     except Exception as e:  # catches the exceptions raised by python
         catches = node.catch_blocks
         for cat in catches:
             for line in cat.condition.lines:
                 catch_name = line.right.name
-                # exception_name = exception.class_name
                 if catch_name == "Exception":
-                    result = evaluate(cat.then, env)
-                    env.terminated = False
-                    return result
+                    return evaluate(cat.then, env)
         raise e
-    finally:
-        if node.finally_block:
-            return evaluate(node.finally_block, env)
 
 
 def is_subclass_of(child_class: Class, class_name: str, env: Environment) -> bool:
@@ -899,27 +1159,252 @@ def is_subclass_of(child_class: Class, class_name: str, env: Environment) -> boo
     :param env: the environment, doesn't matter whether it is global or not
     :return: whether the child class is the ancestor class itself or inherited from that class
     """
-    if child_class.class_name == class_name:
-        return True
+    if child_class.generation != CLASS_COUNTER.get():
+        linearize(child_class)
+    return class_name in child_class.ancestors
+
+
+def linearize(cla: Class):
+    """
+    Builds the method resolution order and the ancestor names of a class.
+
+    Superclasses are looked up by name, so the result is kept until another class is defined.
+
+    :param cla: the class
+    """
+    mro = [cla]
+    for sc in cla.superclass_names:
+        superclass = cla.outer_scope.get_class(sc)
+        if superclass.generation != CLASS_COUNTER.get():
+            linearize(superclass)
+        for c in superclass.mro:
+            if c not in mro:
+                mro.append(c)
+    cla.mro = mro
+    cla.ancestors = frozenset(c.class_name for c in mro)
+    specials = set()
+    for c in mro:
+        specials.update(name for name in defined_names(c.body) if name[:1] == "@" or name[:2] == "__")
+    cla.specials = frozenset(specials)
+    cla.generation = CLASS_COUNTER.get()
+
+
+def defined_names(body) -> set:
+    """
+    Returns the names which a class body may define, including some names which are only used.
+
+    :param body: the class body
+    :return: the names
+    """
+    if body.type == psr.BYTECODE:
+        return body.all_names()
+    names = set()
+    for node in walk(body):
+        if isinstance(node, DefStmt):
+            names.add(node.name)
+        elif isinstance(node, NameNode):
+            names.add(node.name)
+    return names
+
+
+def has_special(instance: ClassInstance, name: str) -> bool:
+    """
+    Returns whether a class instance may have a special method.
+
+    Special methods are the operator methods such as '@add', and the methods called by the interpreter,
+    such as '__str__' and '__next__'.
+
+    :param instance: the class instance
+    :param name: the special method name
+    :return: False if the class of the instance does not define that method
+    """
+    cla = instance.cla
+    if cla.generation != CLASS_COUNTER.get():
+        linearize(cla)
+    return name in cla.specials
+
+
+def call_special(instance: ClassInstance, name: str, args: list):
+    """
+    Calls a special method of a class instance.
+
+    :param instance: the class instance
+    :param name: the special method name
+    :param args: the evaluated arguments
+    :return: the method result
+    """
+    func = instance.env.get(name, (0, "interpreter"))
+    if isinstance(func, Function):
+        return call_with_args(func, args, name, instance.env)
+    elif isinstance(func, NativeFunction):
+        return func.call(args)
     else:
-        return any([is_subclass_of(env.get_class(ccn), class_name, env) for ccn in child_class.superclass_names])
+        raise InterpretException("Not a function call")
+
+
+def call_with_args(func: Function, args: list, name: str, env: Environment):
+    """
+    Calls a spl function with evaluated arguments, which are bound directly in the function scope.
+
+    :param func: the function
+    :param args: the evaluated arguments
+    :param name: the function name
+    :param env: the environment where the presets are evaluated
+    :return: the function result
+    """
+    scope = function_scope(env.heap, func.outer_scope, name)
+    params = func.params
+    if len(args) > len(params):
+        raise SplException("Too many arguments for function '{}'".format(name))
+    for i in range(len(params)):
+        if i < len(args):
+            scope.variables[params[i].name] = args[i]
+        else:
+            scope.variables[params[i].name] = evaluate(func.presets[i], env)
+    result = evaluate_body(func.body, scope)
+    release_scope(scope)
+    return result
+
+
+def class_of(instance: ClassInstance) -> Class:
+    """
+    Returns the class of a class instance.
+
+    :param instance: the class instance
+    :return: the class of the instance
+    """
+    return instance.cla
 
 
 def eval_operator(node: OperatorNode, env: Environment):
     left = evaluate(node.left, env)
-    if node.assignment:
-        right = evaluate(node.right, env)
-        symbol = node.operation[:-1]
-        res = arithmetic(left, right, symbol, env)
-        asg = AssignmentNode((node.line_num, node.file))
-        asg.left = node.left
-        asg.operation = "="
-        asg.right = res
-        return evaluate(asg, env)
-    else:
-        symbol = node.operation
-        right_node = node.right
-        return arithmetic(left, right_node, symbol, env)
+    symbol = node.operation
+    if symbol in lex.LAZY:
+        return arithmetic(left, node.right, symbol, env)
+    right = evaluate(node.right, env)
+    if type(left) in NUMBER_TYPES and type(right) in NUMBER_TYPES and symbol in NUMBER_OPERATORS and \
+            node.deoptimized < MAX_DEOPTIMIZATION:
+        # quickens this node, the next evaluations skip the type dispatch
+        node.type = NUMBER_OPERATOR
+        node.function = NUMBER_OPERATORS[symbol]
+        return node.function(left, right)
+    return value_arithmetic(left, right, symbol, env)
+
+
+def eval_update(node: UpdateNode, env: Environment):
+    key = node.left
+    t = key.type
+    if t == NAME_NODE:
+        name = key.name
+        depth = key.depth
+        if depth is not None and depth != HEAP_DEPTH:
+            scope = env
+            while depth > 0 and scope is not None:
+                scope = scope.outer
+                depth -= 1
+            if scope is not None and name in scope.variables:
+                variables = scope.variables
+                value = update_value(node, variables[name], env)
+                variables[name] = value
+                return value
+        value = update_value(node, env.get(name, (node.line_num, node.file)), env)
+        env.assign(name, value)
+        if key.auth == lex.PRIVATE:
+            env.add_private(name)
+        return value
+    elif t == DOT:
+        instance = evaluate(key.left, env)
+        obj = key.right
+        by_this = isinstance(key.left, NameNode) and key.left.name == "this"
+        line_file = (node.line_num, node.file)
+        if obj.type == NAME_NODE:
+            if dot_entry(key.cache, instance, obj.name, by_this, line_file) is not None:
+                raise SplException("Cannot assign attribute '{}' of a native object, in file {}, at line {}"
+                                   .format(obj.name, node.file, node.line_num))
+            scope = instance.env
+            value = update_value(node, scope.variables[obj.name], env)
+            scope.assign(obj.name, value)
+            return value
+        elif obj.type == FUNCTION_CALL and obj.f_name == "__getitem__":
+            args = [evaluate(x, env) for x in obj.args.lines]
+            value = update_value(node, call_entry(key.cache, instance, "__getitem__", args, by_this, line_file), env)
+            args.append(value)
+            call_entry(node.cache, instance, "__setitem__", args, by_this, line_file)
+            return value
+    raise InterpretException("Unknown assignment, in {}, at line {}".format(node.file, node.line_num))
+
+
+def update_value(node: UpdateNode, left, env: Environment):
+    """
+    Returns the new value of the target of a compound assignment.
+
+    :param node: the compound assignment
+    :param left: the current value of the target
+    :param env: the working environment
+    :return: the new value
+    """
+    right = evaluate(node.right, env)
+    if type(left) in NUMBER_TYPES and type(right) in NUMBER_TYPES:
+        return NUMBER_OPERATORS[node.operation](left, right)
+    return value_arithmetic(left, right, node.operation, env)
+
+
+def call_entry(cache: dict, instance, name: str, args: list, by_this: bool, line_file: tuple):
+    """
+    Calls a method of a class instance, a module or a native object, through the inline cache of the calling site.
+
+    :param cache: the cache of the calling site
+    :param instance: the class instance, module or native object
+    :param name: the method name
+    :param args: the evaluated arguments
+    :param by_this: whether the method is called through 'this'
+    :param line_file: the line number and file name of the call
+    :return: the method result
+    """
+    entry = dot_entry(cache, instance, name, by_this, line_file)
+    if entry is None:
+        return call_special(instance, name, args)
+    try:
+        return entry(instance, *args)
+    except IndexError as ie:
+        raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}".format(line_file[1], line_file[0]))
+
+
+def eval_inline(node: InlineNode, env: Environment):
+    variables = env.variables
+    params = node.params
+    args = node.args.lines
+    for i in range(len(params)):
+        # the parameters are only visible to the inlined body, so they can be assigned one by one
+        variables[params[i]] = evaluate(args[i], env)
+    return evaluate_body(node.body, env)
+
+
+def eval_invariant(node: InvariantNode, env: Environment):
+    value = env.variables.get(node.name)
+    if value is None:
+        value = evaluate(node.value, env)
+        env.variables[node.name] = value
+    return value
+
+
+def eval_number_operator(node: OperatorNode, env: Environment):
+    """
+    Evaluates an operator node which has only seen numbers so far.
+
+    The node turns back to a generic operator node if any operand is not a number.
+
+    :param node: the quickened operator node
+    :param env: the working environment
+    :return: the result of the operation
+    """
+    left = evaluate(node.left, env)
+    right = evaluate(node.right, env)
+    if type(left) in NUMBER_TYPES and type(right) in NUMBER_TYPES:
+        return node.function(left, right)
+    node.type = OPERATOR_NODE
+    node.deoptimized += 1
+    return value_arithmetic(left, right, node.operation, env)
 
 
 def assignment(node: AssignmentNode, env: Environment):
@@ -927,7 +1412,10 @@ def assignment(node: AssignmentNode, env: Environment):
     value = evaluate(node.right, env)
     t = key.type
     if t == NAME_NODE:
-        env.assign(key.name, value)
+        if key.depth is None:
+            env.assign(key.name, value)
+        else:
+            env.resolved_assign(key.name, key.depth, value)
         if key.auth == lex.PRIVATE:
             env.add_private(key.name)
         return value
@@ -950,61 +1438,59 @@ def assignment(node: AssignmentNode, env: Environment):
 
 
 def init_class(node: ClassInit, env: Environment):
-    cla: Class = env.get_class(node.class_name)
+    cla: Class = env.get_class(node.class_name, (node.line_num, node.file))
 
-    scope = Environment(False, env.heap)
-    scope.scope_name = "Class scope<{}>".format(cla.class_name)
-    class_inheritance(cla, env, scope)
+    scope = layout_scope(cla, env)
+    if scope is None:
+        scope = Environment(False, env.heap)
+        scope.scope_name = "Class scope<{}>".format(cla.class_name)
+        class_inheritance(cla, env, scope)
+        scope.outer = cla.outer_scope
+        for k in scope.variables:
+            v = scope.variables[k]
+            if isinstance(v, Function):
+                # v.parent = instance
+                v.outer_scope = scope
 
     # print(scope.variables)
-    instance = ClassInstance(scope, node.class_name)
-    for k in scope.variables:
-        v = scope.variables[k]
-        if isinstance(v, Function):
-            # v.parent = instance
-            v.outer_scope = scope
+    instance = ClassInstance(scope, cla)
 
     if node.args:
-        # constructor: Function = scope.variables[node.class_name]
-        fc = FuncCall((node.line_num, node.file), node.class_name)
-        fc.args = node.args
-        for a in fc.args.lines:
-            scope.temp_vars.append(evaluate(a, env))
-        # print(scope.variables)
-        evaluate(fc, scope)
+        constructor = scope.get(cla.class_name, (node.line_num, node.file))
+        if not isinstance(constructor, Function):
+            raise InterpretException("Not a function call")
+        args = [evaluate(a, env) for a in node.args.lines]
+        call_with_args(constructor, args, cla.class_name, scope)
     return instance
 
 
-def call_function(node: FuncCall, env: Environment):
-    func = env.get(node.f_name, (node.line_num, node.file))
-    if isinstance(func, Function):
-        scope = Environment(False, env.heap)
-        scope.scope_name = "Function scope<{}>".format(node.f_name)
-        scope.outer = func.outer_scope  # supports for closure
-
-        if len(env.temp_vars) == len(func.params) > 0:
-            for i in range(len(func.params)):
-                scope.assign(func.params[i].name, env.temp_vars[i])
-            env.temp_vars.clear()
-        else:
-            check_args_len(func, node)
-            for i in range(len(func.params)):
-                # Assign function arguments
-                if i < len(node.args.lines):
-                    arg = node.args.lines[i]
-                else:
-                    arg = func.presets[i]
+def call_function(node: FuncCall, env: Environment, arg_env: Environment = None):
+    """
+    Calls a function.
 
-                e = evaluate(arg, env)
-                scope.assign(func.params[i].name, e)
-        result = evaluate(func.body, scope)
-        env.assign("=>", result)
+    :param node: the function call node
+    :param env: the environment where the function is looked up
+    :param arg_env: the environment where the arguments are evaluated, default to env
+    :return: the function result
+    """
+    if arg_env is None:
+        arg_env = env
+    if node.depth is None:
+        func = env.get(node.f_name, (node.line_num, node.file))
+    else:
+        func = env.resolved_get(node.f_name, node.depth, (node.line_num, node.file))
+    if isinstance(func, Function):
+        scope = call_scope(func, node, env, arg_env)
+        if func.memo is not None:
+            return memo_call(func, scope, evaluate_body)
+        result = evaluate_body(func.body, scope)
+        release_scope(scope)
         return result
     elif isinstance(func, NativeFunction):
         args = []
         for i in range(len(node.args.lines)):
             # args.append(evaluate(node.args[i], env))
-            args.append(evaluate(node.args.lines[i], env))
+            args.append(evaluate(node.args.lines[i], arg_env))
         result = func.call(args)
         if isinstance(result, BlockStmt):
             # Special case for "eval"
@@ -1016,6 +1502,66 @@ def call_function(node: FuncCall, env: Environment):
         raise InterpretException("Not a function call")
 
 
+def call_scope(func: Function, node: FuncCall, env: Environment, arg_env: Environment) -> Environment:
+    """
+    Returns the scope of a function call, with the arguments bound to the parameters.
+
+    :param func: the function
+    :param node: the function call node
+    :param env: the environment where the function is looked up
+    :param arg_env: the environment where the arguments are evaluated
+    :return: the function scope
+    """
+    scope = function_scope(env.heap, func.outer_scope, node.f_name)
+
+    check_args_len(func, node)
+    for i in range(len(func.params)):
+        # Assign function arguments
+        if i < len(node.args.lines):
+            arg = node.args.lines[i]
+        else:
+            arg = func.presets[i]
+
+        e = evaluate(arg, arg_env)
+        scope.variables[func.params[i].name] = e
+    return scope
+
+
+def function_scope(heap: dict, outer: Environment, name: str) -> Environment:
+    """
+    Returns an empty environment for a function call, reusing a released one if there is any.
+
+    :param heap: the heap
+    :param outer: the environment where the function is defined
+    :param name: the function name
+    :return: the function scope
+    """
+    if FREE_SCOPES:
+        scope = FREE_SCOPES.pop()
+        scope.heap = heap
+    else:
+        scope = Environment(False, heap)
+    scope.outer = outer  # supports for closure
+    scope.scope_name = name
+    return scope
+
+
+def release_scope(scope: Environment):
+    """
+    Gives back the environment of a returned function call, unless a function or a class still refers to it.
+
+    :param scope: the function scope
+    """
+    if not scope.captured and len(FREE_SCOPES) < MAX_FREE_SCOPES:
+        scope.variables.clear()
+        if scope.constants:
+            scope.constants.clear()
+        if scope.privates:
+            scope.privates.clear()
+        scope.outer = None
+        FREE_SCOPES.append(scope)
+
+
 def check_args_len(function: Function, call: FuncCall):
     if call.args and not list(filter(lambda k: not isinstance(k, InvalidToken), function.presets)).count(True) \
                          <= len(call.args.lines) <= len(function.params):
@@ -1023,59 +1569,66 @@ def check_args_len(function: Function, call: FuncCall):
                            .format(call.f_name, call.file, call.line_num))
 
 
+def dot_entry(cache: dict, instance, name: str, by_this: bool, line_file: tuple):
+    """
+    Returns the inline cache entry of an attribute access, resolving it at the first access by each class,
+    native type or module.
+
+    The entry is the python method for native type objects, or None for class instances and modules whose
+    attribute is accessible. A redefined class is a new class object, so it never hits the entries of the old one.
+
+    :param cache: the cache of the accessing site, maps class, native type or module to entry
+    :param instance: the object whose attribute is accessed
+    :param name: the attribute name
+    :param by_this: whether the attribute is accessed by 'this'
+    :param line_file: the line and file of the accessing site, for error message
+    :return: the entry
+    """
+    t = type(instance)
+    if t is ClassInstance:
+        key = instance.cla
+    elif t is Module:
+        key = instance
+    else:
+        key = t
+    if key in cache:
+        return cache[key]
+    if isinstance(instance, NativeType):
+        entry = getattr(t, name)
+    elif isinstance(instance, ClassInstance) or isinstance(instance, Module):
+        if not by_this and instance.env.is_private(name):
+            raise UnauthorizedException("Class attribute '{}' has private access".format(name))
+        entry = None
+    else:
+        raise InterpretException("Neither a class instance nor a module, "
+                                 "in {}, at line {}".format(line_file[1], line_file[0]))
+    if len(cache) < MAX_POLYMORPHISM:
+        cache[key] = entry
+    return entry
+
+
 def call_dot(node: Dot, env: Environment):
     instance = evaluate(node.left, env)
     obj = node.right
     t = obj.type
     if t == NAME_NODE:
-        if isinstance(instance, NativeType):
-            return native_types_invoke(instance, obj)
-<<<<<<< HEAD
-        elif isinstance(instance, ClassInstance) or isinstance(instance, Module):
-            if (not isinstance(node.left, psr.NameNode) or node.left.name != "this") and \
-                    instance.env.is_private(obj.name):
-                raise UnauthorizedException("Class attribute '{}' has private access".format(obj.name))
-=======
-        elif isinstance(instance, ClassInstance):
-            if instance.env.is_private(obj.name):
-                raise UnauthorizedException("Class attribute {} has private access".format(obj.name))
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
-            else:
-                attr = instance.env.variables[obj.name]
-                return attr
-        else:
-<<<<<<< HEAD
-            raise InterpretException("Neither a class instance nor a module, "
-                                     "in {}, at line {}".format(node.file, node.line_num))
+        entry = dot_entry(node.cache, instance, obj.name, isinstance(node.left, NameNode) and node.left.name == "this",
+                          (node.line_num, node.file))
+        if entry is None:
+            return instance.env.variables[obj.name]
+        return entry
     elif t == psr.FUNCTION_CALL:
         obj: psr.FuncCall
-=======
-            raise InterpretException("Not a class instance, in {}, at line {}".format(node.file, node.line_num))
-    elif t == FUNCTION_CALL:
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
-        if isinstance(instance, NativeType):
-            try:
-                return native_types_call(instance, obj, env)
-            except IndexError as ie:
-                raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}"
-                                               .format(node.file, node.line_num))
-<<<<<<< HEAD
-        elif isinstance(instance, ClassInstance) or isinstance(instance, Module):
-            if (not isinstance(node.left, psr.NameNode) or node.left.name != "this") and \
-                    instance.env.is_private(obj.f_name):
-                raise UnauthorizedException("Class attribute '{}' has private access".format(obj.f_name))
-=======
-        elif isinstance(instance, ClassInstance):
-            if instance.env.is_private(obj.f_name):
-                raise UnauthorizedException("Class attribute {} has private access".format(obj.f_name))
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
-            else:
-                result = evaluate(obj, instance.env)
-                env.assign("=>", result)
-                return result
-        else:
-            raise InterpretException("Neither a class instance nor a module, "
-                                     "in {}, at line {}".format(node.file, node.line_num))
+        entry = dot_entry(node.cache, instance, obj.f_name,
+                          isinstance(node.left, NameNode) and node.left.name == "this", (node.line_num, node.file))
+        if entry is None:
+            return call_function(obj, instance.env, env)
+        args = [evaluate(x, env) for x in obj.args.lines]
+        try:
+            return entry(instance, *args)
+        except IndexError as ie:
+            raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}"
+                                           .format(node.file, node.line_num))
     else:
         raise InterpretException("Unknown Syntax")
 
@@ -1090,16 +1643,29 @@ def arithmetic(left, right_node: Node, symbol, env: Environment):
             raise InterpretException("Operator '||' '&&' do not support type.")
     else:
         right = evaluate(right_node, env)
-        if left is None or isinstance(left, bool):
-            return primitive_arithmetic(left, right, symbol)
-        elif isinstance(left, int) or isinstance(left, float):
-            return num_arithmetic(left, right, symbol)
-        elif isinstance(left, String):
-            return string_arithmetic(left, right, symbol)
-        elif isinstance(left, ClassInstance):
-            return instance_arithmetic(left, right, symbol, env)
-        else:
-            return raw_type_comparison(left, right, symbol)
+        return value_arithmetic(left, right, symbol, env)
+
+
+def value_arithmetic(left, right, symbol, env: Environment):
+    """
+    Computes a non-lazy binary operation, with both operands already evaluated.
+
+    :param left: the left operand
+    :param right: the right operand
+    :param symbol: the operator
+    :param env: the working environment
+    :return: the result of the operation
+    """
+    if left is None or isinstance(left, bool):
+        return primitive_arithmetic(left, right, symbol)
+    elif isinstance(left, int) or isinstance(left, float):
+        return num_arithmetic(left, right, symbol)
+    elif isinstance(left, String):
+        return string_arithmetic(left, right, symbol)
+    elif isinstance(left, ClassInstance):
+        return instance_arithmetic(left, right, symbol, env)
+    else:
+        return raw_type_comparison(left, right, symbol)
 
 
 def instance_arithmetic(left: ClassInstance, right, symbol, env: Environment):
@@ -1109,14 +1675,11 @@ def instance_arithmetic(left: ClassInstance, right, symbol, env: Environment):
         return not isinstance(right, ClassInstance) or left.env.variables["id"] != right.env.variables["id"]
     elif symbol == "instanceof":
         if isinstance(right, Class):
-            return is_subclass_of(env.get_class(left.class_name), right.class_name, env)
+            return is_subclass_of(class_of(left), right.class_name, env)
         else:
             return False
     else:
-        fc = FuncCall((0, "interpreter"), "@" + BINARY_OPERATORS[symbol])
-        left.env.temp_vars.append(right)
-        res = evaluate(fc, left.env)
-        return res
+        return call_special(left, "@" + BINARY_OPERATORS[symbol], [right])
 
 
 def string_arithmetic(left, right, symbol):
@@ -1240,60 +1803,247 @@ def num_arithmetic(left, right, symbol):
     return ARITHMETIC_TABLE[symbol](left, right)
 
 
-def class_inheritance(cla, env, scope):
+# The operators whose result on two numbers is the python operation
+NUMBER_OPERATORS = {
+    "+": operator_lib.add,
+    "-": operator_lib.sub,
+    "*": operator_lib.mul,
+    "/": operator_lib.truediv,
+    "%": operator_lib.mod,
+    "==": operator_lib.eq,
+    "!=": operator_lib.ne,
+    ">": operator_lib.gt,
+    "<": operator_lib.lt,
+    ">=": operator_lib.ge,
+    "<=": operator_lib.le,
+    "<<": operator_lib.lshift,
+    ">>": operator_lib.rshift,
+    "&": operator_lib.and_,
+    "^": operator_lib.xor,
+    "|": operator_lib.or_,
+    "===": operator_lib.eq,
+    "!==": operator_lib.ne
+}
+
+NUMBER_TYPES = {int, float}
+
+# The types of the arguments and results which a memoized function remembers, their values never change
+MEMO_TYPES = {int, float, bool, type(None), String}
+
+
+class MemoStats:
+    """
+    The hits and misses of the memoized calls of a function definition.
     """
 
-    :param cla:
-    :type cla: Class
-    :param env: the global environment
-    :type env: Environment
-    :param scope: the class scope
-    :type scope: Environment
-    :return:
+    def __init__(self, name: str, file: str, line: int):
+        self.name = name
+        self.file = file
+        self.line = line
+        self.hits = 0
+        self.misses = 0
+
+
+class Memo:
     """
-    for sc in cla.superclass_names:
-        class_inheritance(env.get_class(sc), env, scope)
+    The results of a memoized function by its arguments, of which at most MEMO_SIZE are kept, dropping the least
+    recently used first.
+
+    :type results: OrderedDict
+    :type stats: MemoStats
+    """
+    __slots__ = ("results", "stats")
 
-    evaluate(cla.body, scope)  # this step just fills the scope
+    def __init__(self, stats: MemoStats):
+        self.results = OrderedDict()
+        self.stats = stats
 
 
-def native_types_call(instance, method, env):
+def make_memo(name: str, file: str, line: int):
     """
+    Returns an empty memo for a function marked to be memoized, which counts its hits and misses with the other
+    functions of the same definition.
 
-    :param instance:
-    :type instance: NativeType
-    :param method:
-    :type method: FuncCall
-    :type env: Environment
-    :return:
+    :param name: the function name
+    :param file: the file of the definition
+    :param line: the line of the definition
+    :return: the memo, or None if memoization is not enabled
     """
+    if not MEMOIZE:
+        return None
+    key = (name, file, line)
+    stats = MEMO_STATS.get(key)
+    if stats is None:
+        stats = MEMO_STATS[key] = MemoStats(name, file, line)
+    return Memo(stats)
+
+
+def memo_call(func: Function, scope: Environment, run):
+    """
+    Calls a memoized function, whose result is remembered if the arguments and the result are all immutable.
+
+    :param func: the memoized function
+    :param scope: the function scope, with the parameters bound
+    :param run: the function which evaluates a function body in a scope, and returns the result
+    :return: the function result
+    """
+    variables = scope.variables
     args = []
-    for x in method.args.lines:
-        args.append(evaluate(x, env))
-    name = method.f_name
-    type_ = type(instance)
-    method = getattr(type_, name)
-    res = method(instance, *args)
-    return res
+    types = []
+    for param in func.params:
+        arg = variables[param.name]
+        t = type(arg)
+        if t not in MEMO_TYPES:
+            result = run(func.body, scope)
+            release_scope(scope)
+            return result
+        args.append(arg)
+        types.append(t)
+    # the types are part of the key, since 1, 1.0 and true are equal in python
+    key = (tuple(args), tuple(types))
+    memo = func.memo
+    results = memo.results
+    result = results.get(key, NULLPTR)
+    if result is not NULLPTR:
+        results.move_to_end(key)
+        memo.stats.hits += 1
+        release_scope(scope)
+        return result
+    memo.stats.misses += 1
+    result = run(func.body, scope)
+    release_scope(scope)
+    if type(result) in MEMO_TYPES:
+        results[key] = result
+        if len(results) > MEMO_SIZE:
+            results.popitem(last=False)
+    return result
 
 
-def native_types_invoke(instance: NativeType, node: NameNode):
+# An operator node which turned back from NUMBER_OPERATOR this many times is not quickened anymore
+MAX_DEOPTIMIZATION = 2
+
+
+def is_literal(node) -> bool:
+    """
+    Returns whether a node evaluates to the same immutable value every time.
+
+    :param node: the node
+    :return: whether it is a literal
+    """
+    if not isinstance(node, Node):
+        return node is None or type(node) in LITERAL_TYPES
+    t = node.type
+    if t == NEGATIVE_EXPR:
+        return is_literal(node.value)
+    return t in LITERAL_NODES
+
+
+def is_declarative(body) -> bool:
+    """
+    Returns whether a class body only defines methods and fields with literal values, so that evaluating it
+    has no other effect than filling the class scope with the same attributes every time.
+
+    :param body: the class body
+    :return: whether the class body is declarative
     """
+    if body.type == psr.BYTECODE:
+        return body.is_declarative()
+    for line in body.lines:
+        if not isinstance(line, Node):
+            continue
+        t = line.type
+        if t == DEF_STMT:
+            continue
+        if t == ASSIGNMENT_NODE and line.left.type == NAME_NODE and is_literal(line.right):
+            continue
+        return False
+    return True
+
+
+def build_layout(cla: Class, env: Environment) -> ClassLayout:
+    """
+    Evaluates the bodies of a class and its superclasses once, into a template scope.
+
+    :param cla: the class
+    :param env: the environment where the class is instantiated
+    :return: the layout of the class
+    """
+    generation = CLASS_COUNTER.get()
+    if cla.generation != generation:
+        linearize(cla)
+    if not all(is_declarative(c.body) for c in cla.mro):
+        return ClassLayout(generation, None, None, None, None)
+    template = Environment(False, env.heap)
+    class_inheritance(cla, env, template)
+    return ClassLayout(generation, "Class scope<{}>".format(cla.class_name), list(template.variables.items()),
+                       list(template.constants.items()), template.privates)
+
+
+def copy_attributes(attributes: list, target: dict, scope: Environment):
+    for name, value in attributes:
+        if type(value) is Function:
+            # each instance has its own methods, whose outer scope is the instance
+            f = Function(value.params, value.presets, value.body)
+            f.outer_scope = scope
+            if value.memo is not None:
+                # an instance remembers the results of its own methods, counted with the methods of other instances
+                f.memo = Memo(value.memo.stats)
+            value = f
+        target[name] = value
+
+
+def layout_scope(cla: Class, env: Environment):
+    """
+    Returns the scope of a new instance of a class, filled from the class layout.
+
+    :param cla: the class
+    :param env: the environment where the class is instantiated
+    :return: the instance scope, or None if the class bodies must be evaluated for every instance
+    """
+    layout = cla.layout
+    if layout is None or layout.generation != CLASS_COUNTER.get():
+        layout = cla.layout = build_layout(cla, env)
+    if layout.variables is None:
+        return None
+    scope = Environment(False, env.heap)
+    scope.scope_name = layout.scope_name
+    copy_attributes(layout.variables, scope.variables, scope)
+    if layout.constants:
+        copy_attributes(layout.constants, scope.constants, scope)
+    if layout.privates:
+        scope.privates.update(layout.privates)
+    scope.outer = cla.outer_scope
+    return scope
+
 
-    :param instance:
-    :param node:
+def class_inheritance(cla, env, scope):
+    """
+
+    :param cla:
+    :type cla: Class
+    :param env: the global environment
+    :type env: Environment
+    :param scope: the class scope
+    :type scope: Environment
     :return:
     """
-    name = node.name
-    type_ = type(instance)
-    res = getattr(type_, name)
-    return res
+    for sc in cla.superclass_names:
+        class_inheritance(cla.outer_scope.get_class(sc), env, scope)
+
+    evaluate_body(cla.body, scope)  # this step just fills the scope
 
 
 def self_return(node):
     return node
 
 
+def eval_name(node: NameNode, env: Environment):
+    if node.depth is None:
+        return env.get(node.name, (node.line_num, node.file))
+    else:
+        return env.resolved_get(node.name, node.depth, (node.line_num, node.file))
+
+
 def eval_boolean_stmt(node: BooleanStmt, env):
     if node.value in {"true", "false"}:
         return node.value == "true"
@@ -1302,7 +2052,7 @@ def eval_boolean_stmt(node: BooleanStmt, env):
 
 
 def eval_anonymous_call(node: AnonymousCall, env: Environment):
-    evaluate(node.left, env)
+    env.assign("=>", evaluate(node.left, env))
     right = node.right.args
     fc = FuncCall((node.line_num, node.file), "=>")
     fc.args = right
@@ -1312,15 +2062,25 @@ def eval_anonymous_call(node: AnonymousCall, env: Environment):
 def eval_return(node: ReturnStmt, env: Environment):
     value = node.value
     res = evaluate(value, env)
-    # print(env.variables)
-    env.terminate(res)
-    return res
+    if type(res) is Completion:  # a tail call
+        return res
+    return Completion(RETURN, res, None)
+
+
+def eval_break(node: BreakStmt, env: Environment):
+    return Completion(BREAK, None, (node.line_num, node.file))
+
+
+def eval_continue(node: ContinueStmt, env: Environment):
+    return Completion(CONTINUE, None, (node.line_num, node.file))
 
 
 def eval_block(node: BlockStmt, env: Environment):
     result = 0
     for line in node.lines:
         result = evaluate(line, env)
+        if type(result) is Completion:
+            return result
     return result
 
 
@@ -1334,13 +2094,28 @@ def eval_if_stmt(node: IfStmt, env: Environment):
 
 def eval_while(node: WhileStmt, env: Environment):
     result = 0
-    while not env.broken and evaluate(node.condition, env):
+    while evaluate(node.condition, env):
         result = evaluate(node.body, env)
-        env.paused = False  # reset the environment the the next iteration
-    env.broken = False  # reset the environment for next loop
+        if type(result) is Completion:
+            if result.kind == CONTINUE:
+                result = None
+            else:
+                return exit_loop(result)
     return result
 
 
+def exit_loop(completion: Completion):
+    """
+    Returns the value of a loop stopped by 'break' or 'return'.
+
+    :param completion: the completion of the loop body
+    :return: the completion of 'return' or of a tail call, or None for 'break'
+    """
+    if completion.kind == BREAK:
+        return None
+    return completion
+
+
 def eval_for_loop_stmt(node: ForLoopStmt, env: Environment):
     arg_num = len(node.condition.lines)
     if arg_num == 3:
@@ -1352,21 +2127,17 @@ def eval_for_loop_stmt(node: ForLoopStmt, env: Environment):
                                  .format(node.file, node.line_num))
 
 
-<<<<<<< HEAD
 def eval_def(node: psr.DefStmt, env: Environment):
     f = Function(node.params, node.presets, node.body)
     f.outer_scope = env
+    env.captured = True
+    if node.memo:
+        f.memo = make_memo(node.name, node.file, node.line_num)
 
     if node.const:
         env.assign_const(node.name, f)
     else:
         env.assign(node.name, f)
-=======
-def eval_def(node, env):
-    f = Function(node.params, node.presets, node.body)
-    f.outer_scope = env
-    env.assign(node.name, f)
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
     if node.auth == lex.PRIVATE:
         env.add_private(node.name)
     return f
@@ -1375,24 +2146,45 @@ def eval_def(node, env):
 def eval_class_stmt(node, env):
     cla = Class(node.class_name, node.block)
     cla.superclass_names = node.superclass_names
+    cla.outer_scope = env
+    env.captured = True
     env.assign(node.class_name, cla)
     return cla
 
 
 def eval_import_stmt(node: psr.ImportStmt, env: Environment):
-    scope = Environment(False, env.heap)
-    evaluate(node.block, scope)
-    imp = Module(node.class_name, scope)
+    imp = MODULES.get(node.path)
+    if imp is None:
+        imp = new_module(node.class_name, node.path, env)
+        evaluate_body(node.block if node.source is None else node.source.block, imp.env)
     env.add_heap(node.class_name, imp)
-    # print(node.class_name)
     return imp
 
 
-def eval_jump(node, env):
-    func: Function = env.get(node.to, (0, "f"))
-    for i in range(len(node.args.lines)):
-        env.assign(func.params[i].name, evaluate(node.args.lines[i], env))
-    return evaluate(func.body, env)
+def new_module(name: str, path: str, env: Environment) -> Module:
+    """
+    Creates the module of an imported file, before its block is evaluated, so that the file is evaluated only
+    once even if it imports itself.
+
+    :param name: the name of the first import of the file
+    :param path: the resolved path of the file
+    :param env: the importing environment
+    :return: the new module
+    """
+    module = Module(name, Environment(False, env.heap))
+    MODULES[path] = module
+    return module
+
+
+def eval_jump(node: JumpNode, env: Environment):
+    call = node.call
+    if node.depth is None:
+        func = env.get(node.to, (node.line_num, node.file))
+    else:
+        func = env.resolved_get(node.to, node.depth, (node.line_num, node.file))
+    if isinstance(func, Function) and func.memo is None:
+        return Completion(TAIL_CALL, (evaluate, func.body, call_scope(func, call, env, env)), None)
+    return call_function(call, env)
 
 
 def raise_exception(e: Exception):
@@ -1402,20 +2194,28 @@ def raise_exception(e: Exception):
 # SELF_RETURN_TABLE = {"int", "float", "bool", "NoneType", "String", "List", "Set", "Pair", "System", "File"}
 SELF_RETURN_TABLE_2 = {int, float, bool, String, List, Set, Pair, System, File}
 
+# The immutable values, and the nodes evaluated to them
+LITERAL_TYPES = {int, float, bool, String}
+LITERAL_NODES = {INT_NODE, FLOAT_NODE, LITERAL_NODE, BOOLEAN_STMT, NULL_STMT}
+
 NODE_TABLE = {
-<<<<<<< HEAD
     psr.INT_NODE: lambda n, env: n.value,
     psr.FLOAT_NODE: lambda n, env: n.value,
     psr.LITERAL_NODE: lambda n, env: String(n.literal),
-    psr.NAME_NODE: lambda n, env: env.get(n.name, (n.line_num, n.file)),
+    psr.NAME_NODE: eval_name,
     psr.BOOLEAN_STMT: eval_boolean_stmt,
     psr.NULL_STMT: lambda n, env: None,
-    psr.BREAK_STMT: lambda n, env: env.break_loop(),
-    psr.CONTINUE_STMT: lambda n, env: env.pause_loop(),
+    psr.BREAK_STMT: eval_break,
+    psr.CONTINUE_STMT: eval_continue,
     psr.ASSIGNMENT_NODE: assignment,
     psr.DOT: call_dot,
     psr.ANONYMOUS_CALL: eval_anonymous_call,
     psr.OPERATOR_NODE: eval_operator,
+    psr.UPDATE_NODE: eval_update,
+    psr.NUMBER_OPERATOR: eval_number_operator,
+    psr.INVARIANT_NODE: eval_invariant,
+    psr.INLINE_NODE: eval_inline,
+    psr.RANGE_NODE: eval_range,
     psr.NEGATIVE_EXPR: lambda n, env: -evaluate(n.value, env),
     psr.NOT_EXPR: lambda n, env: not bool(evaluate(n.value, env)),
     psr.RETURN_STMT: eval_return,
@@ -1436,38 +2236,6 @@ NODE_TABLE = {
     psr.TRY_STMT: eval_try_catch,
     psr.JUMP_NODE: eval_jump,
     psr.IMPORT_STMT: eval_import_stmt
-=======
-    INT_NODE: lambda n, env: n.value,
-    FLOAT_NODE: lambda n, env: n.value,
-    LITERAL_NODE: lambda n, env: String(n.literal),
-    NAME_NODE: lambda n, env: env.get(n.name, (n.line_num, n.file)),
-    BOOLEAN_STMT: eval_boolean_stmt,
-    NULL_STMT: lambda n, env: None,
-    BREAK_STMT: lambda n, env: env.break_loop(),
-    CONTINUE_STMT: lambda n, env: env.pause_loop(),
-    ASSIGNMENT_NODE: assignment,
-    DOT: call_dot,
-    ANONYMOUS_CALL: eval_anonymous_call,
-    OPERATOR_NODE: eval_operator,
-    NEGATIVE_EXPR: lambda n, env: -evaluate(n.value, env),
-    NOT_EXPR: lambda n, env: bool(evaluate(n.value, env)),
-    RETURN_STMT: eval_return,
-    BLOCK_STMT: eval_block,
-    IF_STMT: eval_if_stmt,
-    WHILE_STMT: eval_while,
-    FOR_LOOP_STMT: eval_for_loop_stmt,
-    DEF_STMT: eval_def,
-    FUNCTION_CALL: call_function,
-    CLASS_STMT: eval_class_stmt,
-    CLASS_INIT: init_class,
-    INVALID_TOKEN: lambda n, env: raise_exception(InterpretException("Argument error, in {}, at line {}"
-                                                                     .format(n.file, n.line_num))),
-    ABSTRACT: lambda n, env: raise_exception(AbstractMethodException("Method is not implemented, in {}, at line {}"
-                                                                     .format(n.file, n.line_num))),
-    THROW_STMT: lambda n, env: raise_exception(RuntimeException(evaluate(n.value, env))),
-    TRY_STMT: eval_try_catch,
-    JUMP_NODE: eval_jump
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
 }
 
 
@@ -1479,9 +2247,7 @@ def evaluate(node: Node, env: Environment):
     :param env: the working environment
     :return: the evaluation result
     """
-    if env.terminated:
-        return env.exit_value
-    if env.paused or node is None:
+    if node is None:
         return None
     if type(node) in SELF_RETURN_TABLE_2:
         return node
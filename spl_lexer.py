@@ -1,5 +1,7 @@
 import spl_parser as psr
 import os
+import re
+import array
 
 EOF = -1
 EOL = ";"
@@ -14,11 +16,7 @@ OTHERS = {"=", "@", ":"}
 ALL = set().union(SYMBOLS).union(BINARY_OPERATORS).union(OTHERS).union(MIDDLE).union(UNARY_OPERATORS)
 RESERVED = {"class", "function", "def", "if", "else", "new", "extends", "return", "break", "continue",
             "true", "false", "null", "operator", "while", "for", "import", "throw", "try", "catch", "finally",
-<<<<<<< HEAD
             "abstract", "private", "const", "as"}
-=======
-            "abstract", "private"}
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
 LAZY = {"&&", "||"}
 OMITS = {"\n", "\r", "\t", " "}
 
@@ -26,7 +24,79 @@ OP_EQ = {"+", "-", "*", "/", "%", "&", "^", "|", "<<", ">>"}
 
 ESCAPES = {"n": "\n", "t": "\t", "0": "\0", "a": "\a", "r": "\r", "f": "\f", "v": "\v", "b": "\b", "\\": "\\"}
 
-NO_BUILD_LINE = {"else", "catch", "finally"}
+# The kinds of tokens in a TokenList
+EOF_TOKEN = 0
+ID_TOKEN = 1
+NUM_TOKEN = 2
+LITERAL_TOKEN = 3
+
+# The ids of the symbols the parser looks for, the same in every SymbolTable
+SYM_EOL = 0
+SYM_LBRACE = 1
+SYM_RBRACE = 2
+SYM_LPAREN = 3
+SYM_RPAREN = 4
+SYM_LBRACKET = 5
+SYM_RBRACKET = 6
+SYM_ASSIGN = 7
+SYM_COLON = 8
+SYM_COMMA = 9
+SYM_DOT = 10
+SYM_ARROW = 11
+SYM_AT = 12
+SYM_MEMO = 13
+SYM_IF = 14
+SYM_WHILE = 15
+SYM_FOR = 16
+SYM_ELSE = 17
+SYM_RETURN = 18
+SYM_BREAK = 19
+SYM_CONTINUE = 20
+SYM_TRUE = 21
+SYM_FALSE = 22
+SYM_NULL = 23
+SYM_FUNCTION = 24
+SYM_DEF = 25
+SYM_OPERATOR = 26
+SYM_IMPORT = 27
+SYM_AS = 28
+SYM_CLASS = 29
+SYM_EXTENDS = 30
+SYM_ABSTRACT = 31
+SYM_PRIVATE = 32
+SYM_CONST = 33
+SYM_NEW = 34
+SYM_THROW = 35
+SYM_TRY = 36
+SYM_CATCH = 37
+SYM_FINALLY = 38
+
+FIXED_SYMBOLS = {SYM_EOL: EOL, SYM_LBRACE: "{", SYM_RBRACE: "}", SYM_LPAREN: "(", SYM_RPAREN: ")",
+                 SYM_LBRACKET: "[", SYM_RBRACKET: "]", SYM_ASSIGN: "=", SYM_COLON: ":", SYM_COMMA: ",", SYM_DOT: ".",
+                 SYM_ARROW: "=>", SYM_AT: "@", SYM_MEMO: "Memo", SYM_IF: "if", SYM_WHILE: "while", SYM_FOR: "for",
+                 SYM_ELSE: "else", SYM_RETURN: "return", SYM_BREAK: "break", SYM_CONTINUE: "continue",
+                 SYM_TRUE: "true", SYM_FALSE: "false", SYM_NULL: "null", SYM_FUNCTION: "function", SYM_DEF: "def",
+                 SYM_OPERATOR: "operator", SYM_IMPORT: "import", SYM_AS: "as", SYM_CLASS: "class",
+                 SYM_EXTENDS: "extends", SYM_ABSTRACT: "abstract", SYM_PRIVATE: "private", SYM_CONST: "const",
+                 SYM_NEW: "new", SYM_THROW: "throw", SYM_TRY: "try", SYM_CATCH: "catch", SYM_FINALLY: "finally"}
+
+NO_BUILD_LINE_SYMBOLS = {SYM_ELSE, SYM_CATCH, SYM_FINALLY}
+
+# The number of tokens before the current one the parser may read from a TokenStream
+LOOK_BEHIND = 16
+
+# The characters starting a string literal or a comment, out of string literals and comments
+LINE_SPECIALS = re.compile("[\"'/]")
+
+# The classes of the characters which are not digits ('d'), identifier characters ('l'), spaces ('w'), or
+# single character tokens ('s')
+CHAR_CLASSES = {"<": "c", ">": "c", "=": "e", "&": "a", "|": "p", ".": "t", "!": "b", "^": "x",
+                "+": "o", "-": "o", "*": "o", "/": "o", "%": "o"}
+
+# The tokens in a string of character classes: names with digits, numbers, comparisons and other operators,
+# with their '=' suffixes. A name or a number does not end with a '.', which is a separate token.
+TOKEN_PATTERN = re.compile(r"w+|l+(?:d+(?:td+)*)?|d+(?:td+)*|t(?:d+(?:td+)*)?|[ce]+|a+(?:e[ce]*)?|p+(?:e[ce]*)?|"
+                           r"[bxo](?:e[ce]*)?|s")
 
 PUBLIC = 0
 PRIVATE = 1
@@ -36,16 +106,19 @@ SPL_PATH = os.getcwd()
 
 class Lexer:
     """
-    :type tokens: list of Token
+    :type tokens: TokenList
+    :type table: SymbolTable
     """
 
-    def __init__(self):
-        self.tokens = []
+    def __init__(self, table=None):
+        self.table = SymbolTable() if table is None else table  # shared by the lexers of imports
+        self.tokens = TokenList(self.table)
         self.script_dir = ""
         self.file_name = ""
+        self.imported = set()  # the full paths of the files already imported, shared by the lexers of imports
 
     def tokenize(self, source):
-        self.tokens.clear()
+        self.tokens = TokenList(self.table)
         if isinstance(source, list):
             self.tokenize_text(source)
         else:
@@ -57,19 +130,63 @@ class Lexer:
         :param file:
         :return:
         """
-        line = file.readline()
+        for _ in self.generate_tokens(file, True):
+            pass
+
+    def stream(self, file):
+        """
+        Sets up the tokens of a script file to be produced while the parser reads them, instead of tokenizing the
+        whole file first.
+
+        :type file: _io.TextIOWrapper
+        :param file: the script file, which must be kept open until the parsing finishes
+        :return: None
+        """
+        window = TokenList(self.table)
+        self.tokens = TokenStream(window, self.file_lexer(window).generate_tokens(file, True))
+
+    def file_lexer(self, tokens):
+        """
+        Returns a new lexer of the same file, adding to the given tokens.
+
+        :type tokens: TokenList
+        :param tokens: the tokens of the new lexer
+        :return: the new lexer
+        """
+        lexer = Lexer(self.table)
+        lexer.tokens = tokens
+        lexer.file_name = self.file_name
+        lexer.script_dir = self.script_dir
+        lexer.imported = self.imported
+        return lexer
+
+    def generate_tokens(self, file, end=False):
+        """
+        Tokenizes a script file line by line, with the imported files in place of the import statements, and
+        yields each time some tokens are added.
+
+        The reader of the tokens may delete the tokens already read between the steps.
+
+        :type file: _io.TextIOWrapper
+        :param file: the script file
+        :param end: whether to add the EOF token after the file
+        :return: the generator of the steps
+        """
+        tokens = self.tokens
         line_num = 1
         in_doc = False
-        while line:
+        for line in file:
             tup = (line_num, self.file_name)
-            last_index = len(self.tokens)
+            start = len(tokens)
             in_doc = self.proceed_line(line, tup, in_doc)
-            # print(self.tokens[last_index:])
-            self.find_import(tup, last_index, len(self.tokens))
-            line = file.readline()
+            imported = self.find_import(tup, start, len(tokens))
+            yield
+            if imported is not None:
+                yield from import_tokens(tokens, tup, *imported, self.imported)
             line_num += 1
-
-        self.tokens.append(Token((EOF, self.file_name)))
+        if end:
+            tokens.add(EOF_TOKEN, "", (EOF, self.file_name))
+            yield
 
     def tokenize_text(self, lines):
         for i in range(len(lines)):
@@ -77,70 +194,58 @@ class Lexer:
             line = lines[i]
             self.proceed_line(line, (line_number, "console"), False)
 
-        self.tokens.append(Token((EOF, self.file_name)))
+        self.tokens.add(EOF_TOKEN, "", (EOF, self.file_name))
 
     def proceed_line(self, line: str, line_num: (int, str), in_doc):
         """ Tokenize a line.
 
+        The text out of string literals and comments is split into tokens by split_tokens. A comment
+        '/* ... */' does not separate the text around it, and the character following it is skipped.
+
         :param line: line to be proceed
         :param line_num: the line number and the name of source file
         :param in_doc: whether it is currently in docstring, before proceed this line
         :return: whether it is currently in docstring, after proceed this line
         """
-        in_single = False
-        in_double = False
-        literal = ""
         non_literal = ""
-        # last_ch = ""
-
         length = len(line)
-        i = -1
-        while i < length - 1:
-            i += 1
-            ch = line[i]
-            if not in_double and not in_single:
-                if in_doc:
-                    if ch == "*" and i < length - 1 and line[i + 1] == "/":
-                        in_doc = False
-                        i += 2
-                        continue
-                else:
-                    if ch == "/" and i < length - 1 and line[i + 1] == "*":
-                        in_doc = True
-                        i += 1
-
-            if not in_doc:
-                if in_double:
-                    if ch == '"':
-                        in_double = False
-                        self.tokens.append(LiteralToken(line_num, literal))
-                        literal = ""
-                        continue
-                elif in_single:
-                    if ch == "'":
-                        in_single = False
-                        self.tokens.append(LiteralToken(line_num, literal))
-                        literal = ""
-                        continue
-                else:
-                    if ch == '"':
-                        in_double = True
-                        self.line_tokenize(non_literal, line_num)
-                        non_literal = ""
-                        continue
-                    elif ch == "'":
-                        in_single = True
-                        self.line_tokenize(non_literal, line_num)
-                        non_literal = ""
-                        continue
-                if in_single or in_double:
-                    literal += ch
+        i = 0
+        while i < length:
+            if in_doc:
+                end = line.find("*/", i)
+                if end < 0:
+                    break
+                in_doc = False
+                i = end + 3
+                continue
+            match = LINE_SPECIALS.search(line, i)
+            if match is None:
+                non_literal += line[i:]
+                break
+            j = match.start()
+            non_literal += line[i:j]
+            ch = line[j]
+            if ch == "/":
+                if j < length - 1 and line[j + 1] == "*":
+                    in_doc = True
+                    i = j + 2
+                elif non_literal[-1:] == "/":
+                    # a line comment
+                    non_literal = non_literal[:-1]
+                    break
                 else:
                     non_literal += ch
-                    if len(non_literal) > 1 and non_literal[-2:] == "//":
-                        self.line_tokenize(non_literal[:-2], line_num)
-                        non_literal = ""
-                        break
+                    i = j + 1
+            else:
+                self.line_tokenize(non_literal, line_num)
+                non_literal = ""
+                end = line.find(ch, j + 1)
+                if end < 0:
+                    # a string literal not closed in this line is dropped
+                    return in_doc
+                # the escapes are replaced by the parser
+                self.tokens.add(LITERAL_TOKEN, line[j + 1: end], line_num)
+                i = end + 1
 
         if len(non_literal) > 0:
             self.line_tokenize(non_literal, line_num)
@@ -155,31 +260,26 @@ class Lexer:
         :param line_num: the line number and the name of source file
         :return: None
         """
-        lst = normalize(non_literal)
-        for part in lst:
-            # if part == "//":
-            #     break
+        parts = split_tokens(non_literal)
+        kinds = []
+        for part in parts:
             if part.isidentifier():
-                if part in RESERVED:
-                    self.tokens.append(IdToken(line_num, part))
-                else:
-                    self.tokens.append(IdToken(line_num, part))
+                kinds.append(ID_TOKEN)
             elif is_float(part):
-                self.tokens.append(NumToken(line_num, part))
+                kinds.append(NUM_TOKEN)
             elif part.isdigit():
-                self.tokens.append(NumToken(line_num, part))
+                kinds.append(NUM_TOKEN)
             elif part in ALL:
-                self.tokens.append(IdToken(line_num, part))
+                kinds.append(ID_TOKEN)
             elif part[:-1] in OP_EQ:
-                self.tokens.append(IdToken(line_num, part))
+                kinds.append(ID_TOKEN)
             elif part == EOL:
-                self.tokens.append(IdToken(line_num, EOL))
+                kinds.append(ID_TOKEN)
             elif part == "=>":
-                self.tokens.append(IdToken(line_num, part))
-            elif part in OMITS:
-                pass
+                kinds.append(ID_TOKEN)
             else:
                 raise ParseException("Unknown symbol: '{}', at line {}".format(part, line_num))
+        self.tokens.add_all(kinds, parts, line_num)
 
     def find_import(self, line_file, from_, to):
         """
@@ -188,23 +288,20 @@ class Lexer:
         :param line_file: the line number and source file name
         :param from_: the beginning index of finding
         :param to: the end index of finding
-        :return: None
+        :return: tuple(the full path of the imported file, the name of the module), or None if no import statement
         """
+        tokens = self.tokens
         for i in range(from_, to, 1):
-            token = self.tokens[i]
-            if isinstance(token, IdToken) and token.symbol == "import":
-                next_token: LiteralToken = self.tokens[i + 1]
-                name = next_token.text
+            if tokens.symbol(i) == SYM_IMPORT:
+                if tokens.kind(i + 1) != LITERAL_TOKEN:
+                    unexpected_token(tokens[i])
+                name = replace_escapes(tokens.text(i + 1))
                 import_name = None
-                if i + 3 < to:
-                    as_token = self.tokens[i + 2]
-                    if isinstance(as_token, IdToken) and as_token.symbol == "as":
-                        name_token: IdToken = self.tokens[i + 3]
-                        import_name = name_token.symbol
-                        self.tokens.pop(i)
-                        self.tokens.pop(i)
-                self.tokens.pop(i)
-                self.tokens.pop(i)
+                if i + 3 < to and tokens.symbol(i + 2) == SYM_AS:
+                    import_name = tokens.text(i + 3)
+                    tokens.delete(i, 4)
+                else:
+                    tokens.delete(i, 2)
                 if name[-3:] == ".sp":
                     # user lib
                     file_name = "{}{}{}".format(self.script_dir, os.sep, name)
@@ -216,33 +313,8 @@ class Lexer:
 
                 if import_name is None:
                     import_name = no_sp_name.replace("/", "\\")
-                self.import_file(line_file, file_name, import_name)
-                # print(self.tokens)
-                break
-
-    def import_file(self, line_file, full_path, import_name):
-        """
-        Imports a full script file into the tokens list.
-
-        :param line_file: the line number and the source file name
-        :param full_path: the full path of the imported file.
-        :param import_name: the name of the module
-        :return: None
-        """
-        file = open(full_path, "r")
-        lexer = Lexer()
-        lexer.file_name = full_path
-        lexer.script_dir = get_dir(full_path)
-        lexer.tokenize(file)
-        # print(lexer.tokens)
-        self.tokens.append(IdToken(line_file, "import"))
-        self.tokens.append(IdToken(line_file, import_name))
-        self.tokens.append(IdToken(line_file, "{"))
-        self.tokens += lexer.tokens
-        self.tokens.pop()  # remove the EOF token
-        self.tokens.append(IdToken(line_file, "}"))
-        self.tokens.append(IdToken(line_file, EOL))
-        file.close()
+                return file_name, import_name
+        return None
 
     def parse(self):
         """
@@ -251,10 +323,17 @@ class Lexer:
         :rtype: psr.BlockStmt
         """
         parser = psr.Parser()
+        tokens = self.tokens
+        kind_of = tokens.kind
+        symbol_of = tokens.symbol
+        text_of = tokens.text
+        line_of = tokens.line
         i = 0
         func_count = 0
         in_cond = False
         auth = PUBLIC
+        is_const = False
+        memo = False
         call_nest = 0
         brace_count = 0
         class_braces: [(int, bool)] = []  # records the brace count when class stmt starts, True if is class, False
@@ -263,45 +342,48 @@ class Lexer:
 
         while True:
             try:
-                token = self.tokens[i]
-                line = (token.line_number(), token.file_name())
-                if isinstance(token, IdToken):
-                    sym = token.symbol
-                    if sym == "if":
+                kind = kind_of(i)
+                line = line_of(i)
+                if kind == ID_TOKEN:
+                    sym = symbol_of(i)
+                    if sym == SYM_IF:
                         in_cond = True
                         parser.add_if(line)
                         i += 1
-                        next_token = self.tokens[i]
-                        if not (isinstance(next_token, IdToken) and next_token.symbol == "("):
-                            unexpected_token(token)
-                    elif sym == "while":
+                        if symbol_of(i) != SYM_LPAREN:
+                            unexpected_token(tokens[i - 1])
+                    elif sym == SYM_WHILE:
                         in_cond = True
                         parser.add_while(line)
                         i += 1
-                    elif sym == "for":
+                    elif sym == SYM_FOR:
                         in_cond = True
                         parser.add_for_loop(line)
                         i += 1
-                    elif sym == "else":
+                    elif sym == SYM_ELSE:
                         pass  # this case is automatically handled by the if-block
-                    elif sym == "return":
+                    elif sym == SYM_RETURN:
                         parser.add_return(line)
                         # in_expr = True
                         # expr_layer += 1
-                    elif sym == "break":
+                    elif sym == SYM_BREAK:
                         parser.add_break(line)
-                    elif sym == "continue":
+                    elif sym == SYM_CONTINUE:
                         parser.add_continue(line)
-                    elif sym == "true" or sym == "false":
-                        parser.add_bool(line, sym)
-                    elif sym == "null":
+                    elif sym == SYM_TRUE or sym == SYM_FALSE:
+                        parser.add_bool(line, text_of(i))
+                    elif sym == SYM_NULL:
                         parser.add_null(line)
-                    elif sym == "@":
+                    elif sym == SYM_AT:
                         i += 1
-                    elif sym == "{":
+                        if kind_of(i) != ID_TOKEN:
+                            unexpected_token(tokens[i])
+                        if symbol_of(i) == SYM_MEMO:
+                            memo = True
+                    elif sym == SYM_LBRACE:
                         brace_count += 1
                         parser.new_block()
-                    elif sym == "}":
+                    elif sym == SYM_RBRACE:
                         brace_count -= 1
                         parser.build_line()
                         parser.build_block()
@@ -311,13 +393,12 @@ class Lexer:
                             else:
                                 parser.build_import()
                             class_braces.pop()
-                        next_token = self.tokens[i + 1]
-                        if not (isinstance(next_token, IdToken) and next_token.symbol in NO_BUILD_LINE):
+                        if symbol_of(i + 1) not in NO_BUILD_LINE_SYMBOLS:
                             parser.build_expr()
                             parser.build_line()
-                    elif sym == "(":
+                    elif sym == SYM_LPAREN:
                         extra_precedence += 1
-                    elif sym == ")":
+                    elif sym == SYM_RPAREN:
                         if extra_precedence == 0:
                             if call_nest > 0:
                                 # parser.build_expr()
@@ -331,9 +412,8 @@ class Lexer:
                         else:
                             # if parser.in_expr:
                             extra_precedence -= 1
-                    elif sym == "]":
-                        next_token = self.tokens[i + 1]
-                        if isinstance(next_token, IdToken) and next_token.symbol == "=":
+                    elif sym == SYM_RBRACKET:
+                        if symbol_of(i + 1) == SYM_ASSIGN:
                             parser.build_get_set(True)
                             parser.build_line()
                             i += 1
@@ -342,108 +422,85 @@ class Lexer:
                             parser.build_line()
                             parser.build_call()
                             call_nest -= 1
-                    elif sym == "=":
+                    elif sym == SYM_ASSIGN:
                         parser.build_expr()
                         parser.add_assignment(line)
-                    elif sym == ":":
+                    elif sym == SYM_COLON:
                         parser.build_expr()
                         parser.add_type(line)
-                    elif sym == ",":
+                    elif sym == SYM_COMMA:
                         parser.build_expr()
                         if call_nest > 0:
                             parser.build_line()
-                    elif sym == ".":
+                    elif sym == SYM_DOT:
                         parser.add_dot(line, extra_precedence)
-                    elif sym == "=>":
+                    elif sym == SYM_ARROW:
                         parser.add_anonymous_call(line, extra_precedence)
                         i += 1
                         call_nest += 1
-                    elif sym == "function" or sym == "def":
+                    elif sym == SYM_FUNCTION or sym == SYM_DEF:
                         i += 1
-                        f_token: IdToken = self.tokens[i]
-                        f_name = f_token.symbol
-<<<<<<< HEAD
-                        res = parse_def(f_name, self.tokens, i, func_count, parser, auth, is_const)
-=======
-                        res = parse_def(f_name, self.tokens, i, func_count, parser, auth)
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+                        f_name = text_of(i)
+                        res = parse_def(f_name, tokens, i, func_count, parser, auth, is_const, memo)
                         i = res[0]
                         func_count = res[1]
                         auth = PUBLIC
-                    elif sym == "operator":
+                        is_const = False
+                        memo = False
+                    elif sym == SYM_OPERATOR:
                         i += 1
-                        op_token: IdToken = self.tokens[i]
-                        op_name = "@" + BINARY_OPERATORS[op_token.symbol]
-<<<<<<< HEAD
-                        res = parse_def(op_name, self.tokens, i, func_count, parser, PUBLIC, False)
-=======
-                        res = parse_def(op_name, self.tokens, i, func_count, parser, PUBLIC)
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+                        op_name = "@" + BINARY_OPERATORS[text_of(i)]
+                        res = parse_def(op_name, tokens, i, func_count, parser, PUBLIC, False)
                         i = res[0]
                         func_count = res[1]
-                    elif sym == "import":
+                    elif sym == SYM_IMPORT:
+                        i += 1
+                        import_name = text_of(i)
                         i += 1
-                        next_token: IdToken = self.tokens[i]
-                        import_name = next_token.symbol
-                        parser.add_import(line, import_name)
+                        parser.add_import(line, import_name, text_of(i))
                         class_braces.append((brace_count, False))
-                    elif sym == "class":
+                    elif sym == SYM_CLASS:
                         i += 1
-                        c_token: IdToken = self.tokens[i]
-                        class_name = c_token.symbol
-                        parser.add_class((c_token.line_number(), c_token.file_name()), class_name)
+                        class_name = text_of(i)
+                        parser.add_class(line_of(i), class_name)
                         class_braces.append((brace_count, True))
-                    elif sym == "extends":
+                    elif sym == SYM_EXTENDS:
                         i += 1
                         cla = parser.get_current_class()
                         while True:
-                            c_token = self.tokens[i]
-                            superclass_name = c_token.symbol
+                            superclass_name, i = read_dotted_name(tokens, i)
                             parser.add_extends(superclass_name, cla)
-                            next_token = self.tokens[i + 1]
-                            if isinstance(next_token, IdToken) and next_token.symbol == ",":
+                            if symbol_of(i + 1) == SYM_COMMA:
                                 i += 2
                             else:
                                 break
-                    elif sym == "abstract":
+                    elif sym == SYM_ABSTRACT:
                         parser.add_abstract(line)
-                    elif sym == "private":
+                    elif sym == SYM_PRIVATE:
                         auth = PRIVATE
-                    elif sym == "new":
+                    elif sym == SYM_CONST:
+                        is_const = True
+                    elif sym == SYM_NEW:
                         i += 1
-                        c_token = self.tokens[i]
-                        class_name = c_token.symbol
-                        parser.add_class_new((c_token.line_number(), c_token.file_name()), class_name)
-                        next_token = self.tokens[i + 1]
-                        if i + 1 < len(self.tokens) and isinstance(next_token, IdToken) and \
-                                next_token.symbol == "(":
+                        c_line = line_of(i)
+                        class_name, i = read_dotted_name(tokens, i)
+                        parser.add_class_new(c_line, class_name)
+                        if symbol_of(i + 1) == SYM_LPAREN:
                             i += 1
                             call_nest += 1
-                            parser.add_call((c_token.line_number(), c_token.file_name()), class_name)
+                            parser.add_call(c_line, class_name)
                             # in_call = True
-                    elif sym == "throw":
+                    elif sym == SYM_THROW:
                         parser.add_throw(line)
-                    elif sym == "try":
+                    elif sym == SYM_TRY:
                         parser.add_try(line)
-                    elif sym == "catch":
+                    elif sym == SYM_CATCH:
                         parser.add_catch(line)
                         i += 1
                         in_cond = True
-                    elif sym == "finally":
+                    elif sym == SYM_FINALLY:
                         parser.add_finally(line)
-                    elif sym in BINARY_OPERATORS:
-                        if sym == "-" and (i == 0 or is_unary(self.tokens[i - 1])):
-                            parser.add_neg(line, extra_precedence)
-                        # elif sym == "*" and (i == 0 or is_unary(self.tokens[i - 1])):
-                        #     parser.add_unpack(line, extra_precedence)
-                        else:
-                            parser.add_operator(line, sym, extra_precedence)
-                    elif sym in UNARY_OPERATORS:
-                        if sym == "!":
-                            parser.add_not(line, extra_precedence)
-                    elif sym[:-1] in OP_EQ:
-                        parser.add_operator(line, sym, extra_precedence, True)
-                    elif token.is_eol():
+                    elif sym == SYM_EOL:
                         if parser.is_in_get():
                             # parser.build_line()
                             parser.build_call()
@@ -453,46 +510,286 @@ class Lexer:
                         # print(parser.stack)
                         parser.build_line()
                     else:
-                        next_token = self.tokens[i + 1]
-                        if isinstance(next_token, IdToken):
-                            if next_token.symbol == "(":
+                        text = text_of(i)
+                        if text in BINARY_OPERATORS:
+                            if text == "-" and (i == 0 or is_unary(tokens, i - 1)):
+                                parser.add_neg(line, extra_precedence)
+                            # elif text == "*" and (i == 0 or is_unary(tokens, i - 1)):
+                            #     parser.add_unpack(line, extra_precedence)
+                            else:
+                                parser.add_operator(line, text, extra_precedence)
+                        elif text in UNARY_OPERATORS:
+                            if text == "!":
+                                parser.add_not(line, extra_precedence)
+                        elif text[:-1] in OP_EQ:
+                            parser.add_operator(line, text, extra_precedence, True)
+                        else:
+                            next_sym = symbol_of(i + 1)
+                            if next_sym == SYM_LPAREN:
                                 # function call
-                                parser.add_call(line, sym)
+                                parser.add_call(line, text)
                                 call_nest += 1
                                 i += 1
-                            elif next_token.symbol == "[":
-                                parser.add_name(line, sym, auth)
+                            elif next_sym == SYM_LBRACKET:
+                                parser.add_name(line, text, auth)
                                 parser.add_dot(line, extra_precedence)
                                 parser.add_get_set(line)
                                 call_nest += 1
                                 i += 1
                             else:
-                                parser.add_name(line, sym, auth)
-                        else:
-                            parser.add_name(line, sym, auth)
-                        auth = PUBLIC
-
-                elif isinstance(token, NumToken):
-                    value = token.value
-                    parser.add_number(line, value)
-                elif isinstance(token, LiteralToken):
-                    value = token.text
-                    parser.add_literal(line, value)
-                elif token.is_eof():
+                                parser.add_name(line, text, auth)
+                            auth = PUBLIC
+
+                elif kind == NUM_TOKEN:
+                    parser.add_number(line, text_of(i))
+                elif kind == LITERAL_TOKEN:
+                    parser.add_literal(line, replace_escapes(text_of(i)))
+                elif kind == EOF_TOKEN:
                     parser.build_line()
                     break
                 else:
-                    unexpected_token(token)
+                    unexpected_token(tokens[i])
                 i += 1
             except Exception:
-                raise ParseException("Parse error in '{}', at line {}".format(self.tokens[i].file_name(),
-                                                                              self.tokens[i].line_number()))
+                line = line_of(i)
+                raise ParseException("Parse error in '{}', at line {}".format(line[1], line[0]))
 
         if in_cond or call_nest != 0 or brace_count != 0 or extra_precedence != 0:
             raise ParseException("Reach the end while parsing")
         return parser.get_as_block()
 
 
+def import_tokens(tokens, line_file, full_path, import_name, imported: set):
+    """
+    Adds the tokens of an imported script file, as a module block following the module name and the resolved
+    path of the file, yielding like Lexer.generate_tokens.
+
+    A file is only tokenized at its first import, the block of the later imports is empty.
+
+    :type tokens: TokenList
+    :param tokens: the tokens to add to
+    :param line_file: the line number and the source file name of the import statement
+    :param full_path: the full path of the imported file.
+    :param import_name: the name of the module
+    :param imported: the resolved paths of the files already imported
+    :return: the generator of the steps
+    """
+    path = os.path.realpath(full_path)
+    tokens.add_all([ID_TOKEN] * 4, ["import", import_name, path, "{"], line_file)
+    yield
+    if path not in imported:
+        imported.add(path)
+        with open(full_path, "r") as file:
+            lexer = Lexer(tokens.table)
+            lexer.tokens = tokens
+            lexer.file_name = full_path
+            lexer.script_dir = get_dir(full_path)
+            lexer.imported = imported
+            yield from lexer.generate_tokens(file)
+    tokens.add_all([ID_TOKEN, ID_TOKEN], ["}", EOL], line_file)
+    yield
+
+
+class SymbolTable:
+    """
+    The texts of the tokens and the names of their files, each stored once and referred by its index.
+
+    The symbols of FIXED_SYMBOLS have the same ids in every table.
+
+    :type symbols: list of str
+    :type ids: dict
+    """
+
+    def __init__(self):
+        self.symbols = [FIXED_SYMBOLS[i] for i in range(len(FIXED_SYMBOLS))]
+        self.ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def intern(self, text: str) -> int:
+        """
+        Returns the id of a text, adding it to the table if it is new.
+
+        :param text: the text
+        :return: the id
+        """
+        i = self.ids.get(text)
+        if i is None:
+            i = len(self.symbols)
+            self.ids[text] = i
+            self.symbols.append(text)
+        return i
+
+
+class TokenList:
+    """
+    The tokens of a script, stored in parallel arrays: the kind of each token, the id of its text, its line number
+    and the id of its file name. The text id of a token which is not an identifier is stored inverted, as ~id, so
+    that the symbol of a token is read without checking its kind.
+
+    The parser reads the tokens through kind, symbol, text and line. Indexing a TokenList, or iterating it, makes
+    Token objects.
+
+    :type table: SymbolTable
+    """
+
+    def __init__(self, table: SymbolTable):
+        self.table = table
+        self.kinds = array.array("b")
+        self.texts = array.array("i")
+        self.lines = array.array("i")
+        self.files = array.array("i")
+        self.last_line = None  # the line of the last added token, and the id of its file
+        self.file_id = 0
+
+        # kind(index) returns the kind of a token, symbol(index) returns the symbol id of an identifier token, or a
+        # negative number if the token is not an identifier
+        self.kind = self.kinds.__getitem__
+        self.symbol = self.texts.__getitem__
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        return self.token(index)
+
+    def __iter__(self):
+        return (self.token(i) for i in range(len(self.kinds)))
+
+    def __repr__(self):
+        return "[{}]".format(", ".join(repr(token) for token in self))
+
+    def add(self, kind: int, text: str, line):
+        """
+        Appends a token.
+
+        :param kind: the kind of the token, one of EOF_TOKEN, ID_TOKEN, NUM_TOKEN and LITERAL_TOKEN
+        :param text: the text of the token, with the escapes of literals not yet replaced
+        :param line: the line number and the name of source file
+        """
+        table = self.table
+        i = table.ids.get(text)
+        if i is None:
+            i = table.intern(text)
+        if line is not self.last_line:
+            self.last_line = line
+            self.file_id = table.intern(line[1])
+        self.kinds.append(kind)
+        self.texts.append(i if kind == ID_TOKEN else ~i)
+        self.lines.append(line[0])
+        self.files.append(self.file_id)
+
+    def add_all(self, kinds: list, texts: list, line):
+        """
+        Appends tokens of the same line.
+
+        :param kinds: the kinds of the tokens
+        :param texts: the texts of the tokens
+        :param line: the line number and the name of source file
+        """
+        table = self.table
+        get = table.ids.get
+        append = self.texts.append
+        for kind, text in zip(kinds, texts):
+            i = get(text)
+            if i is None:
+                i = table.intern(text)
+            append(i if kind == ID_TOKEN else ~i)
+        if line is not self.last_line:
+            self.last_line = line
+            self.file_id = table.intern(line[1])
+        count = len(kinds)
+        self.kinds.extend(kinds)
+        self.lines.extend([line[0]] * count)
+        self.files.extend([self.file_id] * count)
+
+    def delete(self, index: int, count: int):
+        end = index + count
+        del self.kinds[index:end]
+        del self.texts[index:end]
+        del self.lines[index:end]
+        del self.files[index:end]
+
+    def text(self, index: int) -> str:
+        i = self.texts[index]
+        return self.table.symbols[i if i >= 0 else ~i]
+
+    def line(self, index: int) -> tuple:
+        return self.lines[index], self.table.symbols[self.files[index]]
+
+    def token(self, index: int):
+        """
+        Returns a token as a Token object.
+
+        :param index: the index of the token
+        :return: the Token
+        """
+        kind = self.kinds[index]
+        line = self.line(index)
+        if kind == ID_TOKEN:
+            return IdToken(line, self.text(index))
+        elif kind == NUM_TOKEN:
+            return NumToken(line, self.text(index))
+        elif kind == LITERAL_TOKEN:
+            return LiteralToken(line, self.text(index))
+        else:
+            return Token(line)
+
+
+class TokenStream:
+    """
+    The tokens read by the parser while a generator adds them to a TokenList, indexed as a TokenList.
+
+    The tokens are produced when the parser first reads them, and only the LOOK_BEHIND tokens before the last
+    read one are kept.
+
+    :type window: TokenList
+    """
+
+    def __init__(self, window: TokenList, generator):
+        self.generator = generator
+        self.window = window
+        self.offset = 0  # the index of the first token of the window
+
+    def position(self, index: int) -> int:
+        """
+        Returns the index of a token in the window, reading the tokens up to it.
+
+        :param index: the index of the token in the whole stream
+        :return: the index in the window
+        """
+        i = index - self.offset
+        window = self.window
+        if i < 0:
+            raise IndexError("Token {} is no longer kept".format(index))
+        if i > 2 * LOOK_BEHIND:
+            window.delete(0, i - LOOK_BEHIND)
+            self.offset = index - LOOK_BEHIND
+            i = LOOK_BEHIND
+        while i >= len(window):
+            try:
+                next(self.generator)
+            except StopIteration:
+                raise IndexError("Token {} is after the end of file".format(index))
+        return i
+
+    def __getitem__(self, index):
+        return self.token(index)
+
+    def kind(self, index: int) -> int:
+        return self.window.kind(self.position(index))
+
+    def symbol(self, index: int) -> int:
+        return self.window.symbol(self.position(index))
+
+    def text(self, index: int) -> str:
+        return self.window.text(self.position(index))
+
+    def line(self, index: int) -> tuple:
+        return self.window.line(self.position(index))
+
+    def token(self, index: int):
+        return self.window.token(self.position(index))
+
+
 def unexpected_token(token):
     if isinstance(token, IdToken):
         raise ParseException("Unexpected token: '{}', in {}, at line {}".format(token.symbol,
@@ -503,67 +800,48 @@ def unexpected_token(token):
                                                                            token.line_number()))
 
 
-<<<<<<< HEAD
-def parse_def(f_name, tokens, i, func_count, parser: psr.Parser, auth, is_const):
-=======
-def parse_def(f_name, tokens, i, func_count, parser, auth):
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+def parse_def(f_name, tokens, i, func_count, parser: psr.Parser, auth, is_const, memo=False):
     """
     Parses a function declaration into abstract syntax tree.
 
     :param f_name: the function name
-    :param tokens: the list of all tokens
+    :param tokens: the TokenList or TokenStream of all tokens
     :param i: the current reading index of the token list
     :param func_count: the count the anonymous functions
     :param parser: the Parser object
     :param auth: the authority of this function
-<<<<<<< HEAD
     :param is_const: whether this defines a constant function
-=======
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+    :param memo: whether the function is annotated by @Memo
     :return: tuple(new index, new anonymous function count)
     """
-    tup = (tokens[i].line_number(), tokens[i].file_name())
+    tup = tokens.line(i)
     if f_name == "(":
-<<<<<<< HEAD
-        parser.add_function(tup, "af-{}".format(func_count), auth, is_const)
+        parser.add_function(tup, "af-{}".format(func_count), auth, is_const, memo)
         # "af" stands for anonymous function
         func_count += 1
     else:
-        parser.add_function(tup, f_name, auth, is_const)
-=======
-        parser.add_function(tup, "af-{}".format(func_count), auth)  # "af" stands for anonymous function
-        func_count += 1
-    else:
-        parser.add_function(tup, f_name, auth)
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+        parser.add_function(tup, f_name, auth, is_const, memo)
         i += 1
-    front_par = tokens[i]
-    if isinstance(front_par, IdToken) and front_par.symbol == "(":
+    if tokens.symbol(i) == SYM_LPAREN:
         i += 1
         params = []
         presets = []
         ps = False
         while True:
-            token = tokens[i]
-            if isinstance(token, IdToken):
-                sbl = token.symbol
-            elif isinstance(tokens[i], NumToken):
-                sbl = token.value
-            else:
-                sbl = token.text
-            # print(str(sbl) + " " + str(ps))
-            if sbl == ")":
+            sym = tokens.symbol(i)
+            if sym == SYM_RPAREN:
                 # i -= 1
                 break
-            elif sbl != ",":
+            elif sym != SYM_COMMA:
                 if ps:
                     ps = False
-                    presets.append(token)
-                elif sbl == "=":
+                    presets.append(tokens.token(i))
+                elif sym == SYM_ASSIGN:
                     ps = True
+                elif tokens.kind(i) == EOF_TOKEN:
+                    unexpected_token(tokens.token(i))
                 else:
-                    params.append(sbl)
+                    params.append(tokens.text(i))
             i += 1
         presets = [psr.InvalidToken(tup) for _ in range(len(params) - len(presets))] + presets
         # print(presets)
@@ -571,123 +849,99 @@ def parse_def(f_name, tokens, i, func_count, parser, auth):
     return i, func_count
 
 
-def is_unary(last_token):
+def read_dotted_name(tokens, i):
+    """
+    Reads a possibly module-qualified name, such as 'queue.LinkedList'.
+
+    :param tokens: the TokenList or TokenStream of all tokens
+    :param i: the index of the first part of the name
+    :return: tuple(the full name, index of the last part of the name)
+    """
+    name = tokens.text(i)
+    while tokens.symbol(i + 1) == SYM_DOT and tokens.kind(i + 2) == ID_TOKEN:
+        name += "." + tokens.text(i + 2)
+        i += 2
+    return name, i
+
+
+def is_unary(tokens, i):
     """
-    Returns True iff this should be an unary operator.
+    Returns True iff the operator after a token should be an unary operator.
     False if it should be a minus operator.
 
-    :param last_token:
-    :type last_token: Token
+    :param tokens: the TokenList or TokenStream of all tokens
+    :param i: the index of the token before the operator
     :return:
     :rtype: bool
     """
-    if isinstance(last_token, IdToken):
-        if last_token.is_eol():
+    kind = tokens.kind(i)
+    if kind == ID_TOKEN:
+        sym = tokens.text(i)
+        if sym == EOL:
+            return True
+        elif sym in BINARY_OPERATORS:
+            return True
+        elif sym in SYMBOLS:
+            return True
+        elif sym == "(":
+            return True
+        elif sym == "=":
+            return True
+        elif sym in RESERVED:
             return True
         else:
-            sym = last_token.symbol
-            if sym in BINARY_OPERATORS:
-                return True
-            elif sym in SYMBOLS:
-                return True
-            elif sym == "(":
-                return True
-            elif sym == "=":
-                return True
-            elif sym in RESERVED:
-                return True
-            else:
-                return False
-    elif isinstance(last_token, NumToken):
+            return False
+    elif kind == NUM_TOKEN:
         return False
     else:
         return True
 
 
-def normalize(string):
+def split_tokens(string: str) -> list:
     """
-    Splits a line to tokens.
+    Splits a text without string literals and comments into the texts of tokens, leaving out the spaces.
 
-    :type string: str
-    :param string:
-    :return:
-    :type: list
+    The text is translated into a string of character classes, which TOKEN_PATTERN splits into tokens.
+    A text which is an identifier as a whole is a single token.
+
+    :param string: the text
+    :return: the list of token texts
     """
     if string.isidentifier():
         return [string]
-    else:
-        lst = []
-        if len(string) > 0:
-            s = string[0]
-            last_type = char_type(s)
-            self_concatenate = {0, 1, 8, 9, 10, 11, 14}
-            cross_concatenate = {(8, 9), (1, 0), (0, 12), (12, 0), (15, 9), (17, 9), (16, 9), (10, 9), (11, 9),
-                                 (9, 8)}
-            for i in range(1, len(string), 1):
-                char = string[i]
-                t = char_type(char)
-                if (t in self_concatenate and t == last_type) or ((last_type, t) in cross_concatenate):
-                    s += char
-                else:
-                    put_string(lst, s)
-                    s = char
-                last_type = t
-            put_string(lst, s)
-        return lst
+    classes = string.translate(CHAR_CLASS_TABLE)
+    return [string[m.start(): m.end()] for m in TOKEN_PATTERN.finditer(classes) if classes[m.start()] != "w"]
+
 
+def char_class(ch: str) -> str:
+    """
+    Returns the class of a character in a text to be split into tokens.
 
-def put_string(lst: list, s: str):
-    if len(s) > 1 and s[-1] == ".":  # Scenario of a name ended with a number.
-        lst.append(s[:-1])
-        lst.append(s[-1])
+    :param ch: the character
+    :return: the class, a single character of TOKEN_PATTERN
+    """
+    if ch in OMITS:
+        return "w"
+    elif ch.isdigit():
+        return "d"
+    elif ch.isidentifier():
+        return "l"
     else:
-        lst.append(s)
+        return CHAR_CLASSES.get(ch, "s")
 
 
-def char_type(ch):
+class _CharClassTable(dict):
     """
-    :type ch: string
-    :param ch:
-    :return:
+    The table of str.translate from the characters to their classes, filled at the first use of each character.
     """
-    if ch.isdigit():
-        return 0
-    elif ch.isidentifier():
-        return 1
-    elif ch == "{":
-        return 2
-    elif ch == "}":
-        return 3
-    elif ch == "(":
-        return 4
-    elif ch == ")":
-        return 5
-    elif ch == ";":
-        return 6
-    elif ch == "\n":
-        return 7
-    elif ch == ">" or ch == "<":
-        return 8
-    elif ch == "=":
-        return 9
-    elif ch == "&":
-        return 10
-    elif ch == "|":
-        return 11
-    elif ch == ".":
-        return 12
-    elif ch == ",":
-        return 13
-    # elif ch == "/":
-    #     return 14
-    elif ch == "!":
-        return 15
-    elif ch == "^":
-        return 16
-    elif ch in {"+", "-", "*", "/", "%"}:
-        return 17
-    elif ch == "@":
-        return 18
+
+    def __missing__(self, code: int):
+        c = char_class(chr(code))
+        self[code] = c
+        return c
+
+
+CHAR_CLASS_TABLE = _CharClassTable()
 
 
 def is_float(num_str):
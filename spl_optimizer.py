@@ -1,97 +1,1238 @@
+import copy
+import time
 from spl_parser import *
-from spl_lib import *
+from spl_interpreter import *
+from spl_resolver import walk, children, map_children, IMPLICIT_NAMES
+from spl_profile import NUMERIC, GENERIC
+
+# Marks a condition which is not known before run time
+NOT_CONSTANT = object()
+
+# The statements after which the rest of a block is never executed
+TERMINATORS = {RETURN_STMT, BREAK_STMT, CONTINUE_STMT, THROW_STMT}
+
+# The nodes whose bodies are evaluated in their own scopes
+LEVEL_NODES = {DEF_STMT, CLASS_STMT, IMPORT_STMT}
+
+LOOP_NODES = {WHILE_STMT, FOR_LOOP_STMT}
+
+# The methods of the native types which neither change the object nor have other effects
+PURE_METHODS = {"length", "size", "contains", "__getitem__"}
+
+# The default maximum number of nodes of an inlined function body
+INLINE_BUDGET = 40
+
+# The native functions whose results only depend on their arguments
+PURE_NATIVES = {"int", "float", "string", "boolean", "type"}
+
+# The budget of inlining is multiplied by this at the hot calls of hot functions, with a profile
+HOT_INLINE_FACTOR = 2
+
+# The comparisons between the index and the bound of a counted loop
+COUNTED_COMPARISONS = {"<", "<=", ">", ">="}
 
 
 class Optimizer:
+    """
+    :type known: dict
+    """
+
     def __init__(self, ast: BlockStmt):
         self.ast = ast
         self.level = 0
-        self.last_func = None
-        self.returning = False
+        self.in_function = False  # whether the node being reduced is in a function body
+        self.bindings = {}  # the number of places binding each name
+        self.binding_levels = {}  # the bodies binding each name, once for each place
+        self.level_parents = {}  # the body enclosing each body, None for the script and the modules
+        self.level_params = {}  # the parameter names of each function body
+        self.class_levels = set()  # the bodies of the classes
+        self.functions = {}  # the definitions of each function name, with the bodies they are in
+        self.defined_names = set()  # the names of all functions and methods
+        self.propagating = True
+        self.known = {}  # the names with known values, at the current position
+        self.removed = 0  # the number of nodes removed by the dead code elimination
+        self.invariants = 0  # the number of hoisted loop invariants
+        self.level_body = None  # the body of the function or module being moved, None in class bodies
+        self.loop_bound = set()  # the names bound in the loop being moved
+        self.loop_calls = False  # whether the loop being moved calls anything but pure methods
+        self.inline_budget = INLINE_BUDGET
+        self.inlined = 0  # the number of inlined calls
+        self.inline_states = {}  # the function definitions whose own calls are being inlined, or are done
+        self.inline_infos = {}  # the locals and free names of each function definition, None if it is not inlinable
+        self.memoized = 0  # the number of function definitions found without side effects
+        self.counted = 0  # the number of loops replaced by range loops
+        self.memoizing = False  # whether the pure functions are marked for memoization
+        self.profile = None  # the spl_profile.Profile of a training run, which focuses the passes on hot code
+        self.quickened = 0  # the number of operators quickened from the profile
+        self.passes = list(PASSES)  # the passes run by optimize, in order
+        self.reporting = False  # whether the time and the tree size of each pass are recorded
+        self.report = []  # the PassReport of each pass run, in order
 
     def optimize(self, level):
+        """
+        Runs the passes enabled at an optimization level, in order.
+
+        :param level: the optimization level
+        """
         self.level = level
-        if level == 1 or level == 2:
-            self.optimize_leaf()
+        for p in self.passes:
+            if p.enabled(self):
+                self.run_pass(p)
+
+    def run_pass(self, p):
+        """
+        Runs a pass, and records its report if reporting.
+
+        :param p: the pass
+        :type p: Pass
+        """
+        if not self.reporting:
+            p.run(self)
+            return
+        before = count_nodes(self.ast)
+        start = time.time()
+        p.run(self)
+        elapsed = time.time() - start
+        detail = None if p.detail is None else p.detail(self)
+        self.report.append(PassReport(p.name, elapsed, before, count_nodes(self.ast), detail))
 
     def optimize_leaf(self):
         self.ast = self.reduce_leaf(self.ast)
 
-    def reduce_leaf(self, node: Node):
-        if node is None:
-            return None
+    def optimize_constant(self):
+        """
+        Folds the operations over literals, and propagates the values of the names bound only once, to a literal.
+        """
+        self.scan()
+        self.fold_level(self.ast)
+
+    def optimize_inline(self):
+        """
+        Replaces the calls of small functions by their bodies, evaluated in the working environment of the calls.
+        """
+        if self.inline_budget <= 0:
+            return
+        self.scan()
+        self.inline_level(self.ast, self.ast)
+
+    def optimize_loop_invariant(self):
+        """
+        Replaces the expressions which are invariant in a loop and have no effect by InvariantNode's, which are
+        evaluated only once in each execution of the loop.
+        """
+        self.scan()
+        self.move_level(self.ast, True)
+
+    def optimize_counted_loop(self):
+        """
+        Replaces the loops 'for (i = start; i < bound; i += step)' whose index and bound are not changed by the body
+        by RangeNode's, which iterate over a range of integers.
+        """
+        self.scan()
+        self.count_level(self.ast, True)
+
+    def optimize_profile(self):
+        """
+        Quickens the operators ahead of run time, as the training run of the profile found them.
+        """
+        self.quicken(self.ast)
+
+    def optimize_memo(self):
+        """
+        Marks the functions whose results only depend on their arguments and which have no side effects, so that
+        their results are remembered when memoization is enabled.
+        """
+        self.scan()
+        if not self.propagating:
+            return
+        calls = {}
+        for defs in self.functions.values():
+            for func, level in defs:
+                called = self.pure_calls(func)
+                if called is not None:
+                    calls[func] = called
+        # drops the functions calling the others not found pure, until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for func in list(calls):
+                for name in calls[func]:
+                    defs = self.functions.get(name)
+                    if defs is None or len(defs) != 1 or self.bindings.get(name) != 1 or defs[0][0] not in calls:
+                        del calls[func]
+                        changed = True
+                        break
+        for func in calls:
+            func.memo = True
+        self.memoized = len(calls)
+
+    def optimize_dead_code(self):
+        """
+        Removes the unreachable statements, the branches never taken and the statements without effect,
+        and collapses the single-statement bodies of branches and loops.
+        """
+        self.ast = self.prune(self.ast)
+
+    def scan(self):
+        """
+        Records the bindings of the whole script, as it is now.
+        """
+        self.bindings = {}
+        self.binding_levels = {}
+        self.level_parents = {self.ast: None}
+        self.level_params = {}
+        self.class_levels = set()
+        self.functions = {}
+        self.defined_names = set()
+        self.propagating = True
+        self.scan_bindings(self.ast)
+
+    def scan_bindings(self, body):
+        """
+        Records the names bound in a body of function, class, module or the script, and in its nested bodies.
+
+        :param body: the body
+        """
+        for node in walk_level(body):
+            for name in bound_names(node):
+                self.bind(name, body)
+            t = node.type
+            if t == DEF_STMT:
+                self.defined_names.add(node.name)
+                if node.name in self.functions:
+                    self.functions[node.name].append((node, body))
+                else:
+                    self.functions[node.name] = [(node, body)]
+                self.level_parents[node.body] = body
+                self.level_params[node.body] = {param.name for param in node.params}
+                for param in node.params:
+                    self.bind(param.name, node.body)
+                self.scan_bindings(node.body)
+            elif t == CLASS_STMT:
+                self.level_parents[node.block] = body
+                self.class_levels.add(node.block)
+                self.scan_bindings(node.block)
+            elif t == IMPORT_STMT:
+                # the environment of a module does not enclose in the importing environment
+                self.level_parents[node.block] = None
+                self.scan_bindings(node.block)
+            elif t == FUNCTION_CALL and node.f_name == "eval":
+                # evaluated code may bind any name
+                self.propagating = False
+
+    def bind(self, name: str, body):
+        self.bindings[name] = self.bindings.get(name, 0) + 1
+        if name in self.binding_levels:
+            self.binding_levels[name].append(body)
+        else:
+            self.binding_levels[name] = [body]
+
+    def fold_level(self, body):
+        """
+        Folds the body of a function, a class, a module or the script.
+
+        A name is propagated only to the positions after its assignment in the same body, and only if the assignment
+        is a statement of this body, so that the assignment is always executed before these positions.
+
+        :param body: the body
+        """
+        outer = self.known
+        self.known = {}
+        if isinstance(body, BlockStmt):
+            lines = body.lines
+            for i in range(len(lines)):
+                line = self.fold(lines[i])
+                lines[i] = line
+                if isinstance(line, AssignmentNode) and isinstance(line.left, NameNode) and \
+                        is_constant(line.right) and self.propagating and self.bindings[line.left.name] == 1:
+                    self.known[line.left.name] = line.right
+        self.known = outer
+
+    def fold(self, node):
+        if node is None or not isinstance(node, Node):
+            return node
         t = node.type
-        if t == BLOCK_STMT:
+        if t in LITERAL_NODES:
+            return self.reduce_leaf(node)
+        elif t == BLOCK_STMT:
             node: BlockStmt
             for i in range(len(node.lines)):
-                node.lines[i] = self.reduce_leaf(node.lines[i])
+                node.lines[i] = self.fold(node.lines[i])
             return node
-        elif isinstance(node, NumNode):
-            return node.value
-        elif isinstance(node, NullStmt):
-            return None
-        elif isinstance(node, BooleanStmt):
-            return node.value == "true"
-        elif isinstance(node, LiteralNode):
-            return String(node.literal)
-        elif isinstance(node, BinaryExpr):
-            # this reversal is done intentionally
-            node.right = self.reduce_leaf(node.right)
-            node.left = self.reduce_leaf(node.left)
+        elif t == NAME_NODE:
+            node: NameNode
+            return self.known.get(node.name, node)
+        elif t == OPERATOR_NODE:
+            node: OperatorNode
+            node.right = self.fold(node.right)
+            node.left = self.fold(node.left)
+            if is_constant(node.left) and is_constant(node.right) and node.operation != "instanceof":
+                try:
+                    return arithmetic(node.left, node.right, node.operation, None)
+                except Exception:
+                    # leaves the error to run time
+                    return node
+            return node
+        elif t == ASSIGNMENT_NODE or t == UPDATE_NODE:
+            node.right = self.fold(node.right)
+            return node
+        elif t == DOT:
+            node: Dot
+            node.left = self.fold(node.left)
+            if isinstance(node.right, FuncCall):
+                self.fold_args(node.right)
+            return node
+        elif t == ANONYMOUS_CALL:
+            node: AnonymousCall
+            node.left = self.fold(node.left)
+            self.fold_args(node.right)
+            return node
+        elif isinstance(node, UnaryOperator):
+            node.value = self.fold(node.value)
+            if t == NEGATIVE_EXPR and (type(node.value) is int or type(node.value) is float):
+                return -node.value
+            elif t == NOT_EXPR and is_constant(node.value):
+                return not bool(node.value)
             return node
         elif t == IF_STMT:
             node: IfStmt
-            node.condition = self.reduce_leaf(node.condition)
-            node.then_block = self.reduce_leaf(node.then_block)
-            node.else_block = self.reduce_leaf(node.else_block)
-            return node
+            node.condition = self.fold(node.condition)
+            cond = condition_value(node.condition)
+            if cond is NOT_CONSTANT:
+                node.then_block = self.fold(node.then_block)
+                node.else_block = self.fold(node.else_block)
+                return node
+            elif cond:
+                return self.fold(node.then_block)
+            else:
+                return self.fold(node.else_block)
         elif t == WHILE_STMT:
             node: WhileStmt
-            node.condition = self.reduce_leaf(node.condition)
-            node.body = self.reduce_leaf(node.body)
+            node.condition = self.fold(node.condition)
+            cond = condition_value(node.condition)
+            if cond is not NOT_CONSTANT and not cond:
+                # the value of a loop which never runs, which the block keeps if the loop is its last line
+                return 0
+            node.body = self.fold(node.body)
             return node
         elif t == FOR_LOOP_STMT:
             node: ForLoopStmt
-            node.condition = self.reduce_leaf(node.condition)
-            node.body = self.reduce_leaf(node.body)
+            lines = node.condition.lines
+            if len(lines) == 2:
+                lines[1] = self.fold(lines[1])
+            else:
+                for i in range(len(lines)):
+                    lines[i] = self.fold(lines[i])
+                cond = condition_value(lines[1])
+                if cond is not NOT_CONSTANT and not cond:
+                    return lines[0]
+            node.body = self.fold(node.body)
+            return node
+        elif t == FUNCTION_CALL or t == CLASS_INIT:
+            self.fold_args(node)
+            return node
+        elif t == JUMP_NODE:
+            node: JumpNode
+            if isinstance(node.args, BlockStmt):
+                self.fold(node.args)
+            return node
+        elif t == TRY_STMT:
+            node: TryStmt
+            node.try_block = self.fold(node.try_block)
+            for cat in node.catch_blocks:
+                cat.then = self.fold(cat.then)
+            node.finally_block = self.fold(node.finally_block)
             return node
+        elif t == DEF_STMT:
+            node: DefStmt
+            outer = self.known
+            self.known = {}
+            for i in range(len(node.presets)):
+                node.presets[i] = self.fold(node.presets[i])
+            self.known = outer
+            self.fold_level(node.body)
+            return node
+        elif t == CLASS_STMT or t == IMPORT_STMT:
+            self.fold_level(node.block)
+            return node
+        else:
+            return node
+
+    def fold_args(self, node):
+        if node.args:
+            self.fold(node.args)
+
+    def inline_level(self, body, level):
+        """
+        Inlines the calls in a body of function, class, module or the script.
+
+        :param body: the body
+        :param level: the body, or None for class bodies, whose working environment becomes the class scope
+        """
+        outer = self.level_body
+        self.level_body = level
+        self.inline(body)
+        self.level_body = outer
+
+    def inline_function(self, node: DefStmt):
+        """
+        Inlines the calls in the body of a function, before its own calls are inlined.
+
+        :param node: the function definition
+        """
+        if node not in self.inline_states:
+            self.inline_states[node] = False
+            self.inline_level(node.body, node.body)
+            self.inline_states[node] = True
+
+    def inline(self, node):
+        if node is None or not isinstance(node, Node):
+            return node
+        t = node.type
+        if t == BLOCK_STMT:
+            node: BlockStmt
+            for i in range(len(node.lines)):
+                node.lines[i] = self.inline(node.lines[i])
+        elif t == FUNCTION_CALL:
+            node: FuncCall
+            self.inline(node.args)
+            return self.inline_call(node)
+        elif t == DOT:
+            node: Dot
+            node.left = self.inline(node.left)
+            if isinstance(node.right, FuncCall):
+                self.inline(node.right.args)
+                return self.inline_module_call(node)
+        elif isinstance(node, BinaryExpr):
+            if t != ASSIGNMENT_NODE and t != UPDATE_NODE:
+                node.left = self.inline(node.left)
+            node.right = self.inline(node.right)
         elif isinstance(node, UnaryOperator):
-            if t == RETURN_STMT:
-                node: ReturnStmt
-                # v = node.value
-                if self.level > 1:
-                    self.returning = True
-                node.value = self.reduce_leaf(node.value)
-                self.returning = False
-                # if isinstance(v, FuncCall):
-                #     if self.last_func:
-                #         if self.last_func.name == v.f_name:
-                #             jn = JumpNode((node.line_num, node.file), self.last_func.name)
-                #             jn.args = v.args
-                #             print(jn.args)
-                #             return jn
+            node.value = self.inline(node.value)
+        elif t == IF_STMT:
+            node: IfStmt
+            node.condition = self.inline(node.condition)
+            node.then_block = self.inline(node.then_block)
+            node.else_block = self.inline(node.else_block)
+        elif t in LOOP_NODES:
+            self.inline(node.condition)
+            node.body = self.inline(node.body)
+        elif t == DEF_STMT:
+            self.inline_function(node)
+        elif t == CLASS_STMT:
+            self.inline_level(node.block, None)
+        elif t == IMPORT_STMT:
+            self.inline_level(node.block, node.block)
+        elif t != INLINE_NODE:
+            for child in children(node):
+                self.inline(child)
+        return node
+
+    def inline_call(self, node: FuncCall):
+        call_level = self.level_body
+        if call_level is None or not self.propagating:
+            return node
+        # the only definition visible from the call
+        visible = [(func, level) for func, level in self.functions.get(node.f_name, ())
+                   if level is call_level or self.encloses(level, call_level)]
+        if len(visible) != 1:
+            return node
+        func, level = visible[0]
+        related = [body for body in self.binding_levels[node.f_name]
+                   if body is level or self.encloses(body, level) or self.encloses(level, body)]
+        if len(related) != 1:
+            return node
+        info = self.inline_info(func, level)
+        if info is None or len(node.args.lines) != len(func.params) or not self.fits_inline(node, func):
+            return node
+        # the free names must not be shadowed between the call and the function definition
+        path = []
+        body = call_level
+        while body is not level:
+            path.append(body)
+            body = self.level_parents[body]
+        in_class = any(body in self.class_levels for body in path)
+        for name in info[1]:
+            for body in self.binding_levels.get(name, ()):
+                if any(b is body for b in path) or (in_class and body in self.class_levels):
+                    return node
+        if in_class and any(body in self.class_levels for body in self.binding_levels[node.f_name]):
+            return node
+        return self.make_inline(node, node.args, func, info[0])
+
+    def inline_module_call(self, node: Dot):
+        call = node.right
+        if self.level_body is None or not self.propagating or not isinstance(node.left, NameNode) or \
+                self.bindings.get(node.left.name) != 1 or self.bindings.get(call.f_name) != 1 or \
+                call.f_name not in self.functions:
+            return node
+        func, level = self.functions[call.f_name][0]
+        module = self.level_parents.get(func.body)
+        if func.auth != lex.PUBLIC or module is self.ast or module in self.class_levels:
+            return node
+        imports = [n for n in walk(self.ast) if n.type == IMPORT_STMT and n.class_name == node.left.name]
+        if len(imports) != 1 or imports[0].block is not module:
+            return node
+        info = self.inline_info(func, level)
+        if info is None or len(call.args.lines) != len(func.params) or not self.fits_inline(node, func):
+            return node
+        # the body is evaluated out of the module, so it can only use the names bound in the heap
+        for name in info[1]:
+            if name in self.binding_levels:
                 return node
-            else:
-                node.value = self.reduce_leaf(node.value)
+        return self.make_inline(node, call.args, func, info[0])
+
+    def inline_info(self, func: DefStmt, level):
+        """
+        Returns the local names and the free names of a function, or None if the function cannot be inlined.
+
+        :param func: the function definition
+        :param level: the body where the function is defined
+        :return: the tuple of local names and free names, or None
+        """
+        if func in self.inline_infos:
+            return self.inline_infos[func]
+        self.inline_infos[func] = None
+        self.inline_function(func)
+        if self.inline_states[func] is False:
+            # called by a function called by itself
+            return None
+        body = level
+        while body is not None:
+            if body in self.class_levels:
+                return None
+            body = self.level_parents[body]
+        if func.memo:
+            # the results of a function annotated '@Memo' are remembered by the call
+            return None
+        local_names = {param.name for param in func.params}
+        used = set()
+        attributes = set()
+        for node in walk(func.body):
+            t = node.type
+            local_names.update(bound_names(node))
+            if t in LEVEL_NODES or t == JUMP_NODE:
+                # closures and tail calls
+                return None
+            elif t == DOT:
+                attributes.add(id(node.right))
+            elif t == NAME_NODE and id(node) not in attributes:
+                used.add(node.name)
+            elif t == FUNCTION_CALL and id(node) not in attributes:
+                used.add(node.f_name)
+            elif t == INLINE_NODE:
+                call = node.call
+                used.add(call.f_name if isinstance(call, FuncCall) else call.left.name)
+        if func.name in used or "eval" in used or not used.isdisjoint(IMPLICIT_NAMES):
+            return None
+        # a local name bound out of the function would be assigned there
+        for name in local_names:
+            for body in self.binding_levels.get(name, ()):
+                if body is level or self.encloses(body, level):
+                    return None
+        info = local_names, used - local_names
+        self.inline_infos[func] = info
+        return info
+
+    def fits_inline(self, call, func: DefStmt) -> bool:
+        """
+        Returns whether a function is small enough to be inlined at a call.
+
+        With a profile, the calls never run are not inlined, and the hot calls of hot functions have a larger
+        budget.
+
+        :param call: the call
+        :param func: the called function
+        :return: whether the function fits the budget of the call
+        """
+        budget = self.inline_budget
+        if self.profile is not None:
+            if self.profile.count(call) == 0:
+                return False
+            if self.profile.is_hot(call) and self.profile.is_hot_function(func):
+                budget *= HOT_INLINE_FACTOR
+        return count_nodes(func.body) <= budget
+
+    def make_inline(self, call, args: BlockStmt, func: DefStmt, local_names: set) -> InlineNode:
+        names = {}
+        for name in local_names:
+            names[name] = "${}{}.{}".format(func.name, self.inlined, name)
+        self.inlined += 1
+        body = copy.deepcopy(func.body)
+        attributes = set()
+        for node in walk(body):
+            t = node.type
+            if t == DOT:
+                attributes.add(id(node.right))
+            elif (t == NAME_NODE or t == FUNCTION_CALL) and id(node) not in attributes:
+                if t == NAME_NODE:
+                    name = node.name
+                    if name in names:
+                        node.name = names[name]
+                else:
+                    name = node.f_name
+                    if name in names:
+                        node.f_name = names[name]
+                if name in names:
+                    node.depth = 0
+                elif node.depth is not None and node.depth != HEAP_DEPTH:
+                    # resolved from the function scope, not from the working environment of the call
+                    node.depth = None
+            elif t == INLINE_NODE:
+                node.params = [names[param] for param in node.params]
+        params = [names[param.name] for param in func.params]
+        return InlineNode((call.line_num, call.file), call, params, args, body)
+
+    def move_level(self, body, hoisting: bool):
+        outer = self.level_body
+        self.level_body = body if hoisting else None
+        self.move(body)
+        self.level_body = outer
+
+    def move(self, node):
+        if node is None or not isinstance(node, Node):
+            return
+        t = node.type
+        if t == BLOCK_STMT:
+            node: BlockStmt
+            lines = []
+            for line in node.lines:
+                if isinstance(line, Node) and line.type in LOOP_NODES:
+                    lines.extend(self.move_loop(line))
+                else:
+                    self.move(line)
+                lines.append(line)
+            node.lines = lines
+        elif t == IF_STMT:
+            node: IfStmt
+            self.move(node.then_block)
+            self.move(node.else_block)
+        elif t in LOOP_NODES:
+            # not in a block, where the invariants could be reset
+            self.move(node.body)
+        elif t == TRY_STMT:
+            node: TryStmt
+            self.move(node.try_block)
+            for cat in node.catch_blocks:
+                self.move(cat.then)
+            self.move(node.finally_block)
+        elif t == DEF_STMT:
+            self.move_level(node.body, True)
+        elif t == CLASS_STMT:
+            # the working environment of a class body becomes the class scope
+            self.move_level(node.block, False)
+        elif t == IMPORT_STMT:
+            self.move_level(node.block, True)
+
+    def move_loop(self, node) -> list:
+        """
+        Hoists the invariants of a loop, after hoisting the ones of the nested loops.
+
+        :param node: the loop
+        :return: the statements resetting the invariants, to be placed before the loop
+        """
+        self.move(node.body)
+        if self.level_body is None or not self.propagating or self.is_cold(node):
+            return []
+        self.scan_loop(node)
+        first = self.invariants
+        lines = node.condition.lines
+        if node.type == WHILE_STMT:
+            node.condition = self.hoist(node.condition)
+        elif len(lines) == 3:
+            # the initialization is evaluated only once
+            lines[1] = self.hoist(lines[1])
+            lines[2] = self.hoist(lines[2])
+        node.body = self.hoist(node.body)
+        resets = []
+        for i in range(first, self.invariants):
+            left = NameNode((node.line_num, node.file), invariant_name(i), lex.PUBLIC)
+            left.depth = 0
+            reset = AssignmentNode((node.line_num, node.file))
+            reset.left = left
+            reset.right = None
+            resets.append(reset)
+        return resets
+
+    def scan_loop(self, node):
+        """
+        Records the names bound in a loop, and whether it calls anything but the pure methods.
+
+        :param node: the loop
+        """
+        self.loop_bound = set()
+        self.loop_calls = False
+        for n in walk(node):
+            self.loop_bound.update(bound_names(n))
+            t = n.type
+            if (t == FUNCTION_CALL and (n.f_name not in PURE_METHODS or n.f_name in self.defined_names)) or \
+                    t == CLASS_INIT or t == ANONYMOUS_CALL or \
+                    (t == UPDATE_NODE and n.left.type == DOT and isinstance(n.left.right, FuncCall)):
+                # an update of an indexing calls '__setitem__'
+                self.loop_calls = True
+            elif t == OPERATOR_NODE and "@" + BINARY_OPERATORS.get(n.operation, "") in self.defined_names:
+                # the operator may call a method of a class
+                self.loop_calls = True
+
+    def hoist(self, node):
+        if node is None or not isinstance(node, Node):
+            return node
+        t = node.type
+        if t in LEVEL_NODES or t == INVARIANT_NODE:
+            return node
+        if (t == OPERATOR_NODE or t == NEGATIVE_EXPR or t == NOT_EXPR or t == DOT) and self.is_invariant(node):
+            inv = InvariantNode((node.line_num, node.file), invariant_name(self.invariants), node)
+            self.invariants += 1
+            return inv
+        if t == BLOCK_STMT:
+            node: BlockStmt
+            for i in range(len(node.lines)):
+                node.lines[i] = self.hoist(node.lines[i])
+        elif isinstance(node, BinaryExpr):
+            if t != ASSIGNMENT_NODE and t != UPDATE_NODE:
+                node.left = self.hoist(node.left)
+            if isinstance(node.right, FuncCall):
+                self.hoist(node.right.args)
+            elif t != DOT:
+                node.right = self.hoist(node.right)
+        elif isinstance(node, UnaryOperator):
+            node.value = self.hoist(node.value)
+        elif t == IF_STMT:
+            node: IfStmt
+            node.condition = self.hoist(node.condition)
+            node.then_block = self.hoist(node.then_block)
+            node.else_block = self.hoist(node.else_block)
+        elif t in LOOP_NODES:
+            self.hoist(node.condition)
+            node.body = self.hoist(node.body)
+        else:
+            for child in children(node):
+                self.hoist(child)
+        return node
+
+    def is_invariant(self, node) -> bool:
+        """
+        Returns whether an expression always has the same value, and no effect, during the loop being moved.
+
+        :param node: the expression
+        :return: whether it is a loop invariant
+        """
+        if not isinstance(node, Node):
+            return True
+        t = node.type
+        if t == NAME_NODE:
+            if node.name in self.loop_bound:
+                return False
+            return not self.changed_outside(node.name)
+        elif t == OPERATOR_NODE:
+            node: OperatorNode
+            if node.operation == "instanceof" or "@" + BINARY_OPERATORS.get(node.operation, "") in self.defined_names:
+                return False
+            return self.is_invariant(node.left) and self.is_invariant(node.right)
+        elif t == NEGATIVE_EXPR or t == NOT_EXPR:
+            return self.is_invariant(node.value)
+        elif t == DOT:
+            node: Dot
+            call = node.right
+            if self.loop_calls or not isinstance(call, FuncCall) or call.f_name not in PURE_METHODS or \
+                    call.f_name in self.defined_names:
+                return False
+            return self.is_invariant(node.left) and (call.args is None or
+                                                     all(self.is_invariant(arg) for arg in call.args.lines))
+        else:
+            return False
+
+    def changed_outside(self, name: str) -> bool:
+        """
+        Returns whether a name not bound in the loop being moved may still change during the loop.
+
+        The name may be assigned by the functions enclosed in the body being moved. If the loop calls anything and
+        the name is bound in a body enclosing the body being moved, the name may be a variable of that body, which
+        any function may assign.
+
+        :param name: the name
+        :return: whether the value of the name may change
+        """
+        levels = self.binding_levels.get(name, ())
+        for body in levels:
+            if self.encloses(self.level_body, body):
+                return True
+        # a parameter is always in the working environment of the call
+        if self.loop_calls and name not in self.level_params.get(self.level_body, ()):
+            parent = self.level_parents[self.level_body]
+            while parent is not None:
+                if parent in levels:
+                    return True
+                parent = self.level_parents[parent]
+        return False
+
+    def count_level(self, body, counting: bool):
+        outer = self.level_body
+        self.level_body = body if counting else None
+        self.count(body)
+        self.level_body = outer
+
+    def count(self, node):
+        if node is None or not isinstance(node, Node):
+            return
+        t = node.type
+        if t == BLOCK_STMT:
+            node: BlockStmt
+            lines = node.lines
+            for i in range(len(lines)):
+                self.count(lines[i])
+                if isinstance(lines[i], Node) and lines[i].type == FOR_LOOP_STMT:
+                    lines[i] = self.count_loop(lines[i])
+        elif t == DEF_STMT:
+            self.count_level(node.body, True)
+        elif t == CLASS_STMT:
+            # the working environment of a class body becomes the class scope
+            self.count_level(node.block, False)
+        elif t == IMPORT_STMT:
+            self.count_level(node.block, True)
+        else:
+            for child in children(node):
+                self.count(child)
+
+    def count_loop(self, node: ForLoopStmt):
+        """
+        Returns a RangeNode running a loop, or the loop itself if it is not a counted loop.
+
+        :param node: the loop, whose nested loops are already counted
+        :return: the node replacing the loop
+        """
+        lines = node.condition.lines
+        if self.level_body is None or not self.propagating or len(lines) != 3 or self.is_cold(node):
+            return node
+        start, condition, step = lines
+        if not isinstance(start, AssignmentNode) or not isinstance(start.left, NameNode):
+            return node
+        index = start.left.name
+        if not isinstance(condition, OperatorNode) or condition.operation not in COUNTED_COMPARISONS or \
+                not is_name(condition.left, index):
+            return node
+        if isinstance(step, UpdateNode) and is_name(step.left, index) and step.operation in {"+", "-"}:
+            negative = step.operation == "-"
+        elif isinstance(step, AssignmentNode) and is_name(step.left, index) and isinstance(step.right, OperatorNode) \
+                and is_name(step.right.left, index) and step.right.operation in {"+", "-"}:
+            negative = step.right.operation == "-"
+        else:
+            return node
+        rn = RangeNode((node.line_num, node.file), node, negative)
+        for n in walk(node.body):
+            if index in bound_names(n):
                 return node
+        self.scan_loop(node)
+        if self.changed_outside(index):
+            return node
+        # the invariants of the bound are hoisted from this loop
+        if not (self.is_invariant(rn.bound) or rn.bound.type == INVARIANT_NODE) or not self.is_invariant(rn.step):
+            return node
+        self.counted += 1
+        return rn
+
+    def is_cold(self, node) -> bool:
+        """
+        Returns whether the line of a node never ran in the training run of the profile.
+
+        :param node: the node
+        :return: whether the node is known to be cold
+        """
+        return self.profile is not None and self.profile.count(node) == 0
+
+    def quicken(self, node):
+        """
+        Marks the operators which have only seen numbers in the training run as NUMBER_OPERATOR's, and keeps the
+        ones which have seen other values from being quickened.
+
+        :param node: the root
+        """
+        for n in walk(node):
+            if n.type == OPERATOR_NODE and n.operation in NUMBER_OPERATORS:
+                kind = self.profile.operator_kind(n)
+                if kind == NUMERIC:
+                    n.type = NUMBER_OPERATOR
+                    n.function = NUMBER_OPERATORS[n.operation]
+                    self.quickened += 1
+                elif kind == GENERIC:
+                    n.deoptimized = MAX_DEOPTIMIZATION
+
+    def encloses(self, outer, body) -> bool:
+        """
+        Returns whether a body is nested in another body, so that its working environment can reach the environment
+        of the other body.
+
+        :param outer: the enclosing body
+        :param body: the nested body
+        :return: whether the body is strictly enclosed by the other body
+        """
+        parent = self.level_parents[body]
+        while parent is not None:
+            if parent is outer:
+                return True
+            parent = self.level_parents[parent]
+        return False
+
+    def pure_calls(self, func: DefStmt):
+        """
+        Returns the names of the functions which a function calls or reads, or None if the function itself may have
+        a side effect or read a variable outside.
+
+        :param func: the function definition
+        :return: the set of names, which must all be functions without side effects
+        """
+        body = func.body
+
+        def is_local(n):
+            # bound in the function body, but not in the bodies enclosing it, where the assignments would go
+            levels = self.binding_levels.get(n, ())
+            return body in levels and not any(self.encloses(b, body) for b in levels)
+
+        names = set()
+        attributes = set()
+        for node in walk(body):
+            t = node.type
+            for name in bound_names(node):
+                if not is_local(name):
+                    return None
+            if t in LEVEL_NODES or t == CLASS_INIT or t == ANONYMOUS_CALL:
+                return None
+            elif t == DOT:
+                call = node.right
+                if not isinstance(call, FuncCall) or call.f_name not in PURE_METHODS or \
+                        call.f_name in self.defined_names:
+                    return None
+                attributes.add(id(call))
+            elif t == ASSIGNMENT_NODE or t == UPDATE_NODE:
+                if node.left.type != NAME_NODE:
+                    return None
+            elif t == NAME_NODE:
+                if node.name in IMPLICIT_NAMES:
+                    return None
+                if not is_local(node.name):
+                    names.add(node.name)
+            elif t == INLINE_NODE and isinstance(node.call, Dot):
+                # a function of a module, whose body is checked here
+                continue
+            elif (t == FUNCTION_CALL and id(node) not in attributes) or t == JUMP_NODE or t == INLINE_NODE:
+                name = node.to if t == JUMP_NODE else node.call.f_name if t == INLINE_NODE else node.f_name
+                if is_local(name):
+                    return None
+                if name not in PURE_NATIVES or name in self.bindings:
+                    names.add(name)
+        return names
+
+    def prune(self, node):
+        if node is None or not isinstance(node, Node):
+            return node
+        t = node.type
+        if t == BLOCK_STMT:
+            self.prune_block(node)
+            return node
+        elif t == IF_STMT:
+            node: IfStmt
+            cond = condition_value(node.condition)
+            if cond is NOT_CONSTANT:
+                node.then_block = self.prune_body(node.then_block)
+                node.else_block = self.prune_body(node.else_block)
+                return node
+            # the conditions folded at this level, or literal conditions
+            taken, dropped = (node.then_block, node.else_block) if cond else (node.else_block, node.then_block)
+            self.removed += 1 + count_nodes(node.condition) + count_nodes(dropped)
+            return self.prune(taken)
+        elif t == WHILE_STMT:
+            node: WhileStmt
+            cond = condition_value(node.condition)
+            if cond is not NOT_CONSTANT and not cond:
+                self.removed += count_nodes(node)
+                return 0
+            node.body = self.prune_body(node.body)
+            return node
+        elif t == FOR_LOOP_STMT:
+            node: ForLoopStmt
+            node.body = self.prune_body(node.body)
+            return node
+        elif t == TRY_STMT:
+            node: TryStmt
+            self.prune(node.try_block)
+            for cat in node.catch_blocks:
+                self.prune(cat.then)
+            self.prune(node.finally_block)
+            return node
         elif t == DEF_STMT:
             node: DefStmt
-            self.last_func = node
-            node.body = self.reduce_leaf(node.body)
+            self.prune(node.body)
             return node
-        elif t == CLASS_STMT:
-            node: ClassStmt
-            node.block = self.reduce_leaf(node.block)
+        elif t == CLASS_STMT or t == IMPORT_STMT:
+            self.prune(node.block)
             return node
-        elif t == FUNCTION_CALL:
-            node: FuncCall
-            if self.returning:
-                if self.last_func:
-                    if self.last_func.name == node.f_name:
-                        jn = JumpNode((node.line_num, node.file), self.last_func.name)
-                        jn.args = node.args
-                        self.returning = False
-                        return jn
+        else:
+            return node
+
+    def prune_body(self, body):
+        """
+        Prunes the body of a branch or a loop, which is replaced by its statement if it has only one.
+
+        :param body: the body
+        :return: the pruned body
+        """
+        body = self.prune(body)
+        if isinstance(body, BlockStmt) and len(body.lines) == 1:
+            self.removed += 1
+            return body.lines[0]
+        return body
+
+    def prune_block(self, node: BlockStmt):
+        lines = []
+        for line in node.lines:
+            line = self.prune(line)
+            if isinstance(line, BlockStmt) and len(line.lines) > 0:
+                # a block statement does not make a scope, so its statements run as statements of this block
+                self.removed += 1
+                lines.extend(line.lines)
+            else:
+                lines.append(line)
+        # the last statement is kept, since it is the value of the block
+        last = len(lines) - 1
+        pruned = []
+        for i in range(len(lines)):
+            line = lines[i]
+            if i < last and is_pure(line):
+                self.removed += count_nodes(line)
+                continue
+            pruned.append(line)
+            if isinstance(line, Node) and line.type in TERMINATORS:
+                for unreachable in lines[i + 1:]:
+                    self.removed += count_nodes(unreachable)
+                break
+        node.lines = pruned
+
+    def reduce_leaf(self, node: Node):
+        if node is None or not isinstance(node, Node):
+            return node
+        t = node.type
+        if isinstance(node, NumNode):
+            return node.value
+        elif isinstance(node, NullStmt):
+            return None
+        elif isinstance(node, BooleanStmt):
+            return node.value == "true"
+        elif isinstance(node, LiteralNode):
+            return String(node.literal)
+        elif isinstance(node, BinaryExpr):
+            # this reversal is done intentionally
+            node.right = self.reduce_leaf(node.right)
+            node.left = self.reduce_leaf(node.left)
+            return node
+        elif t == RETURN_STMT:
+            node: ReturnStmt
+            node.value = self.reduce_leaf(node.value)
+            if self.level > 1 and self.in_function and isinstance(node.value, FuncCall):
+                # a call in tail position, the calling function is done once the callee is called
+                node.value = jump_node(node.value)
+            return node
+        elif t == DEF_STMT or t == CLASS_STMT or t == IMPORT_STMT or t == TRY_STMT:
+            # a 'return' in a try statement is not in tail position, the handlers are still waiting
+            in_function = self.in_function
+            self.in_function = t == DEF_STMT
+            map_children(node, self.reduce_leaf)
+            self.in_function = in_function
+            if t == DEF_STMT and self.level > 1:
+                node.body = self.reduce_tail(node.body)
             return node
         else:
+            map_children(node, self.reduce_leaf)
             return node
+
+    def reduce_tail(self, node):
+        """
+        Makes the call whose value is the value of a function body, without 'return', a tail call.
+
+        The last statement of the body is in tail position, and so are the last statements of the branches of an if
+        statement in tail position. The calls of methods, such as 'return obj.m()', are not made tail calls.
+
+        :param node: the function body, or a statement in tail position
+        :return: the statement replacing the node
+        """
+        if not isinstance(node, Node):
+            return node
+        t = node.type
+        if t == BLOCK_STMT:
+            node: BlockStmt
+            if len(node.lines) > 0:
+                node.lines[-1] = self.reduce_tail(node.lines[-1])
+        elif t == IF_STMT:
+            node: IfStmt
+            node.then_block = self.reduce_tail(node.then_block)
+            node.else_block = self.reduce_tail(node.else_block)
+        elif t == FUNCTION_CALL:
+            return jump_node(node)
+        return node
+
+
+class Pass:
+    """
+    A transformation of the whole tree, run by Optimizer.optimize.
+    """
+
+    def __init__(self, name: str, enabled, run, detail=None):
+        self.name = name
+        self.enabled = enabled  # the function taking the optimizer and returning whether this pass is run
+        self.run = run  # the function taking the optimizer
+        self.detail = detail  # the function taking the optimizer and describing the work done, for the report
+
+
+class PassReport:
+    def __init__(self, name: str, elapsed: float, before: int, after: int, detail):
+        self.name = name
+        self.elapsed = elapsed
+        self.before = before  # the number of nodes before the pass
+        self.after = after
+        self.detail = detail
+
+    def __str__(self):
+        s = "{}: {:.3f} ms, {} -> {} nodes".format(self.name, self.elapsed * 1000, self.before, self.after)
+        if self.detail is not None:
+            s += ", " + self.detail
+        return s
+
+
+def at_level(level: int):
+    return lambda o: o.level >= level
+
+
+def is_constant(value) -> bool:
+    """
+    Returns whether a folded node is a literal value.
+
+    :param value: the folded node
+    :return: whether it is a literal value
+    """
+    return not isinstance(value, Node) and (value is None or type(value) in LITERAL_TYPES)
+
+
+def condition_value(condition):
+    """
+    Returns the value of a folded condition, or NOT_CONSTANT if it is only known at run time.
+
+    :param condition: the folded condition
+    :return: the value of the condition
+    """
+    if isinstance(condition, BlockStmt):
+        if len(condition.lines) != 1:
+            return NOT_CONSTANT
+        condition = condition.lines[0]
+    if is_constant(condition):
+        return condition
+    return NOT_CONSTANT
+
+
+def is_pure(statement) -> bool:
+    """
+    Returns whether evaluating a statement has no effect.
+
+    :param statement: the statement
+    :return: whether the statement is pure
+    """
+    if not isinstance(statement, Node):
+        return True
+    t = statement.type
+    return t in LITERAL_NODES or (t == BLOCK_STMT and len(statement.lines) == 0)
+
+
+def count_nodes(node) -> int:
+    """
+    Returns the number of nodes of a tree, counting the raw values of the optimizer.
+
+    :param node: the root
+    :return: the number of nodes
+    """
+    if isinstance(node, Node):
+        return sum(1 for _ in walk(node))
+    return 0 if node is None else 1
+
+
+def walk_level(node):
+    """
+    Yields the nodes of a body, without entering the bodies of the nested functions, classes and modules.
+
+    :param node: the body
+    """
+    if node is None or not isinstance(node, Node):
+        return
+    yield node
+    if node.type not in LEVEL_NODES:
+        for child in children(node):
+            yield from walk_level(child)
+
+
+def bound_names(node) -> list:
+    """
+    Returns the names bound by a node in its working environment.
+
+    :param node: the node
+    :return: the list of names
+    """
+    t = node.type
+    if t == ASSIGNMENT_NODE or t == UPDATE_NODE:
+        names = []
+        key = node.left
+        while isinstance(key, Dot):
+            if isinstance(key.right, NameNode):
+                names.append(key.right.name)
+            key = key.left
+        if isinstance(key, NameNode):
+            names.append(key.name)
+        return names
+    elif t == DEF_STMT:
+        return [node.name]
+    elif t == CLASS_STMT or t == IMPORT_STMT:
+        return [node.class_name]
+    elif t == FOR_LOOP_STMT and len(node.condition.lines) == 2:
+        return [node.condition.lines[0].name]
+    elif t == INLINE_NODE:
+        return node.params
+    else:
+        return []
+
+
+def jump_node(call: FuncCall) -> JumpNode:
+    """
+    Returns the tail call of a call.
+
+    :param call: the call in tail position
+    :return: the JumpNode
+    """
+    jn = JumpNode((call.line_num, call.file), call.f_name)
+    jn.args = call.args
+    jn.depth = call.depth
+    jn.call = call
+    return jn
+
+
+def is_name(node, name: str) -> bool:
+    return isinstance(node, NameNode) and node.name == name
+
+
+def invariant_name(index: int) -> str:
+    return "$inv{}".format(index)
+
+
+# The passes of an optimizer, in order
+PASSES = [
+    Pass("leaf", at_level(1), Optimizer.optimize_leaf),
+    Pass("constant", at_level(3), Optimizer.optimize_constant),
+    # the inlined bodies are copied from the pruned functions
+    Pass("dead code", at_level(3), Optimizer.optimize_dead_code,
+         lambda o: "removed {} nodes".format(o.removed)),
+    Pass("inline", at_level(3), Optimizer.optimize_inline,
+         lambda o: "inlined {} calls".format(o.inlined)),
+    Pass("loop invariant", at_level(3), Optimizer.optimize_loop_invariant,
+         lambda o: "hoisted {} invariants".format(o.invariants)),
+    Pass("counted loop", at_level(3), Optimizer.optimize_counted_loop,
+         lambda o: "counted {} loops".format(o.counted)),
+    Pass("profile", lambda o: o.profile is not None, Optimizer.optimize_profile,
+         lambda o: "quickened {} operators".format(o.quickened)),
+    Pass("memo", lambda o: o.memoizing, Optimizer.optimize_memo,
+         lambda o: "marked {} functions".format(o.memoized))
+]
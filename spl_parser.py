@@ -45,6 +45,15 @@ TYPE_NODE = 29
 JUMP_NODE = 30
 # MODULE_STMT = 31
 IMPORT_STMT = 32
+BYTECODE = 33
+NUMBER_OPERATOR = 34  # an OPERATOR_NODE which has only seen numbers, set by the interpreter
+INVARIANT_NODE = 35
+INLINE_NODE = 36
+UPDATE_NODE = 37
+RANGE_NODE = 38
+
+# The depth of a resolved name which is only bound in the heap
+HEAP_DEPTH = -1
 
 
 class Parser:
@@ -83,11 +92,11 @@ class Parser:
             node = LiteralNode(line, lit)
             self.stack.append(node)
 
-    def add_import(self, line, import_name):
+    def add_import(self, line, import_name, path):
         if self.inner:
-            self.inner.add_import(line, import_name)
+            self.inner.add_import(line, import_name, path)
         else:
-            stmt = ImportStmt(line, import_name)
+            stmt = ImportStmt(line, import_name, path)
             self.stack.append(stmt)
 
     def add_operator(self, line, op, extra_precedence, assignment=False):
@@ -206,19 +215,11 @@ class Parser:
             pass
             # self.inner = Parser()
 
-<<<<<<< HEAD
-    def add_function(self, line, f_name, auth, is_const):
-        if self.inner:
-            self.inner.add_function(line, f_name, auth, is_const)
-        else:
-            func = DefStmt(line, f_name, auth, is_const)
-=======
-    def add_function(self, line, f_name, auth):
+    def add_function(self, line, f_name, auth, is_const, memo=False):
         if self.inner:
-            self.inner.add_function(line, f_name, auth)
+            self.inner.add_function(line, f_name, auth, is_const, memo)
         else:
-            func = DefStmt(line, f_name, auth)
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+            func = DefStmt(line, f_name, auth, is_const, memo)
             self.stack.append(func)
 
     def build_func_params(self, params: list, presets: list):
@@ -694,12 +695,35 @@ class OperatorNode(BinaryExpr):
         self.type = OPERATOR_NODE
         self.assignment = False
         self.extra_precedence = extra * MULTIPLIER
+        self.function = None  # the python operator of a NUMBER_OPERATOR
+        self.deoptimized = 0  # how many times the node has turned back from NUMBER_OPERATOR
         # print(self.extra_precedence)
 
     def precedence(self):
         return PRECEDENCE[self.operation] + self.extra_precedence
 
 
+class UpdateNode(BinaryExpr):
+    """
+    A compound assignment such as 'x += 1', made from its operator node by parse_expr.
+
+    The target is a name, an attribute 'a.b' or an indexing 'a[i]', whose location is found only once for both
+    the read and the write.
+    """
+
+    def __init__(self, line, op_node: OperatorNode):
+        BinaryExpr.__init__(self, line)
+
+        self.type = UPDATE_NODE
+        self.left = op_node.left
+        self.right = op_node.right
+        self.operation = op_node.operation[:-1]
+        self.cache = {}  # the inline cache of '__setitem__', the cache of the target is used for '__getitem__'
+
+    def __str__(self):
+        return "UE({} {}= {})".format(self.left, self.operation, self.right)
+
+
 class UnaryOperator(Node):
 
     def __init__(self, line, extra):
@@ -726,8 +750,7 @@ class NameNode(LeafNode, Limited):
 
         self.type = NAME_NODE
         self.name = n
-        # self.index = None
-        # self.nest = None
+        self.depth = None  # the resolved scope depth, set by spl_resolver
         # print(str(auth) + " " + self.name)
 
     def __str__(self):
@@ -920,17 +943,14 @@ class ForLoopStmt(CondStmt):
 
 
 class DefStmt(Node, Limited):
-<<<<<<< HEAD
     name = None
     params = None
     presets = None
     body = None
     const = False
+    memo = False
 
-    def __init__(self, line, f_name, auth, is_const):
-=======
-    def __init__(self, line, f_name, auth):
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+    def __init__(self, line, f_name, auth, is_const, memo=False):
         Node.__init__(self, line)
         Limited.__init__(self, auth)
 
@@ -938,12 +958,9 @@ class DefStmt(Node, Limited):
         self.name = f_name
         self.params = []
         self.presets = []
-<<<<<<< HEAD
         self.const = is_const
+        self.memo = memo  # whether the results are remembered, annotated by @Memo or set by the optimizer
         # self.body = None
-=======
-        self.body = None
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
 
     def __str__(self):
         return "func({}({} :{}) -> {})".format(self.name, self.params, self.presets, self.body)
@@ -963,6 +980,7 @@ class FuncCall(LeafNode):
         self.f_name = f_name
         self.args = None
         self.is_get_set = False
+        self.depth = None  # the resolved scope depth of the function name, set by spl_resolver
         # self.header_block = None
 
     def __str__(self):
@@ -972,7 +990,6 @@ class FuncCall(LeafNode):
         return self.__str__()
 
 
-<<<<<<< HEAD
 class ModuleStmt(Node):
     class_name = None
     block = None
@@ -980,22 +997,17 @@ class ModuleStmt(Node):
     def __init__(self, line: tuple, name: str):
         Node.__init__(self, line)
 
-        # self.node_type = MODULE_STMT
-=======
-class ClassStmt(Node):
-    def __init__(self, line: tuple, name: str):
-        Node.__init__(self, line)
-
-        self.type = CLASS_STMT
->>>>>>> parent of 344cb36... Updated to spl 1.1.0
+        # self.type = MODULE_STMT
         self.class_name = name
 
 
 class ImportStmt(ModuleStmt):
-    def __init__(self, line: tuple, name: str):
+    def __init__(self, line: tuple, name: str, path: str):
         ModuleStmt.__init__(self, line, name)
 
-        self.node_type = IMPORT_STMT
+        self.type = IMPORT_STMT
+        self.path = path  # the resolved path of the imported file
+        self.source = None  # the first import of the same file, which holds the module block, set by the resolver
 
 
 class ClassStmt(ModuleStmt):
@@ -1004,7 +1016,7 @@ class ClassStmt(ModuleStmt):
     def __init__(self, line: tuple, name: str):
         ModuleStmt.__init__(self, line, name)
 
-        self.node_type = CLASS_STMT
+        self.type = CLASS_STMT
         self.superclass_names = []
         self.block = None
 
@@ -1039,6 +1051,7 @@ class Dot(OperatorNode):
 
         self.type = DOT
         self.operation = "."
+        self.cache = {}  # the inline cache, see spl_interpreter.dot_entry
 
     def __str__(self):
         return "({} dot {})".format(self.left, self.right)
@@ -1119,12 +1132,19 @@ class TryStmt(Node):
 
 
 class JumpNode(Node):
+    """
+    A function call in tail position, which is the value of a 'return' or of the last statement of a function body.
+
+    :type call: FuncCall
+    """
     def __init__(self, line, to):
         Node.__init__(self, line)
 
         self.type = JUMP_NODE
         self.to = to
         self.args = []
+        self.depth = None
+        self.call = None  # the replaced call, which is made as usual if the callee is not a spl function
 
     def __str__(self):
         return "Jump({}: {})".format(self.to, self.args)
@@ -1133,6 +1153,103 @@ class JumpNode(Node):
         return self.__str__()
 
 
+class InvariantNode(UnaryOperator):
+    """
+    A loop invariant expression, hoisted by the optimizer.
+
+    The value is evaluated at the first use in each execution of the loop, and kept in the working environment under
+    a name which cannot appear in a script.
+    """
+
+    def __init__(self, line, name: str, value):
+        UnaryOperator.__init__(self, line, 0)
+
+        self.type = INVARIANT_NODE
+        self.operation = "invariant"
+        self.name = name
+        self.value = value
+
+    def __str__(self):
+        return "Inv({}: {})".format(self.name, self.value)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class InlineNode(Node):
+    """
+    A function call replaced by the function body, inlined by the optimizer.
+
+    The arguments are assigned to the renamed parameters in the working environment, then the body is evaluated
+    there. The original call is kept for the engines which do not inline.
+
+    :type params: list of str
+    :type args: BlockStmt
+    :type body: BlockStmt
+    """
+
+    def __init__(self, line, call, params: list, args, body):
+        Node.__init__(self, line)
+
+        self.type = INLINE_NODE
+        self.call = call
+        self.params = params
+        self.args = args
+        self.body = body
+
+    def __str__(self):
+        return "Inline({}: {})".format(self.call, self.body)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RangeNode(Node):
+    """
+    A counted loop 'for (i = start; i < bound; i += step)', recognized by the optimizer.
+
+    Neither the index nor the bound is changed by the body, so the loop iterates over a range computed once and
+    only stores the index. The original loop is kept for the engines which do not count, and for the values
+    which cannot make a range.
+
+    :type loop: ForLoopStmt
+    """
+
+    def __init__(self, line, loop: ForLoopStmt, negative: bool):
+        Node.__init__(self, line)
+
+        self.type = RANGE_NODE
+        self.loop = loop
+        self.negative = negative  # whether the step is subtracted from the index
+        self.start = None
+        self.index = None
+        self.operation = None
+        self.bound = None
+        self.step = None
+        self.body = None
+        self.read_loop()
+
+    def read_loop(self):
+        """
+        Takes the parts of the range from the loop, again after the loop is changed.
+        """
+        start, condition, increment = self.loop.condition.lines
+        self.start = start
+        self.index = start.left
+        self.operation = condition.operation
+        self.bound = condition.right
+        # 'i += step' or 'i = i + step'
+        self.step = increment.right if increment.type == UPDATE_NODE else increment.right.right
+        self.body = self.loop.body
+
+    def __str__(self):
+        return "Range({}: {} {} {}, {}{}) do {}".format(self.start, self.index, self.operation, self.bound,
+                                                        "-" if self.negative else "+", self.step, self.body)
+
+    def __repr__(self):
+        return self.__str__()
+
+
 def parse_expr(lst):
     # print(lst)
     while len(lst) > 1:
@@ -1159,4 +1276,6 @@ def parse_expr(lst):
             operator.right = lst[index + 1]
             lst.pop(index + 1)
             lst.pop(index - 1)
+            if isinstance(operator, OperatorNode) and operator.assignment:
+                lst[index - 1] = UpdateNode((operator.line_num, operator.file), operator)
     return lst[0]
@@ -0,0 +1,159 @@
+""" The execution profiles for profile-guided optimization.
+
+A training run with the tree-walking interpreter counts the evaluations of every node. A Profile keeps, for each
+source line, the largest count of its nodes, the number of calls of the functions defined there, and whether
+the operators there have only seen numbers. Everything is keyed by file and line, so that a profile written for a
+script still applies to the parts of it which were not edited.
+
+A profile is stored as a JSON file, written by write_profile and read by read_profile.
+"""
+
+import os
+import json
+from spl_parser import *
+from spl_resolver import walk
+
+PROFILE_VERSION = 1
+
+# A line is hot if it runs at least this fraction of the times the hottest line runs
+HOT_FRACTION = 0.01
+
+# Marks the operators of a line which have seen values other than numbers
+GENERIC = "generic"
+
+# Marks the operators of a line which have only seen numbers
+NUMERIC = "numeric"
+
+
+class Profile:
+    """
+    The execution counts of a training run.
+
+    :type lines: dict
+    :type functions: dict
+    :type operators: dict
+    """
+
+    def __init__(self):
+        self.lines = {}  # the largest execution count of the nodes of each (file, line)
+        self.functions = {}  # the number of calls of the functions defined at each (file, line)
+        self.operators = {}  # NUMERIC or GENERIC, for each (file, line, operation)
+        self.hot_line = 1
+        self.hot_function = 1
+
+    def update_thresholds(self):
+        """
+        Computes the counts from which the lines and the functions are hot.
+        """
+        self.hot_line = max(1, int(max(self.lines.values(), default=0) * HOT_FRACTION))
+        self.hot_function = max(1, int(max(self.functions.values(), default=0) * HOT_FRACTION))
+
+    def count(self, node: Node) -> int:
+        """
+        Returns how many times the line of a node ran in the training run.
+
+        :param node: the node
+        :return: the execution count, 0 if the line never ran
+        """
+        return self.lines.get((profile_file(node.file), node.line_num), 0)
+
+    def is_hot(self, node: Node) -> bool:
+        return self.count(node) >= self.hot_line
+
+    def is_hot_function(self, func: DefStmt) -> bool:
+        return self.functions.get((profile_file(func.file), func.line_num), 0) >= self.hot_function
+
+    def operator_kind(self, node: OperatorNode):
+        """
+        Returns what the operators of the same operation, at the line of an operator node, have seen.
+
+        :param node: the operator node
+        :return: NUMERIC, GENERIC, or None if they never ran
+        """
+        return self.operators.get((profile_file(node.file), node.line_num, node.operation))
+
+
+def profile_file(file: str) -> str:
+    """
+    Returns the key of a source file in profiles, which does not depend on the working directory.
+
+    :param file: the file name of a node
+    :return: the absolute path of the file
+    """
+    return os.path.abspath(file)
+
+
+def record_profile(ast: BlockStmt) -> Profile:
+    """
+    Returns the profile of a tree just evaluated by the tree-walking interpreter.
+
+    :param ast: the evaluated tree
+    :return: the profile
+    """
+    profile = Profile()
+    files = {}
+    for node in walk(ast):
+        if node.line_num <= 0:
+            # made by the parser, out of the source
+            continue
+        file = files.get(node.file)
+        if file is None:
+            file = files[node.file] = profile_file(node.file)
+        key = (file, node.line_num)
+        if node.execution > profile.lines.get(key, 0):
+            profile.lines[key] = node.execution
+        t = node.type
+        if t == DEF_STMT and isinstance(node.body, Node):
+            profile.functions[key] = profile.functions.get(key, 0) + node.body.execution
+        elif (t == OPERATOR_NODE or t == NUMBER_OPERATOR) and node.execution > 0:
+            key = (file, node.line_num, node.operation)
+            if profile.operators.get(key) != GENERIC:
+                profile.operators[key] = NUMERIC if t == NUMBER_OPERATOR and node.deoptimized == 0 else GENERIC
+    profile.update_thresholds()
+    return profile
+
+
+def write_profile(profile: Profile, file):
+    """
+    Writes a profile into a text file.
+
+    :param profile: the profile
+    :param file: the file opened in mode 'w'
+    """
+    json.dump({"version": PROFILE_VERSION,
+               "lines": [[f, line, count] for (f, line), count in profile.lines.items()],
+               "functions": [[f, line, calls] for (f, line), calls in profile.functions.items()],
+               "operators": [[f, line, op, kind] for (f, line, op), kind in profile.operators.items()]},
+              file)
+
+
+def read_profile(file) -> Profile:
+    """
+    Reads a profile from a text file.
+
+    :param file: the file opened in mode 'r'
+    :return: the profile
+    """
+    try:
+        data = json.load(file)
+    except ValueError:
+        raise ProfileException("Not a spl profile")
+    if not isinstance(data, dict):
+        raise ProfileException("Not a spl profile")
+    if data.get("version") != PROFILE_VERSION:
+        raise ProfileException("Unsupported profile version {}, expected {}".format(data.get("version"),
+                                                                                    PROFILE_VERSION))
+    profile = Profile()
+    for f, line, count in data["lines"]:
+        profile.lines[(f, line)] = count
+    for f, line, calls in data["functions"]:
+        profile.functions[(f, line)] = calls
+    for f, line, op, kind in data["operators"]:
+        profile.operators[(f, line, op)] = kind
+    profile.update_thresholds()
+    return profile
+
+
+class ProfileException(Exception):
+    def __init__(self, msg=""):
+        Exception.__init__(self, msg)
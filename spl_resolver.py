@@ -0,0 +1,286 @@
+""" The static scope resolver.
+
+Annotates the NameNode's and FuncCall's of a parsed script with the depth of the scope where the name is bound,
+so that the interpreters can go to that scope directly, instead of searching through the chain of environments.
+
+Only the names which are guaranteed to be bound in that scope are resolved:
+    the parameters of the enclosing functions, which are always bound in the function scope,
+    'this' in methods, which is bound in the instance scope, and
+    the names which are never bound anywhere in the script, which can only be in the heap.
+All the other names are left unresolved, with depth None, because whether an assignment creates a local
+variable or changes an outer one is decided at run time.
+
+A resolved access still falls back to the normal lookup if the name is not there.
+"""
+
+from spl_parser import *
+
+# Names bound into the environments by the interpreter itself
+IMPLICIT_NAMES = {"this", "id", "=>"}
+
+
+class _Level:
+    """
+    A scope level enclosing the node being resolved.
+
+    :type names: set of str
+    :type hidden: set of str
+    """
+
+    def __init__(self, kind: str, names: set, hidden: set):
+        self.kind = kind  # "function", "class" or "module"
+        self.names = names  # the names guaranteed to be bound in this scope
+        self.hidden = hidden  # the names which may be bound as constants in this scope
+
+
+class Resolver:
+    """
+    :type levels: list of _Level
+    :type bound_names: set of str
+    :type imports: dict
+    """
+
+    def __init__(self, ast: BlockStmt):
+        self.ast = ast
+        self.levels = [_Level("module", set(), set())]
+        self.bound_names = set(IMPLICIT_NAMES)
+        self.heap_resolvable = True
+        self.imports = {}  # the first import of each file, by path
+
+    def resolve(self):
+        """
+        Resolves the whole script.
+        """
+        for node in walk(self.ast):
+            self.collect(node)
+        self.visit(self.ast)
+
+    def collect(self, node):
+        t = node.type
+        if t == ASSIGNMENT_NODE or t == UPDATE_NODE:
+            key = node.left
+            while isinstance(key, Dot):
+                if isinstance(key.right, NameNode):
+                    self.bound_names.add(key.right.name)
+                key = key.left
+            if isinstance(key, NameNode):
+                self.bound_names.add(key.name)
+        elif t == DEF_STMT:
+            self.bound_names.add(node.name)
+            for param in node.params:
+                self.bound_names.add(param.name)
+        elif t == CLASS_STMT:
+            self.bound_names.add(node.class_name)
+        elif t == IMPORT_STMT:
+            # the lexer only keeps the block of the first import of a file
+            first = self.imports.setdefault(node.path, node)
+            if first is not node:
+                node.source = first
+        elif t == FOR_LOOP_STMT and len(node.condition.lines) == 2:
+            self.bound_names.add(node.condition.lines[0].name)
+        elif t == FUNCTION_CALL and node.f_name == "eval":
+            # evaluated code may bind any name
+            self.heap_resolvable = False
+
+    def lookup(self, name: str):
+        """
+        Returns the resolved depth of a name at the current position, or None if it cannot be resolved.
+
+        :param name: the name
+        :return: the depth, HEAP_DEPTH, or None
+        """
+        if self.heap_resolvable and name not in self.bound_names:
+            return HEAP_DEPTH
+        depth = 0
+        for i in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[i]
+            if name in level.hidden:
+                return None
+            if name in level.names:
+                return depth
+            if level.kind != "function":
+                return None
+            depth += 1
+        return None
+
+    def visit(self, node):
+        if node is None or not isinstance(node, Node):  # raw values of the optimizer
+            return
+        t = node.type
+        if t == NAME_NODE:
+            node.depth = self.lookup(node.name)
+        elif t == BLOCK_STMT:
+            for line in node.lines:
+                self.visit(line)
+        elif t == DOT:
+            self.visit(node.left)
+            if isinstance(node.right, FuncCall):
+                self.visit_args(node.right)
+        elif t == ANONYMOUS_CALL:
+            self.visit(node.left)
+            self.visit_args(node.right)
+        elif t == ASSIGNMENT_NODE or t == OPERATOR_NODE or t == UPDATE_NODE:
+            self.visit(node.left)
+            self.visit(node.right)
+        elif isinstance(node, UnaryOperator):
+            self.visit(node.value)
+        elif t == IF_STMT:
+            self.visit(node.condition)
+            self.visit(node.then_block)
+            self.visit(node.else_block)
+        elif t == WHILE_STMT or t == FOR_LOOP_STMT:
+            self.visit(node.condition)
+            self.visit(node.body)
+        elif t == FUNCTION_CALL:
+            node.depth = self.lookup(node.f_name)
+            self.visit_args(node)
+        elif t == CLASS_INIT or t == JUMP_NODE:
+            self.visit_args(node)
+        elif t == TRY_STMT:
+            self.visit(node.try_block)
+            for cat in node.catch_blocks:
+                self.visit(cat.then)
+            self.visit(node.finally_block)
+        elif t == DEF_STMT:
+            # presets are evaluated in the caller's environment, so they are not resolved
+            params = {param.name for param in node.params}
+            hidden = constants_of(node.body)
+            self.levels.append(_Level("function", params - hidden, hidden))
+            self.visit(node.body)
+            self.levels.pop()
+        elif t == CLASS_STMT:
+            self.levels.append(_Level("class", {"this"}, set()))
+            self.visit(node.block)
+            self.levels.pop()
+        elif t == IMPORT_STMT:
+            self.levels.append(_Level("module", set(), set()))
+            self.visit(node.block)
+            self.levels.pop()
+
+    def visit_args(self, node):
+        if node.args:
+            for arg in node.args.lines:
+                self.visit(arg)
+
+
+def walk(node):
+    """
+    Yields all nodes of a tree.
+
+    :param node: the root
+    """
+    if node is None or not isinstance(node, Node):
+        return
+    yield node
+    for child in children(node):
+        yield from walk(child)
+
+
+def children(node: Node):
+    """
+    Returns the direct children of a node.
+
+    :param node: the node
+    :return: the children, which may contain None's and raw values
+    """
+    if isinstance(node, BlockStmt):
+        return node.lines
+    elif isinstance(node, BinaryExpr):
+        return (node.left, node.right)
+    elif isinstance(node, UnaryOperator):
+        return (node.value,)
+    elif isinstance(node, IfStmt):
+        return (node.condition, node.then_block, node.else_block)
+    elif isinstance(node, WhileStmt) or isinstance(node, ForLoopStmt):
+        return (node.condition, node.body)
+    elif isinstance(node, FuncCall) or isinstance(node, ClassInit):
+        return (node.args,)
+    elif isinstance(node, JumpNode):
+        return (node.args,) if isinstance(node.args, Node) else node.args
+    elif isinstance(node, DefStmt):
+        return node.params + node.presets + [node.body]
+    elif isinstance(node, ModuleStmt):
+        return (node.block,)
+    elif isinstance(node, TryStmt):
+        return [node.try_block, node.finally_block] + node.catch_blocks
+    elif isinstance(node, CatchStmt):
+        return (node.then,)
+    elif isinstance(node, InlineNode):
+        return node.args, node.body
+    elif isinstance(node, RangeNode):
+        return (node.loop,)
+    else:
+        return ()
+
+
+def map_children(node: Node, function):
+    """
+    Replaces each direct child of a node by the result of a function on it, in the order of children.
+
+    :param node: the node
+    :param function: the function taking a child, which may be None or a raw value, and returning its replacement
+    """
+    if isinstance(node, BlockStmt):
+        lines = node.lines
+        for i in range(len(lines)):
+            lines[i] = function(lines[i])
+    elif isinstance(node, BinaryExpr):
+        node.left = function(node.left)
+        node.right = function(node.right)
+    elif isinstance(node, UnaryOperator):
+        node.value = function(node.value)
+    elif isinstance(node, IfStmt):
+        node.condition = function(node.condition)
+        node.then_block = function(node.then_block)
+        node.else_block = function(node.else_block)
+    elif isinstance(node, WhileStmt) or isinstance(node, ForLoopStmt):
+        node.condition = function(node.condition)
+        node.body = function(node.body)
+    elif isinstance(node, FuncCall) or isinstance(node, ClassInit):
+        node.args = function(node.args)
+    elif isinstance(node, JumpNode):
+        if isinstance(node.args, Node):
+            node.args = function(node.args)
+        else:
+            node.args = [function(arg) for arg in node.args]
+    elif isinstance(node, DefStmt):
+        node.params = [function(param) for param in node.params]
+        node.presets = [function(preset) for preset in node.presets]
+        node.body = function(node.body)
+    elif isinstance(node, ModuleStmt):
+        node.block = function(node.block)
+    elif isinstance(node, TryStmt):
+        node.try_block = function(node.try_block)
+        node.finally_block = function(node.finally_block)
+        node.catch_blocks = [function(cat) for cat in node.catch_blocks]
+    elif isinstance(node, CatchStmt):
+        node.then = function(node.then)
+    elif isinstance(node, InlineNode):
+        node.args = function(node.args)
+        node.body = function(node.body)
+    elif isinstance(node, RangeNode):
+        node.loop = function(node.loop)
+        node.read_loop()
+
+
+def constants_of(body) -> set:
+    """
+    Returns the names of the constant functions defined in a function body, including the nested ones.
+
+    :param body: the function body
+    :return: the set of names
+    """
+    names = set()
+    for node in walk(body):
+        if isinstance(node, DefStmt) and node.const:
+            names.add(node.name)
+    return names
+
+
+def resolve(ast: BlockStmt):
+    """
+    Resolves the names of a parsed script in place.
+
+    :param ast: the root of the abstract syntax tree
+    """
+    Resolver(ast).resolve()
@@ -0,0 +1,585 @@
+""" The spl virtual machine.
+
+Runs the bytecode produced by spl_compiler in a single dispatch loop. A call to a spl function compiled to
+bytecode pushes a frame instead of recursing into python, so the depth of spl recursion is only bounded by
+MAX_CALL_DEPTH.
+"""
+
+from spl_bytecode import *
+from spl_interpreter import *
+
+MAX_CALL_DEPTH = 100000
+
+ARITHMETIC_FUNCTIONS = [NUMBER_OPERATORS.get(op, ARITHMETIC_TABLE[op]) for op in OPERATORS]
+
+
+class BytecodeInterpreter(Interpreter):
+    """
+    An interpreter which compiles the abstract syntax tree into bytecode, or takes the bytecode read from a
+    '.spe' file, and runs it in the virtual machine.
+
+    :type code: Code
+    """
+
+    def __init__(self, argv, encoding):
+        Interpreter.__init__(self, argv, encoding)
+
+        self.code = None
+
+    def set_ast(self, ast: BlockStmt, file_name: str = "console"):
+        """
+        Sets up the abstract syntax tree and compiles it.
+
+        :param ast: the root of the abstract syntax tree to be interpreted
+        :param file_name: the name of the script file, the root of the tree does not know it
+        :return: None
+        """
+        import spl_compiler
+        self.ast = ast
+        self.code = spl_compiler.compile_ast(ast, file_name)
+
+    def set_code(self, code: Code):
+        """
+        Sets up the bytecode to be run.
+
+        :param code: the compiled script
+        :return: None
+        """
+        self.code = code
+
+    def interpret(self):
+        """
+        Starts the interpretation.
+
+        :return: the exit value
+        """
+        return execute(self.code, self.env)
+
+
+class Frame:
+    """
+    The activation record of a running Code.
+
+    :type code: Code
+    :type env: Environment
+    :type stack: list
+    :type handlers: list of tuple
+    :type parent: Frame
+    :type instance: ClassInstance
+    """
+    __slots__ = ("code", "env", "stack", "pc", "handlers", "parent", "instance")
+
+    def __init__(self, code: Code, env: Environment, parent):
+        self.code = code
+        self.env = env
+        self.stack = []
+        self.pc = 0
+        self.handlers = []  # (handler pc, stack depth) of the enclosing try blocks
+        self.parent = parent
+        self.instance = None  # the instance being constructed, if this frame runs a constructor
+
+
+class VirtualMachine:
+    """
+    Runs one Code and all spl functions called from it.
+
+    :type frame: Frame
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.depth = 0
+
+    def execute(self, code: Code, env: Environment):
+        """
+        Runs a code in an environment.
+
+        :param code: the code
+        :param env: the working environment
+        :return: the returned value of the code
+        """
+        entry = Frame(code, env, None)
+        self.frame = entry
+        while True:
+            try:
+                return self.run()
+            except Exception as e:
+                self.unwind(e, entry)
+
+    def unwind(self, e: Exception, entry: Frame):
+        """
+        Transfers the control to the nearest exception handler, or raises the exception if there is none.
+
+        :param e: the exception
+        :param entry: the first frame of this virtual machine
+        """
+        frame = self.frame
+        while not frame.handlers:
+            if frame is entry:
+                raise e
+            frame = frame.parent
+            self.depth -= 1
+        handler, depth = frame.handlers.pop()
+        del frame.stack[depth:]
+        frame.stack.append(e)
+        frame.pc = handler
+        self.frame = frame
+
+    def call(self, func: Function, args: list, name: str, code: Code, pc: int, env: Environment) -> Environment:
+        """
+        Creates the scope of a function call, with the parameters bound.
+
+        :param func: the function
+        :param args: the evaluated arguments
+        :param name: the function name, for error message
+        :param code: the calling code
+        :param pc: the program counter of the calling code
+        :param env: the environment where the presets are evaluated
+        :return: the function scope
+        """
+        scope = function_scope(env.heap, func.outer_scope, name)
+
+        params = func.params
+        if len(args) > len(params):
+            raise SplException("Too few or too many arguments for function '{}', in '{}', at line {}"
+                               .format(name, code.file, code.line_of(pc)))
+        for i in range(len(params)):
+            if i < len(args):
+                scope.variables[params[i].name] = args[i]
+            else:
+                scope.variables[params[i].name] = evaluate(func.presets[i], env)
+        return scope
+
+    def run(self):
+        """
+        The dispatch loop. Runs from self.frame until the first frame returns.
+
+        :return: the returned value of the first frame
+        """
+        frame = self.frame
+        code = frame.code
+        ins = code.instructions
+        consts = code.consts
+        names = code.names
+        env = frame.env
+        stack = frame.stack
+        push = stack.append
+        pop = stack.pop
+        pc = frame.pc
+
+        while True:
+            op = ins[pc]
+            arg = ins[pc + 1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                value = env.inner_get(names[arg])
+                if value is NULLPTR:
+                    raise SplException("Name '{}' is not defined, in file {}, at line {}"
+                                       .format(names[arg], code.file, code.line_of(pc)))
+                push(value)
+            elif op == LOAD_LOCAL:
+                try:
+                    push(env.variables[names[arg]])
+                except KeyError:
+                    push(env.get(names[arg], (code.line_of(pc), code.file)))
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == BINARY_OP:
+                right = pop()
+                left = stack[-1]
+                t = type(left)
+                if t is int or t is float:
+                    stack[-1] = ARITHMETIC_FUNCTIONS[arg](left, right)
+                else:
+                    stack[-1] = value_arithmetic(left, right, OPERATORS[arg], env)
+            elif op == STORE_NAME:
+                env.assign(names[arg], stack[-1])
+            elif op == STORE_LOCAL:
+                name = names[arg]
+                variables = env.variables
+                if name in variables:
+                    variables[name] = stack[-1]
+                else:
+                    env.assign(name, stack[-1])
+            elif op == POP_TOP:
+                pop()
+            elif op == POP_JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == CALL_FUNCTION or op == JUMP_CALL:
+                f_name, argc, depth = consts[arg]
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                if depth is None:
+                    func = env.inner_get(f_name)
+                    if func is NULLPTR:
+                        raise SplException("Name '{}' is not defined, in file {}, at line {}"
+                                           .format(f_name, code.file, code.line_of(pc)))
+                else:
+                    func = env.resolved_get(f_name, depth, (code.line_of(pc), code.file))
+                if isinstance(func, Function):
+                    scope = self.call(func, args, f_name, code, pc, env)
+                    body = func.body
+                    if func.memo is not None:
+                        push(memo_call(func, scope, evaluate_body))
+                    elif op == JUMP_CALL and isinstance(body, Code) and frame.instance is None:
+                        # tail call, re-uses the frame
+                        if frame.parent is not None:
+                            release_scope(env)
+                        if body is not code:
+                            frame.code = code = body
+                            ins = code.instructions
+                            consts = code.consts
+                            names = code.names
+                        frame.env = env = scope
+                        stack.clear()
+                        frame.handlers.clear()
+                        pc = 0
+                    elif isinstance(body, Code):
+                        if self.depth >= MAX_CALL_DEPTH:
+                            raise SplException("Maximum call depth exceeded, in file {}, at line {}"
+                                               .format(code.file, code.line_of(pc)))
+                        frame.pc = pc
+                        frame = Frame(body, scope, frame)
+                        self.depth += 1
+                        self.frame = frame
+                        code = body
+                        ins = code.instructions
+                        consts = code.consts
+                        names = code.names
+                        env = scope
+                        stack = frame.stack
+                        push = stack.append
+                        pop = stack.pop
+                        pc = 0
+                    else:
+                        result = evaluate_body(body, scope)
+                        release_scope(scope)
+                        push(result)
+                elif isinstance(func, NativeFunction):
+                    result = func.call(args)
+                    if isinstance(result, BlockStmt):
+                        # Special case for "eval"
+                        result = evaluate(result, env)
+                    push(result)
+                else:
+                    raise InterpretException("Not a function call")
+            elif op == RETURN_VALUE:
+                result = pop()
+                if frame.instance is not None:
+                    result = frame.instance
+                if frame.parent is None:
+                    return result
+                release_scope(env)
+                frame = frame.parent
+                self.depth -= 1
+                self.frame = frame
+                code = frame.code
+                ins = code.instructions
+                consts = code.consts
+                names = code.names
+                env = frame.env
+                stack = frame.stack
+                push = stack.append
+                pop = stack.pop
+                pc = frame.pc
+                push(result)
+            elif op == CALL_METHOD:
+                f_name, argc, by_this = consts[arg]
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                instance = pop()
+                cache = code.caches.get(pc)
+                if cache is None:
+                    cache = code.caches[pc] = {}
+                entry = dot_entry(cache, instance, f_name, by_this, (code.line_of(pc), code.file))
+                if entry is not None:
+                    try:
+                        push(entry(instance, *args))
+                    except IndexError as ie:
+                        raise IndexOutOfRangeException(str(ie) + " in file: '{}', at line {}"
+                                                       .format(code.file, code.line_of(pc)))
+                else:
+                    func = instance.env.get(f_name, (code.line_of(pc), code.file))
+                    if isinstance(func, Function):
+                        scope = self.call(func, args, f_name, code, pc, env)
+                        body = func.body
+                        if func.memo is not None:
+                            push(memo_call(func, scope, evaluate_body))
+                        elif isinstance(body, Code):
+                            if self.depth >= MAX_CALL_DEPTH:
+                                raise SplException("Maximum call depth exceeded, in file {}, at line {}"
+                                                   .format(code.file, code.line_of(pc)))
+                            frame.pc = pc
+                            frame = Frame(body, scope, frame)
+                            self.depth += 1
+                            self.frame = frame
+                            code = body
+                            ins = code.instructions
+                            consts = code.consts
+                            names = code.names
+                            env = scope
+                            stack = frame.stack
+                            push = stack.append
+                            pop = stack.pop
+                            pc = 0
+                        else:
+                            result = evaluate_body(body, scope)
+                            release_scope(scope)
+                            push(result)
+                    elif isinstance(func, NativeFunction):
+                        result = func.call(args)
+                        if isinstance(result, BlockStmt):
+                            result = evaluate(result, instance.env)
+                        push(result)
+                    else:
+                        raise InterpretException("Not a function call")
+            elif op == LOAD_ATTR or op == LOAD_ATTR_THIS:
+                instance = stack[-1]
+                name = names[arg]
+                cache = code.caches.get(pc)
+                if cache is None:
+                    cache = code.caches[pc] = {}
+                entry = dot_entry(cache, instance, name, op == LOAD_ATTR_THIS, (code.line_of(pc), code.file))
+                if entry is None:
+                    stack[-1] = instance.env.variables[name]
+                else:
+                    stack[-1] = entry
+            elif op == LOAD_HEAP:
+                try:
+                    push(env.heap[names[arg]])
+                except KeyError:
+                    push(env.get(names[arg], (code.line_of(pc), code.file)))
+            elif op == LOAD_OUTER:
+                name, depth = consts[arg]
+                push(env.resolved_get(name, depth, (code.line_of(pc), code.file)))
+            elif op == FOR_ITER:
+                value = next(stack[-2], _END)
+                if value is _END:
+                    result = pop()
+                    stack[-1] = result
+                    pc = arg
+                else:
+                    push(value)
+            elif op == AND_JUMP or op == OR_JUMP:
+                left = stack[-1]
+                if not (left is None or isinstance(left, bool) or isinstance(left, int) or isinstance(left, float)):
+                    raise InterpretException("Operator '||' '&&' do not support type.")
+                if op == AND_JUMP:
+                    if left:
+                        pop()
+                    else:
+                        stack[-1] = False
+                        pc = arg
+                else:
+                    if left:
+                        stack[-1] = True
+                        pc = arg
+                    else:
+                        pop()
+            elif op == NOT:
+                stack[-1] = not bool(stack[-1])
+            elif op == NEGATIVE:
+                stack[-1] = -stack[-1]
+            elif op == STORE_PRIVATE:
+                name = names[arg]
+                env.assign(name, stack[-1])
+                env.add_private(name)
+            elif op == STORE_OUTER:
+                name, depth = consts[arg]
+                env.resolved_assign(name, depth, stack[-1])
+            elif op == STORE_PATH:
+                path = consts[arg]
+                scope = env
+                for name in path[:-1]:
+                    scope = scope.get(name, (code.line_of(pc), code.file)).env
+                scope.assign(path[-1], stack[-1])
+            elif op == NEW:
+                class_name, argc = consts[arg]
+                line_file = (code.line_of(pc), code.file)
+                cla: Class = env.get_class(class_name, line_file)
+
+                scope = layout_scope(cla, env)
+                if scope is None:
+                    scope = Environment(False, env.heap)
+                    scope.scope_name = "Class scope<{}>".format(cla.class_name)
+                    class_inheritance(cla, env, scope)
+                    scope.outer = cla.outer_scope
+                    for k in scope.variables:
+                        v = scope.variables[k]
+                        if isinstance(v, Function):
+                            v.outer_scope = scope
+
+                instance = ClassInstance(scope, cla)
+
+                if argc < 0:
+                    push(instance)
+                    continue
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                func = scope.get(cla.class_name, line_file)
+                if not isinstance(func, Function):
+                    raise InterpretException("Not a function call")
+                constructor_scope = self.call(func, args, cla.class_name, code, pc, scope)
+                body = func.body
+                if isinstance(body, Code):
+                    frame.pc = pc
+                    frame = Frame(body, constructor_scope, frame)
+                    frame.instance = instance
+                    self.depth += 1
+                    self.frame = frame
+                    code = body
+                    ins = code.instructions
+                    consts = code.consts
+                    names = code.names
+                    env = constructor_scope
+                    stack = frame.stack
+                    push = stack.append
+                    pop = stack.pop
+                    pc = 0
+                else:
+                    evaluate_body(body, constructor_scope)
+                    release_scope(constructor_scope)
+                    push(instance)
+            elif op == GET_ITER:
+                iterable = stack[-1]
+                if isinstance(iterable, Iterable):
+                    stack[-1] = iter(iterable)
+                elif isinstance(iterable, ClassInstance) and is_subclass_of(class_of(iterable), "Iterable", env):
+                    stack[-1] = InstanceIterator(iterable, env)
+                else:
+                    raise SplException("For-each loop on non-iterable objects, in {}, at line {}"
+                                       .format(code.file, code.line_of(pc)))
+            elif op == ROT_TWO:
+                stack[-1], stack[-2] = stack[-2], stack[-1]
+            elif op == DUP_TOP:
+                push(stack[-1])
+            elif op == DUP_TOP_TWO:
+                stack.extend(stack[-2:])
+            elif op == STORE_ATTR:
+                instance = pop()
+                name = names[arg]
+                cache = code.caches.get(pc)
+                if cache is None:
+                    cache = code.caches[pc] = {}
+                # the access is checked by the LOAD_ATTR before
+                if dot_entry(cache, instance, name, True, (code.line_of(pc), code.file)) is not None:
+                    raise SplException("Cannot assign attribute '{}' of a native object, in file {}, at line {}"
+                                       .format(name, code.file, code.line_of(pc)))
+                instance.env.assign(name, stack[-1])
+            elif op == STORE_ITEM:
+                value = pop()
+                index = pop()
+                instance = pop()
+                cache = code.caches.get(pc)
+                if cache is None:
+                    cache = code.caches[pc] = {}
+                call_entry(cache, instance, "__setitem__", [index, value], arg == 1, (code.line_of(pc), code.file))
+                push(value)
+            elif op == SETUP_TRY:
+                frame.handlers.append((arg, len(stack)))
+            elif op == POP_TRY:
+                frame.handlers.pop()
+            elif op == CATCH:
+                e = stack[-1]
+                if isinstance(e, RuntimeException):
+                    exception_class = class_of(e.exception)
+                    push(any(is_subclass_of(exception_class, catch_name, env) for catch_name in consts[arg]))
+                else:
+                    push("Exception" in consts[arg])
+            elif op == RERAISE:
+                raise pop()
+            elif op == THROW:
+                raise RuntimeException(pop())
+            elif op == MAKE_FUNCTION:
+                info: FunctionInfo = consts[arg]
+                if info.nodes is None:
+                    line_file = (code.line_of(pc), code.file)
+                    info.nodes = ([NameNode(line_file, param, lex.PUBLIC) for param in info.params],
+                                  [InvalidToken(line_file) if preset is None else preset for preset in info.presets])
+                f = Function(info.nodes[0], info.nodes[1], info.body)
+                f.outer_scope = env
+                env.captured = True
+                if info.memo:
+                    f.memo = make_memo(info.name, code.file, code.line_of(pc))
+                if info.const:
+                    env.assign_const(info.name, f)
+                else:
+                    env.assign(info.name, f)
+                if info.auth == lex.PRIVATE:
+                    env.add_private(info.name)
+                push(f)
+            elif op == MAKE_CLASS:
+                class_name, superclass_names, body = consts[arg]
+                cla = Class(class_name, body)
+                cla.superclass_names = list(superclass_names)
+                cla.outer_scope = env
+                env.captured = True
+                env.assign(class_name, cla)
+                push(cla)
+            elif op == IMPORT:
+                module_name, path, body = consts[arg]
+                module = MODULES.get(path)
+                if module is None:
+                    module = new_module(module_name, path, env)
+                    execute(body, module.env)
+                env.add_heap(module_name, module)
+                push(module)
+            elif op == NOP:
+                pass
+            elif op == ABSTRACT_METHOD:
+                raise AbstractMethodException("Method is not implemented, in {}, at line {}"
+                                              .format(code.file, code.line_of(pc)))
+            elif op == INVALID:
+                raise InterpretException("Argument error, in {}, at line {}".format(code.file, code.line_of(pc)))
+            else:
+                raise BytecodeException("Unknown opcode {}, in {}, at {}".format(op, code.name, pc - 2))
+
+
+class InstanceIterator:
+    """
+    A python iterator over a spl class instance which extends 'Iterable'.
+    """
+
+    def __init__(self, iterable: ClassInstance, env: Environment):
+        self.iterator: ClassInstance = call_special(iterable, "__iter__", [])
+        self.env = env
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        res = call_special(self.iterator, "__next__", [])
+        if isinstance(res, ClassInstance) and is_subclass_of(class_of(res), "StopIteration", self.env):
+            raise StopIteration
+        return res
+
+
+_END = object()
+
+
+def execute(code: Code, env: Environment):
+    """
+    Runs a code in a new virtual machine.
+
+    :param code: the code
+    :param env: the working environment
+    :return: the returned value of the code
+    """
+    return VirtualMachine().execute(code, env)
+
+
+# Lets the tree-walking interpreter run the compiled bodies of functions and classes.
+NODE_TABLE[psr.BYTECODE] = execute
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+SAMPLES = ["samples/sample32.sp", "samples/sample33.sp", "samples/sample34.sp", "samples/sample35.sp",
+           "samples/sample36.sp", "samples/sample37.sp"]
+ENGINES = ["tree", "closure", "vm"]
+LEVELS = [[], ["-o1"], ["-o2"], ["-o3"]]
+# the samples run with '-memo', by the lines they must print
+MEMO_SAMPLES = {
+    "samples/sample38.sp": ["3", "3", "6", "1", "1", "===== Memoization =====",
+                            "f in 'samples/sample38.sp', at line 7: 1 hits, 2 misses", "===== End of Memoization ====="]
+}
+
+
+def run(file_name, flags):
+    result = subprocess.run([sys.executable, "spl.py", "-no-cache"] + flags + [file_name],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return result.returncode, result.stdout
+
+
+if __name__ == "__main__":
+    # runs from the root of the repository, checks that every engine prints the same at every level
+    failed = 0
+    for sample in SAMPLES:
+        code, expected = run(sample, ["-engine", "tree"])
+        if code != 0:
+            failed += 1
+            print("{}: failed with {!r}".format(sample, expected))
+            continue
+        for engine in ENGINES:
+            for level in LEVELS:
+                flags = ["-engine", engine] + level
+                code, out = run(sample, flags)
+                if out != expected:
+                    failed += 1
+                    print("{} {}: expected {!r}, got {!r}".format(sample, " ".join(flags), expected, out))
+    for sample in MEMO_SAMPLES:
+        expected = "\n".join(MEMO_SAMPLES[sample]) + "\n"
+        for engine in ENGINES:
+            for level in LEVELS:
+                flags = ["-memo", "-engine", engine] + level
+                code, out = run(sample, flags)
+                if out != expected:
+                    failed += 1
+                    print("{} {}: expected {!r}, got {!r}".format(sample, " ".join(flags), expected, out))
+    print("{} failed".format(failed))